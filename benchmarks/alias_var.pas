@@ -0,0 +1,27 @@
+{Benchmark: parâmetros var e por valor ligados à mesma variável numa sub-rotina expandida
+ em linha. Em Incrementa(k, k), y é uma cópia do valor de k no momento da chamada, mesmo
+ que x (o próprio k) seja alterado antes de y ser lido: 5 + 1 + 5 = 11. Se o argumento de
+ y fosse lido diretamente na variável depois de x := x + 1, o resultado seria 12.}
+program AliasVar;
+var
+  k, i, s: integer;
+
+procedure Incrementa(var x: integer; y: integer);
+begin
+  x := x + 1;
+  x := x + y
+end;
+
+begin
+  k := 5;
+  Incrementa(k, k);
+  writeln(k);
+  s := 0;
+  for i := 1 to 1000 do
+  begin
+    k := i mod 7;
+    Incrementa(k, k);
+    s := s + k
+  end;
+  writeln(s)
+end.
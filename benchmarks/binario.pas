@@ -0,0 +1,72 @@
+{Benchmark: conversões entre binário e inteiro, como tests/test7_with_functions.pas.
+ Lê uma string binária carácter a carácter até um ponto (ex: 1011011.) e converte-a com
+ BinToInt; depois lê n (ex: 2000) e converte cada número de 1 a n para binário (num
+ array de char, passado por var) e de volta para inteiro, confirmando que dá o mesmo.}
+program Binario;
+const MAXLEN = 32;
+type
+    mystring = array[1..MAXLEN] of char;
+
+function BinToInt(bin: mystring; len: integer): integer;
+var
+    i, valor, potencia: integer;
+begin
+    valor := 0;
+    potencia := 1;
+    for i := len downto 1 do
+    begin
+        if bin[i] = '1' then
+            valor := valor + potencia;
+        potencia := potencia * 2
+    end;
+    BinToInt := valor
+end;
+
+{ Escreve x em binário em bin (o dígito mais significativo em bin[1]) e devolve o
+  número de dígitos }
+function IntToBin(x: integer; var bin: mystring): integer;
+var
+    aux: mystring;
+    i, len: integer;
+begin
+    len := 0;
+    repeat
+        len := len + 1;
+        if x mod 2 = 1 then
+            aux[len] := '1'
+        else
+            aux[len] := '0';
+        x := x div 2
+    until x = 0;
+    for i := 1 to len do
+        bin[i] := aux[len + 1 - i];
+    IntToBin := len
+end;
+
+var
+    bin: mystring;
+    len, n, i, digitos, erros: integer;
+    ch: char;
+begin
+    len := 0;
+    read(ch);
+    while (ch <> '.') and (len < MAXLEN) do
+    begin
+        len := len + 1;
+        bin[len] := ch;
+        read(ch)
+    end;
+    writeln('Valor lido: ', BinToInt(bin, len));
+    readln(n);
+    digitos := 0;
+    erros := 0;
+    for i := 1 to n do
+    begin
+        len := IntToBin(i, bin);
+        digitos := digitos + len;
+        if BinToInt(bin, len) <> i then
+            erros := erros + 1
+    end;
+    writeln('Dígitos escritos: ', digitos);
+    writeln('Conversões erradas: ', erros)
+end.
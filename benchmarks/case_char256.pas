@@ -0,0 +1,272 @@
+{Benchmark: CASE com 256 etiquetas sobre um char (uma por cada código 0..255).
+ Lê um carácter e um número de repetições e executa o CASE em ciclo; com a tabela
+ de saltos, o custo da seleção não depende do ramo escolhido.}
+program CaseChar256;
+var
+  c: char;
+  i, n, s: integer;
+begin
+  readln(c);
+  readln(n);
+  s := 0;
+  for i := 1 to n do
+    case c of
+      #0: s := s + 1;
+      #1: s := s + 2;
+      #2: s := s + 3;
+      #3: s := s + 4;
+      #4: s := s + 5;
+      #5: s := s + 6;
+      #6: s := s + 7;
+      #7: s := s + 1;
+      #8: s := s + 2;
+      #9: s := s + 3;
+      #10: s := s + 4;
+      #11: s := s + 5;
+      #12: s := s + 6;
+      #13: s := s + 7;
+      #14: s := s + 1;
+      #15: s := s + 2;
+      #16: s := s + 3;
+      #17: s := s + 4;
+      #18: s := s + 5;
+      #19: s := s + 6;
+      #20: s := s + 7;
+      #21: s := s + 1;
+      #22: s := s + 2;
+      #23: s := s + 3;
+      #24: s := s + 4;
+      #25: s := s + 5;
+      #26: s := s + 6;
+      #27: s := s + 7;
+      #28: s := s + 1;
+      #29: s := s + 2;
+      #30: s := s + 3;
+      #31: s := s + 4;
+      #32: s := s + 5;
+      #33: s := s + 6;
+      #34: s := s + 7;
+      #35: s := s + 1;
+      #36: s := s + 2;
+      #37: s := s + 3;
+      #38: s := s + 4;
+      #39: s := s + 5;
+      #40: s := s + 6;
+      #41: s := s + 7;
+      #42: s := s + 1;
+      #43: s := s + 2;
+      #44: s := s + 3;
+      #45: s := s + 4;
+      #46: s := s + 5;
+      #47: s := s + 6;
+      #48: s := s + 7;
+      #49: s := s + 1;
+      #50: s := s + 2;
+      #51: s := s + 3;
+      #52: s := s + 4;
+      #53: s := s + 5;
+      #54: s := s + 6;
+      #55: s := s + 7;
+      #56: s := s + 1;
+      #57: s := s + 2;
+      #58: s := s + 3;
+      #59: s := s + 4;
+      #60: s := s + 5;
+      #61: s := s + 6;
+      #62: s := s + 7;
+      #63: s := s + 1;
+      #64: s := s + 2;
+      #65: s := s + 3;
+      #66: s := s + 4;
+      #67: s := s + 5;
+      #68: s := s + 6;
+      #69: s := s + 7;
+      #70: s := s + 1;
+      #71: s := s + 2;
+      #72: s := s + 3;
+      #73: s := s + 4;
+      #74: s := s + 5;
+      #75: s := s + 6;
+      #76: s := s + 7;
+      #77: s := s + 1;
+      #78: s := s + 2;
+      #79: s := s + 3;
+      #80: s := s + 4;
+      #81: s := s + 5;
+      #82: s := s + 6;
+      #83: s := s + 7;
+      #84: s := s + 1;
+      #85: s := s + 2;
+      #86: s := s + 3;
+      #87: s := s + 4;
+      #88: s := s + 5;
+      #89: s := s + 6;
+      #90: s := s + 7;
+      #91: s := s + 1;
+      #92: s := s + 2;
+      #93: s := s + 3;
+      #94: s := s + 4;
+      #95: s := s + 5;
+      #96: s := s + 6;
+      #97: s := s + 7;
+      #98: s := s + 1;
+      #99: s := s + 2;
+      #100: s := s + 3;
+      #101: s := s + 4;
+      #102: s := s + 5;
+      #103: s := s + 6;
+      #104: s := s + 7;
+      #105: s := s + 1;
+      #106: s := s + 2;
+      #107: s := s + 3;
+      #108: s := s + 4;
+      #109: s := s + 5;
+      #110: s := s + 6;
+      #111: s := s + 7;
+      #112: s := s + 1;
+      #113: s := s + 2;
+      #114: s := s + 3;
+      #115: s := s + 4;
+      #116: s := s + 5;
+      #117: s := s + 6;
+      #118: s := s + 7;
+      #119: s := s + 1;
+      #120: s := s + 2;
+      #121: s := s + 3;
+      #122: s := s + 4;
+      #123: s := s + 5;
+      #124: s := s + 6;
+      #125: s := s + 7;
+      #126: s := s + 1;
+      #127: s := s + 2;
+      #128: s := s + 3;
+      #129: s := s + 4;
+      #130: s := s + 5;
+      #131: s := s + 6;
+      #132: s := s + 7;
+      #133: s := s + 1;
+      #134: s := s + 2;
+      #135: s := s + 3;
+      #136: s := s + 4;
+      #137: s := s + 5;
+      #138: s := s + 6;
+      #139: s := s + 7;
+      #140: s := s + 1;
+      #141: s := s + 2;
+      #142: s := s + 3;
+      #143: s := s + 4;
+      #144: s := s + 5;
+      #145: s := s + 6;
+      #146: s := s + 7;
+      #147: s := s + 1;
+      #148: s := s + 2;
+      #149: s := s + 3;
+      #150: s := s + 4;
+      #151: s := s + 5;
+      #152: s := s + 6;
+      #153: s := s + 7;
+      #154: s := s + 1;
+      #155: s := s + 2;
+      #156: s := s + 3;
+      #157: s := s + 4;
+      #158: s := s + 5;
+      #159: s := s + 6;
+      #160: s := s + 7;
+      #161: s := s + 1;
+      #162: s := s + 2;
+      #163: s := s + 3;
+      #164: s := s + 4;
+      #165: s := s + 5;
+      #166: s := s + 6;
+      #167: s := s + 7;
+      #168: s := s + 1;
+      #169: s := s + 2;
+      #170: s := s + 3;
+      #171: s := s + 4;
+      #172: s := s + 5;
+      #173: s := s + 6;
+      #174: s := s + 7;
+      #175: s := s + 1;
+      #176: s := s + 2;
+      #177: s := s + 3;
+      #178: s := s + 4;
+      #179: s := s + 5;
+      #180: s := s + 6;
+      #181: s := s + 7;
+      #182: s := s + 1;
+      #183: s := s + 2;
+      #184: s := s + 3;
+      #185: s := s + 4;
+      #186: s := s + 5;
+      #187: s := s + 6;
+      #188: s := s + 7;
+      #189: s := s + 1;
+      #190: s := s + 2;
+      #191: s := s + 3;
+      #192: s := s + 4;
+      #193: s := s + 5;
+      #194: s := s + 6;
+      #195: s := s + 7;
+      #196: s := s + 1;
+      #197: s := s + 2;
+      #198: s := s + 3;
+      #199: s := s + 4;
+      #200: s := s + 5;
+      #201: s := s + 6;
+      #202: s := s + 7;
+      #203: s := s + 1;
+      #204: s := s + 2;
+      #205: s := s + 3;
+      #206: s := s + 4;
+      #207: s := s + 5;
+      #208: s := s + 6;
+      #209: s := s + 7;
+      #210: s := s + 1;
+      #211: s := s + 2;
+      #212: s := s + 3;
+      #213: s := s + 4;
+      #214: s := s + 5;
+      #215: s := s + 6;
+      #216: s := s + 7;
+      #217: s := s + 1;
+      #218: s := s + 2;
+      #219: s := s + 3;
+      #220: s := s + 4;
+      #221: s := s + 5;
+      #222: s := s + 6;
+      #223: s := s + 7;
+      #224: s := s + 1;
+      #225: s := s + 2;
+      #226: s := s + 3;
+      #227: s := s + 4;
+      #228: s := s + 5;
+      #229: s := s + 6;
+      #230: s := s + 7;
+      #231: s := s + 1;
+      #232: s := s + 2;
+      #233: s := s + 3;
+      #234: s := s + 4;
+      #235: s := s + 5;
+      #236: s := s + 6;
+      #237: s := s + 7;
+      #238: s := s + 1;
+      #239: s := s + 2;
+      #240: s := s + 3;
+      #241: s := s + 4;
+      #242: s := s + 5;
+      #243: s := s + 6;
+      #244: s := s + 7;
+      #245: s := s + 1;
+      #246: s := s + 2;
+      #247: s := s + 3;
+      #248: s := s + 4;
+      #249: s := s + 5;
+      #250: s := s + 6;
+      #251: s := s + 7;
+      #252: s := s + 1;
+      #253: s := s + 2;
+      #254: s := s + 3;
+      #255: s := s + 4;
+    end;
+  writeln(s);
+end.
@@ -0,0 +1,44 @@
+{Benchmark: ciclos for com limites constantes, como os de tests/test5.pas. Os ciclos
+ curtos são desenrolados por completo (a variável do ciclo passa a um valor constante e
+ os índices dos arrays deixam de precisar de CHECK); os de 100 iterações são repetidos
+ 4 vezes por cada teste do limite.}
+program Unroll;
+const
+    N = 5;
+    M = 25;
+var
+    a: array[1..N] of integer;
+    b: array[1..100] of integer;
+    i, j, s: integer;
+
+procedure Mostra();
+begin
+    write(i)
+end;
+
+begin
+    for i := 1 to N do
+        a[i] := i * i;
+    s := 0;
+    for i := 1 to N do
+        s := s + a[i];
+    writeln(s, i);
+    for i := 1 to M * 4 do
+        b[i] := i;
+    s := 0;
+    for i := 100 downto 1 do
+        s := s + b[i];
+    writeln(s, i);
+    for i := 1 to 7 do
+        for j := 1 to 3 do
+            s := s + i * j;
+    writeln(s, i, j);
+    for i := 1 to 3 do
+        Mostra;
+    writeln;
+    for i := 5 to 4 do
+        writeln(99);
+    writeln(i);
+    for i := 1 to 10 do
+        i := i
+end.
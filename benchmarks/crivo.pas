@@ -0,0 +1,40 @@
+{Benchmark: crivo de Eratóstenes (lê n <= 20000, ex: 20000). Marca os múltiplos de cada
+ primo num array de booleanos e depois conta e soma os primos até n; o ciclo interior
+ é um while com um passo variável, e a contagem percorre o array com um for.}
+program Crivo;
+const MAXN = 20000;
+var
+    composto: array[2..MAXN] of boolean;
+    i, j, n, primos, soma, ultimo: integer;
+begin
+    readln(n);
+    for i := 2 to n do
+        composto[i] := false;
+    i := 2;
+    while i * i <= n do
+    begin
+        if not composto[i] then
+        begin
+            j := i * i;
+            while j <= n do
+            begin
+                composto[j] := true;
+                j := j + i
+            end
+        end;
+        i := i + 1
+    end;
+    primos := 0;
+    soma := 0;
+    ultimo := 0;
+    for i := 2 to n do
+        if not composto[i] then
+        begin
+            primos := primos + 1;
+            soma := soma + i;
+            ultimo := i
+        end;
+    writeln('Primos até ', n, ': ', primos);
+    writeln('Soma: ', soma);
+    writeln('Maior: ', ultimo)
+end.
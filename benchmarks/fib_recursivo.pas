@@ -0,0 +1,20 @@
+{Benchmark: fib(n) com a recursão dupla habitual (lê n, ex: 20), sem a diretiva MEMO
+ (compare-se com memo_fib.pas). O número de chamadas cresce exponencialmente com n, por
+ isso mede sobretudo o custo de uma chamada: passagem do argumento, frame e retorno.}
+program FibRecursivo;
+var
+    n, i: integer;
+
+function Fib(k: integer): integer;
+begin
+    if k < 2 then
+        Fib := k
+    else
+        Fib := Fib(k - 1) + Fib(k - 2)
+end;
+
+begin
+    readln(n);
+    for i := n - 4 to n do
+        writeln('fib(', i, ') = ', Fib(i))
+end.
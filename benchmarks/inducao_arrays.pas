@@ -0,0 +1,59 @@
+{Benchmark: ciclos for com limites variáveis que percorrem arrays (lê n, ex: 60).
+ Os índices i - c passam a ter a constante junta ao ajuste do limite inferior; quando
+ compensa, o índice já ajustado (e multiplicado pelo tamanho do elemento, nos arrays de
+ records) fica numa variável de indução somada em cada iteração, que também pode
+ controlar o ciclo.}
+program Iv;
+const
+    LIM = 50;
+type
+    ponto = record
+        x, y: integer;
+    end;
+var
+    a: array[1..100] of integer;
+    b: array[0..99] of integer;
+    p: array[1..20] of ponto;
+    i, n, s, k: integer;
+
+procedure Mostra(v: integer);
+begin
+    write(v, ' ')
+end;
+
+begin
+    readln(n);
+    for i := 1 to n do
+        a[i] := i;
+    for i := 1 to n do
+        b[i - 1] := a[i] * 2;
+    s := 0;
+    for i := 1 to n do
+        s := s + a[i] + b[i - 1] + i * 3;
+    writeln(s, ' ', i);
+    for i := n downto 1 do
+        s := s - a[i];
+    writeln(s, ' ', i);
+    for i := 1 to 20 do
+    begin
+        p[i].x := i;
+        p[i].y := i * 7
+    end;
+    s := 0;
+    for i := 1 to 20 do
+        s := s + p[i].x + p[i].y;
+    writeln(s);
+    for i := 2 to LIM do
+        s := s + a[i] + a[i - 1];
+    writeln(s, ' ', i);
+    for i := 1 to 3 do
+        Mostra(a[i]);
+    writeln(i);
+    k := 0;
+    for i := 1 to n do
+        k := k + i * 4 + i * 4 + i;
+    writeln(k);
+    for i := 5 to n - 100 do
+        a[i] := 0;
+    writeln(i)
+end.
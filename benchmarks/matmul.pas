@@ -0,0 +1,80 @@
+{Benchmark: multiplicação de matrizes (lê n <= 12, ex: 12). As matrizes são arrays com
+ duas dimensões, declarados como array[1..MAXN, 1..MAXN] ou como array de arrays, e
+ guardados num único bloco contíguo: cada acesso m[i, j] ou m[i][j] é um único LOADN, com
+ os strides calculados na compilação e os limites inferiores juntos numa constante.}
+program MatMul;
+const MAXN = 12;
+type
+    Matriz = array[1..MAXN, 1..MAXN] of integer;
+var
+    a, b, c: Matriz;
+    x, y: array[1..MAXN] of array[1..MAXN] of integer;
+    cubo: array[0..3, 1..4, 1..5] of integer;
+    i, j, k, n, s, t: integer;
+
+procedure Multiplicar(var p, q, r: Matriz; m: integer);
+var i, j, k, s: integer;
+begin
+    for i := 1 to m do
+        for j := 1 to m do
+        begin
+            s := 0;
+            for k := 1 to m do
+                s := s + p[i, k] * q[k, j];
+            r[i, j] := s
+        end
+end;
+
+function Traco(var m: Matriz; tam: integer): integer;
+var i, s: integer;
+begin
+    s := 0;
+    for i := 1 to tam do
+        s := s + m[i, i];
+    Traco := s
+end;
+
+begin
+    readln(n);
+    for i := 1 to n do
+        for j := 1 to n do
+        begin
+            a[i, j] := (i * 7 + j * 3) mod 10;
+            b[i, j] := (i + 2 * j) mod 5 - 2
+        end;
+    Multiplicar(a, b, c, n);
+    Multiplicar(c, a, b, n);
+    s := 0;
+    for i := 1 to n do
+        for j := 1 to n do
+            s := s + b[i, j] * (i + j);
+    writeln(s);
+    writeln(Traco(c, n));
+
+    for i := 1 to n do
+        for j := 1 to n do
+            x[i][j] := i - j;
+    for i := 1 to n do
+        for j := 1 to n do
+        begin
+            t := 0;
+            for k := 1 to n do
+                t := t + x[i][k] * x[j][k];
+            y[i][j] := t
+        end;
+    t := 0;
+    for i := 1 to n do
+        t := t + y[i][i] * i;
+    writeln(t);
+
+    for i := 0 to 3 do
+        for j := 1 to 4 do
+            for k := 1 to 5 do
+                cubo[i, j, k] := i * 100 + j * 10 + k;
+    s := 0;
+    for i := 0 to 3 do
+        for j := 1 to 4 do
+            for k := 1 to 5 do
+                s := s + cubo[i][j, k] mod 7;
+    writeln(s)
+end.
@@ -0,0 +1,23 @@
+{Benchmark: fib(n) recursivo com a diretiva MEMO.
+ Sem a diretiva, o número de chamadas cresce exponencialmente com n; com ela, cada
+ fib(k) só é calculado uma vez e fica numa tabela indexada pelo parâmetro (tipo 0..40),
+ por isso o número de instruções executadas cresce linearmente.}
+program MemoFib;
+type
+  indice = 0..40;
+var
+  n: indice;
+
+{$MEMO}
+function Fib(n: indice): integer;
+begin
+  if n < 2 then
+    Fib := n
+  else
+    Fib := Fib(n - 1) + Fib(n - 2)
+end;
+
+begin
+  readln(n);
+  writeln(Fib(n))
+end.
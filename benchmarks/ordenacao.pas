@@ -0,0 +1,95 @@
+{Benchmark: ordenação de arrays (lê n <= 500 e uma semente, ex: 300 e 7). Preenche dois
+ arrays com os mesmos valores pseudo-aleatórios (gerador congruencial linear) e ordena um
+ com o bubble sort e o outro com o quicksort recursivo, que recebe o array por var;
+ no fim confirma que os dois ficaram iguais e ordenados.}
+program Ordenacao;
+const MAXN = 500;
+type
+    Vetor = array[1..MAXN] of integer;
+var
+    a, b: Vetor;
+    n, semente, i, trocas: integer;
+    iguais: boolean;
+
+{ Avança o gerador congruencial e devolve o próximo valor, entre 0 e limite - 1 }
+function Aleatorio(var s: integer; limite: integer): integer;
+begin
+    s := (s * 1103 + 12345) mod 65536;
+    Aleatorio := s mod limite
+end;
+
+{ Ordena v[1..tam] e devolve o número de trocas feitas }
+function Bolha(var v: Vetor; tam: integer): integer;
+var i, j, t, trocas: integer;
+    trocou: boolean;
+begin
+    i := tam;
+    trocas := 0;
+    trocou := true;
+    while trocou do
+    begin
+        trocou := false;
+        for j := 1 to i - 1 do
+            if v[j] > v[j + 1] then
+            begin
+                t := v[j];
+                v[j] := v[j + 1];
+                v[j + 1] := t;
+                trocas := trocas + 1;
+                trocou := true
+            end;
+        i := i - 1
+    end;
+    Bolha := trocas
+end;
+
+procedure Rapido(var v: Vetor; esq, dir: integer);
+var i, j, pivo, t: integer;
+begin
+    i := esq;
+    j := dir;
+    pivo := v[(esq + dir) div 2];
+    repeat
+        while v[i] < pivo do
+            i := i + 1;
+        while v[j] > pivo do
+            j := j - 1;
+        if i <= j then
+        begin
+            t := v[i];
+            v[i] := v[j];
+            v[j] := t;
+            i := i + 1;
+            j := j - 1
+        end
+    until i > j;
+    if esq < j then
+        Rapido(v, esq, j);
+    if i < dir then
+        Rapido(v, i, dir)
+end;
+
+begin
+    readln(n);
+    readln(semente);
+    for i := 1 to n do
+    begin
+        a[i] := Aleatorio(semente, 10000);
+        b[i] := a[i]
+    end;
+    trocas := Bolha(a, n);
+    Rapido(b, 1, n);
+    iguais := true;
+    for i := 1 to n do
+        if a[i] <> b[i] then
+            iguais := false;
+    for i := 2 to n do
+        if a[i - 1] > a[i] then
+            iguais := false;
+    writeln('Trocas no bubble sort: ', trocas);
+    writeln('Menor: ', a[1], ', maior: ', a[n], ', mediana: ', a[(n + 1) div 2]);
+    if iguais then
+        writeln('Ordenados e iguais')
+    else
+        writeln('Erro: os arrays ordenados são diferentes')
+end.
@@ -0,0 +1,34 @@
+{Benchmark: recursão de cauda com profundidade n (lê n; o input da suite é 1000000).
+ Soma acumula 1 + 2 + ... + n e Conta incrementa um parâmetro var n vezes; as chamadas
+ recursivas são a última instrução de cada sub-rotina e são compiladas como salto para o
+ início do corpo, por isso a pilha não cresce com a profundidade. Sem isso (--sem-cauda,
+ e os níveis O0 e O1 de benchmarks.py, ver recursao_cauda.falhas), a execução esgota a
+ pilha da EWVM, limitada a 1000000 células.}
+program RecursaoCauda;
+var
+  n, total: integer;
+
+function Soma(n, acc: integer): integer;
+begin
+  if n = 0 then
+    Soma := acc
+  else
+    Soma := Soma(n - 1, acc + n)
+end;
+
+procedure Conta(n: integer; var t: integer);
+begin
+  if n > 0 then
+  begin
+    t := t + 1;
+    Conta(n - 1, t)
+  end
+end;
+
+begin
+  readln(n);
+  writeln(Soma(n, 0));
+  total := 0;
+  Conta(n, total);
+  writeln(total)
+end.
@@ -0,0 +1,30 @@
+{Benchmark: literais de texto escritos dentro de ciclos e repetidos em vários pontos.
+ Sem a tabela de strings, cada PUSHS executado cria uma string nova na EWVM; com ela,
+ cada literal é criado uma vez antes do START e lido da frame global com PUSHG.}
+program StringsRepetidas;
+var
+  i, j, pares: integer;
+
+procedure Relatorio(n: integer);
+begin
+  write('Linha ');
+  write(n);
+  writeln(': concluida')
+end;
+
+begin
+  pares := 0;
+  for i := 1 to 200 do
+  begin
+    for j := 1 to 5 do
+      if (i + j) mod 2 = 0 then
+        pares := pares + 1;
+    if i mod 50 = 0 then
+      Relatorio(i)
+  end;
+  writeln('Total de pares encontrados: ', pares);
+  if pares > 100 then
+    writeln('Total de pares encontrados: ', 'muitos')
+  else
+    writeln('Total de pares encontrados: ', 'poucos')
+end.
@@ -0,0 +1,33 @@
+{Benchmark: atualizações de elementos de arrays (a[i] := a[i] + 1) e subexpressões
+ repetidas (x * y + x * y). Com a numeração de valores local, o endereço verificado de
+ a[i] e o segundo produto passam a um DUP do valor que já está no topo da pilha.}
+program Lvn;
+var
+    a: array[1..10] of integer;
+    m: array[1..9] of integer;
+    i, j, x, y, s: integer;
+begin
+    for i := 1 to 10 do
+        a[i] := i;
+    for i := 1 to 10 do
+        a[i] := a[i] + 1;
+    x := 3; y := 4;
+    s := x * y + x * y;
+    writeln(s);
+    s := x * y - 1 + x * y;
+    writeln(s);
+    for i := 1 to 3 do
+        for j := 1 to 3 do
+            m[(i - 1) * 3 + j] := i * j;
+    for i := 1 to 3 do
+        for j := 1 to 3 do
+            m[(i - 1) * 3 + j] := m[(i - 1) * 3 + j] * 2 + m[(i - 1) * 3 + j];
+    s := 0;
+    for i := 1 to 10 do
+        s := s + a[i] * a[i];
+    writeln(s);
+    writeln(m[6]);
+    a[2] := 5;
+    a[a[2]] := a[a[2]] + 1;
+    writeln(a[5])
+end.
@@ -0,0 +1,74 @@
+{Benchmark: varrimento de texto guardado num array de char. Lê um texto e um padrão
+ carácter a carácter, cada um terminado por um ponto (as palavras do texto separadas por
+ '_', ex: o_rato_roeu_a_roupa_do_rei_de_roma. e ro.), e um número de repetições (ex: 300).
+ Em cada repetição conta as vogais (com um conjunto), as palavras e as ocorrências do
+ padrão, pela procura ingénua que compara o padrão em cada posição do texto.}
+program VarrimentoTexto;
+const MAXT = 200;
+type
+    Cadeia = array[1..MAXT] of char;
+var
+    texto, padrao: Cadeia;
+    lt, lp, r, k, i, j, vogais, palavras, ocorrencias: integer;
+    ch: char;
+    dentro, igual: boolean;
+
+{ Lê carácteres para t até um ponto e devolve quantos foram lidos }
+function LerAtePonto(var t: Cadeia): integer;
+var
+    c: char;
+    n: integer;
+begin
+    n := 0;
+    read(c);
+    while (c <> '.') and (n < MAXT) do
+    begin
+        n := n + 1;
+        t[n] := c;
+        read(c)
+    end;
+    LerAtePonto := n
+end;
+
+begin
+    lt := LerAtePonto(texto);
+    lp := LerAtePonto(padrao);
+    readln(r);
+    for k := 1 to r do
+    begin
+        vogais := 0;
+        palavras := 0;
+        dentro := false;
+        for i := 1 to lt do
+        begin
+            ch := texto[i];
+            if ch in ['a', 'e', 'i', 'o', 'u'] then
+                vogais := vogais + 1;
+            if ch = '_' then
+                dentro := false
+            else if not dentro then
+            begin
+                dentro := true;
+                palavras := palavras + 1
+            end
+        end;
+        ocorrencias := 0;
+        for i := 1 to lt - lp + 1 do
+        begin
+            igual := true;
+            j := 1;
+            while igual and (j <= lp) do
+            begin
+                if texto[i + j - 1] <> padrao[j] then
+                    igual := false;
+                j := j + 1
+            end;
+            if igual then
+                ocorrencias := ocorrencias + 1
+        end
+    end;
+    writeln('Carácteres: ', lt);
+    writeln('Vogais: ', vogais);
+    writeln('Palavras: ', palavras);
+    writeln('Ocorrências do padrão: ', ocorrencias)
+end.
@@ -43,6 +43,9 @@ tokens = (
     'WHILE',
     'WITH',
 
+    # Diretivas do compilador (comentários {$...} antes de uma declaração)
+    'MEMO',
+
     # Literais e identificadores
     'ID',
     'REAL',
@@ -244,8 +247,16 @@ t_RANGE   = r'\.\.'  # Intervalo: '..'
 t_DOT     = r'\.'
 t_COLON   = r':'
 
+# Caracteres: 'a', '''' ou pelo código, #65 (útil para caracteres não imprimíveis)
 def t_CHAR(t):
-    r"\'([^']|\'\')\'"
+    r"\'([^']|\'\')\'|\#\d+"
+    if t.value.startswith('#'):
+        codigo = int(t.value[1:])
+        if codigo > 255:
+            print(f"Erro: código de carácter inválido '{t.value}' na linha {t.lineno}")
+            return
+        t.value = chr(codigo)
+        return t
     valor = t.value[1:-1].replace("''", "'")
     if len(valor) != 1:
         print(f"Erro: literal de carácter inválido '{t.value}' na linha {t.lineno}")
@@ -281,10 +292,17 @@ def t_ID(t):
     r'[A-Za-z_][A-Za-z0-9_]*'
     return t
 
+# Diretiva {$MEMO}: a function declarada a seguir guarda os resultados já calculados
+# numa tabela (tem de ser pura, ver ana_sem.visit_memo)
+def t_MEMO(t):
+    r'\{\$[mM][eE][mM][oO]\}'
+    return t
+
 # Comentários: { ... } ou (* ... *)
 def t_COMMENT(t):
     r'\{[^}]*\}|\(\*([^*]|\*+[^*)])*\*+\)'
-    pass
+    # Um comentário pode ocupar várias linhas
+    t.lexer.lineno += t.value.count('\n')
 
 # Ignorar espaços e tabs
 t_ignore = ' \t\r'
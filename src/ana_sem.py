@@ -1,3 +1,7 @@
+from analise_ast import percorrer, variaveis_escritas, variaveis_proprias
+from representacao_intermedia import cabe_inteiro
+
+
 class SemanticError(Exception):
     pass
 
@@ -36,8 +40,9 @@ class Scope:
     garantindo que declarações e utilizações de identificadores respeitam as regras
     de visibilidade e scope do Pascal ISO 7185.
     """
-    def __init__(self, parent=None):
-        self.symbols = {}
+    def __init__(self, parent=None, symbols=None):
+        # 'symbols' permite reutilizar uma tabela já construída (ex: campos de um record num WITH)
+        self.symbols = {} if symbols is None else symbols
         self.parent = parent
 
     """
@@ -192,9 +197,22 @@ class SemanticAnalyzer:
                         if key in campos:
                             raise SemanticError(f"Campo '{id_name}' já definido no record '{name}'.")
                         campos[key] = t_str
+                # Campos da parte variante (as alternativas partilham memória, mas cada campo
+                # continua a ser acedido pelo seu nome)
+                if tipo[2] is not None:
+                    _, campos_fixos, variant_info = self.visit_record(tipo)
+                    for k, t in campos_fixos.items():
+                        campos.setdefault(k, t)  # discriminador declarado na parte variante
+                    for _, inner_map in variant_info[2]:
+                        for k, t in inner_map.items():
+                            if k in campos:
+                                raise SemanticError(f"Campo '{k}' já definido no record '{name}'.")
+                            campos[k] = t
                 # Cria símbolo para o tipo record, com os campos associados
                 rec_sym = Symbol(name.lower(), name.lower())
                 rec_sym.fields = campos
+                # Índice dos campos como símbolos, construído uma única vez e partilhado por todos os WITH
+                rec_sym.field_symbols = {k: Symbol(k, t, kind='field') for k, t in campos.items()}
                 self.current_scope.define(name.lower(), rec_sym)
             else:
                 # Processamento de ENUMs
@@ -290,9 +308,11 @@ class SemanticAnalyzer:
     def visit_vars(self, node):
         # Extrai nomes das variáveis e o tipo declarado
         _, nomes, tipo = node
-        # Se for um tipo array, valida os limites do array
-        if tipo[0].lower() == 'array_type':
-            lower_node, upper_node = tipo[1] 
+        # Se for um tipo array, valida os limites do array (e os das dimensões seguintes, num
+        # array com várias dimensões)
+        dimensao = tipo
+        while dimensao[0].lower() == 'array_type':
+            lower_node, upper_node = dimensao[1]
             # Garante que os limites inferior e superior são expressões constantes
             if lower_node[0].lower() != 'const_expr':
                 raise SemanticError(f"Limite inferior do array deve ser constante, mas é {lower_node}")
@@ -313,6 +333,7 @@ class SemanticAnalyzer:
                 elif kind != 'integer':
                     raise SemanticError(
                         f"Limite do array deve ser do tipo INTEGER, mas é do tipo '{kind}'.")
+            dimensao = dimensao[2]
         # Normaliza o tipo da variável (transforma o nó da árvore num tipo como 'integer', 'real', etc.)
         type_str = self._normalize_type(tipo)
         for nome in nomes:
@@ -353,6 +374,9 @@ class SemanticAnalyzer:
                         self.visit(p[2])
                     lista.append((id_name.lower(), tipo_str))
         func_sym.params = lista
+        # Modos dos parâmetros e definição completa (usados na verificação de {$MEMO})
+        func_sym.modos = [p[0] for p in params or [] for _ in p[1]]
+        func_sym.defn = node
         # Guarda o tipo de retorno, depois de normalizado
         func_sym.return_type = self._normalize_type(return_type)
         # Visita o tipo de retorno se for complexo
@@ -452,6 +476,86 @@ class SemanticAnalyzer:
     
 
 
+    def visit_memo(self, node):
+        """
+        Verifica a diretiva {$MEMO} da function declarada imediatamente antes.
+        node = ('memo', nome)
+        A tabela de resultados é indexada pelos argumentos, por isso a function tem de ter
+        parâmetros inteiros passados por valor, um resultado escalar e ser pura (ver
+        _verificar_pura).
+        """
+        nome = node[1].lower()
+        sym = self.current_scope.resolve(nome)
+        if not sym.params:
+            raise SemanticError(f"{{$MEMO}}: a função '{node[1]}' não tem parâmetros.")
+        for (pnome, ptipo), modo in zip(sym.params, sym.modos):
+            if modo == 'param_var' or ptipo != 'integer':
+                raise SemanticError(
+                    f"{{$MEMO}}: o parâmetro '{pnome}' da função '{node[1]}' tem de ser um inteiro passado por valor.")
+        if sym.return_type not in ('integer', 'real', 'boolean', 'char'):
+            raise SemanticError(f"{{$MEMO}}: o resultado da função '{node[1]}' tem de ser de um tipo simples.")
+        self._verificar_pura(sym, set())
+
+
+
+    def _verificar_pura(self, sym, verificadas):
+        """
+        Verifica que o resultado de uma function só depende dos argumentos: não tem
+        parâmetros var nem sub-rotinas internas, não faz entrada/saída, só altera as suas
+        variáveis, só lê as suas variáveis e constantes, e só chama functions puras.
+        Lança SemanticError com o motivo, se não for pura.
+        """
+        verificadas.add(sym.name)
+        defn = sym.defn
+        if 'param_var' in sym.modos:
+            raise SemanticError(f"{{$MEMO}}: a função '{sym.name}' tem parâmetros var.")
+        block = defn[-1]
+        for d in block[1]:
+            if d and d[0] not in ('var_decl', 'consts', 'types'):
+                raise SemanticError(f"{{$MEMO}}: a função '{sym.name}' declara sub-rotinas ou rótulos.")
+        proprios = variaveis_proprias(defn)
+        for d in block[1]:
+            if d and d[0] in ('consts', 'types'):
+                proprios.update(n.lower() for n, _ in d[1])
+        alteradas = variaveis_escritas(block, lambda n: None) - proprios
+        if alteradas:
+            raise SemanticError(
+                f"{{$MEMO}}: a função '{sym.name}' altera variáveis exteriores: {', '.join(sorted(alteradas))}.")
+        for n in percorrer(('compound', block[2])):
+            if n[0] not in ('var', 'call') or not isinstance(n[1], str):
+                continue
+            nome = n[1].lower()
+            if nome in proprios or nome in ('real', 'integer'):
+                continue
+            if nome in ('write', 'writeln', 'read', 'readln'):
+                raise SemanticError(f"{{$MEMO}}: a função '{sym.name}' faz entrada/saída ({nome}).")
+            if nome not in self._nomes_visiveis():
+                # Campo de um record aberto por um WITH sobre uma variável da função
+                continue
+            outro = self.current_scope.resolve(nome)
+            if outro.kind == 'const' or outro.type == 'enum':
+                continue
+            if outro.type == 'function' and getattr(outro, 'defn', None) is not None:
+                if outro.name not in verificadas:
+                    self._verificar_pura(outro, verificadas)
+                continue
+            raise SemanticError(f"{{$MEMO}}: a função '{sym.name}' usa '{nome}', que não é uma constante nem uma função pura.")
+
+
+
+    def _nomes_visiveis(self):
+        """
+        Nomes declarados no scope atual e nos scopes exteriores.
+        """
+        nomes = set()
+        scope = self.current_scope
+        while scope:
+            nomes.update(scope.symbols)
+            scope = scope.parent
+        return nomes
+
+
+
     def visit_record(self, node):
         _, field_list, variant_part = node
 
@@ -474,7 +578,8 @@ class SemanticAnalyzer:
             # Verifica se o discriminador é um campo existente e se é de tipo ordinal
             key_disc = discrim_id.lower()
             if key_disc not in fields_map:
-                raise SemanticError(f"Discriminador '{discrim_id}' não declarado como campo do record.")
+                # 'case tag: tipo of' declara o discriminador como um novo campo do record
+                fields_map[key_disc] = discrim_tipo_token.lower()
             discrim_tipo = fields_map[key_disc]
             if discrim_tipo not in ('integer', 'char', 'boolean', 'enum'):
                 raise SemanticError(
@@ -484,6 +589,9 @@ class SemanticAnalyzer:
             # Processa cada variante associada ao discriminador
             branches = []
             for const_list, inner_fields in variant_list:
+                # Cada alternativa tem uma única constante (nó 'const') ou uma lista delas
+                if isinstance(const_list, tuple):
+                    const_list = [const_list]
                 # Valida as constantes associadas a cada variante
                 for const_node in const_list:
                     const_tipo = self.visit(const_node)
@@ -601,8 +709,9 @@ class SemanticAnalyzer:
             if nome_var == getattr(self, 'current_function', None):
                 # Se for o retorno, verifica tipo de retorno
                 expr_type = self.visit(expr).lower()
-                # Busca símbolo da função no scope global (onde definimos return_type)
-                func_sym = self.global_scope.resolve(nome_var.lower())
+                # Busca o símbolo da função (onde definimos return_type) nos scopes envolventes,
+                # que incluem o scope onde uma função interna foi declarada
+                func_sym = self.current_scope.resolve(nome_var.lower())
                 ret_type = func_sym.return_type.lower()
                 if expr_type != ret_type:
                     raise SemanticError(
@@ -619,11 +728,13 @@ class SemanticAnalyzer:
                     raise SemanticError(f"Não pode atribuir a constante '{nome_var}'")
                 var_type = self.current_scope.symbols[nome_var].type
             else:
-                # Se não encontrar no scope local, tenta no scope global
-                if nome_var in self.global_scope.symbols:
-                    var_type = self.global_scope.symbols[nome_var].type
-                else:
+                # Se não encontrar no scope local, procura nos scopes envolventes (WITH, global)
+                scope = self.current_scope.parent
+                while scope is not None and nome_var not in scope.symbols:
+                    scope = scope.parent
+                if scope is None:
                     raise SemanticError(f"Variável '{nome_var}' não declarada.")
+                var_type = scope.symbols[nome_var].type
 
         else:
             # Caso não seja variável, resolve tipo usando visit
@@ -647,8 +758,16 @@ class SemanticAnalyzer:
         # node = ('var', nome)
         _, nome = node
         key = nome.lower()
-        # se ainda não foi inicializada, erro
-        if key not in self.initialized:
+        # Uma function sem argumentos é chamada apenas pelo nome
+        try:
+            sym = self.current_scope.resolve(key)
+        except SemanticError:
+            sym = None
+        if hasattr(sym, 'return_type') and key != getattr(self, 'current_function', None):
+            return sym.return_type
+        # se ainda não foi inicializada, erro (os campos de records acedidos dentro de um
+        # WITH não são seguidos individualmente)
+        if key not in self.initialized and not self._campo_de_with(key):
             raise SemanticError(f"Variável '{nome}' usada antes de inicialização.")
 
         # Se a variável foi inicializada, resolve e retorna o tipo
@@ -657,11 +776,22 @@ class SemanticAnalyzer:
     
 
 
+    def _campo_de_with(self, key):
+        try:
+            return self.current_scope.resolve(key).kind == 'field'
+        except SemanticError:
+            return False
+
+
+
     def visit_array(self, node):
         _, base, indice = node
-        key = base[1].lower()
-        # Resolve o tipo da variável base (deve ser um array)
-        base_type = self.current_scope.resolve(key).type
+        # Resolve o tipo da base (deve ser um array): uma variável ou, num array com várias
+        # dimensões (ex: m[i][j]), o elemento de outra indexação
+        if base[0] == 'var':
+            base_type = self.current_scope.resolve(base[1].lower()).type
+        else:
+            base_type = self.visit(base)
         # Verifica se a base é um array
         if not (isinstance(base_type, tuple) and base_type[0] == 'array'):
             raise SemanticError(f"Tentativa de indexar uma variável que não é um array, mas do tipo '{base_type}'")
@@ -899,38 +1029,55 @@ class SemanticAnalyzer:
 
 
 
+    # Texto de um designador para as mensagens de erro (ex: v[i].p)
+    def _texto_designador(self, node):
+        if node[0] == 'var':
+            return node[1]
+        if node[0] == 'array':
+            indice = node[2]
+            texto = {'var': indice[1], 'const': indice[-1]}.get(indice[0], '...')
+            return f"{self._texto_designador(node[1])}[{texto}]"
+        return f"{self._texto_designador(node[1])}.{node[2]}"
+
+
+
     def visit_with(self, node):
         _, var_list, stmt = node
 
-        # 1) Prepara um novo scope filho onde vamos introduzir os campos
+        # 1) Guarda o scope atual; cada record do WITH acrescenta um scope filho
         old_scope = self.current_scope
-        with_scope = Scope(parent=old_scope)
+        with_scope = old_scope
 
-        # 2) Para cada variável em WITH, extrai os campos do seu tipo record
+        # 2) Para cada variável em WITH, usa o índice de campos do seu tipo record
         for var_node in var_list:
-            # Só são suportadas variáveis simples (não suportamos, por exemplo, variáveis do tipo 'array' ou 'pointer')
-            if var_node[0].lower() != 'var':
-                raise SemanticError(f"WITH só suporta variáveis simples, mas recebeu {var_node[0]!r}.")
-            var_name = var_node[1].lower()
-
-            # resolve a variável no scope anterior
-            sym = old_scope.resolve(var_name)
+            # A variável (simples, elemento de um array ou campo de um record) é resolvida no
+            # scope anterior, incluindo os records já abertos por este WITH, pois
+            # 'with a, b do' equivale a 'with a do with b do'
+            if var_node[0].lower() == 'var':
+                nome = var_node[1]
+                var_type = with_scope.resolve(nome.lower()).type
+            else:
+                nome = self._texto_designador(var_node)
+                self.current_scope = with_scope
+                var_type = self.visit(var_node)
+                self.current_scope = old_scope
             # Obtém o nome do tipo da variável, que deve ser um 'record' definido anteriormente
-            type_name = sym.type.lower()
-            type_sym = old_scope.resolve(type_name)
+            type_name = var_type.lower() if isinstance(var_type, str) else var_type
+            try:
+                type_sym = old_scope.resolve(type_name) if isinstance(type_name, str) else None
+            except SemanticError:
+                # Tipos predefinidos (integer, char, ...) não têm símbolo
+                type_sym = None
 
             # Valida que o tipo da variável é efetivamente um 'record'
-            if not hasattr(type_sym, 'fields'):
+            if not hasattr(type_sym, 'field_symbols'):
                 raise SemanticError(
-                    f"Variável '{var_node[1]}' em WITH não é um record, mas é do tipo '{sym.type}'."
+                    f"Variável '{nome}' em WITH não é um record, mas é do tipo '{var_type}'."
                 )
 
-            # Define cada campo do record no scope atual do 'WITH'
-            for field_name, field_type in type_sym.fields.items():
-                # Os nomes dos campos já estão em minúsculas na definição de 'fields'
-                with_scope.define(field_name,
-                                  field_type,
-                                  kind='var')
+            # O scope do WITH reutiliza o índice de campos do record (calculado em visit_types),
+            # em vez de copiar os campos a cada WITH; records mais à direita escondem os anteriores
+            with_scope = Scope(parent=with_scope, symbols=type_sym.field_symbols)
 
         # 3) Passa a usar o scope alargado dentro do bloco 'WITH'
         self.current_scope = with_scope
@@ -968,7 +1115,10 @@ class SemanticAnalyzer:
 
 
     def visit_const(self, node):
-        _, type, _ = node
+        _, type, valor = node
+        # Os literais inteiros têm de caber nos inteiros de 64 bits da máquina
+        if type.lower() == 'integer' and not cabe_inteiro(valor):
+            raise SemanticError(f"Literal inteiro {valor} fora dos limites dos inteiros de 64 bits.")
         # A função visita o nó de uma constante e retorna o tipo da constante
         return type
 
@@ -1021,6 +1171,17 @@ class SemanticAnalyzer:
     
 
 
+    def visit_range(self, node):
+        # Intervalo dentro de um conjunto literal: ('range', lo, hi)
+        _, lo, hi = node
+        tipo_lo = self.visit(lo)
+        tipo_hi = self.visit(hi)
+        if tipo_lo != tipo_hi:
+            raise SemanticError(f"Limites do intervalo têm tipos diferentes: {tipo_lo} e {tipo_hi}.")
+        return tipo_lo
+
+
+
     def visit_binop(self, node):
         _, op, esq, dir_ = node
         op = op.lower()
@@ -1035,6 +1196,13 @@ class SemanticAnalyzer:
         base_esq = tipo_base(tipo_esq)
         base_dir = tipo_base(tipo_dir)
     
+        # Operações entre conjuntos: + (união), * (interseção) e - (diferença)
+        if op in ['+', '-', '*'] and base_esq == 'set' and base_dir == 'set':
+            for t in (tipo_esq, tipo_dir):
+                if isinstance(t, tuple) and t[1] != 'unknown':
+                    return t
+            return 'set'
+
         # Operadores aritméticos (+, -, *, /)
         if op in ['+', '-', '*', '/']:
             if base_esq not in ['integer', 'real'] or base_dir not in ['integer', 'real']:
@@ -1054,6 +1222,8 @@ class SemanticAnalyzer:
         if op in ['=', '<>']:
             if {base_esq, base_dir} <= {'integer', 'real'}:
                 return 'boolean'
+            if base_esq == base_dir == 'set':
+                return 'boolean'
             if tipo_esq != tipo_dir:
                 raise SemanticError(f"Comparação '{op}' requer operandos compatíveis, mas recebeu {tipo_esq} e {tipo_dir}.")
             if base_esq not in ['boolean', 'char', 'texto', 'set']:
@@ -1064,6 +1234,9 @@ class SemanticAnalyzer:
         elif op in ['<', '<=', '>', '>=']:
             if base_esq == base_dir and base_esq in ['integer','real','char','texto']:
                 return 'boolean'
+            # Inclusão de conjuntos (<= subconjunto, >= superconjunto)
+            if base_esq == base_dir == 'set' and op in ['<=', '>=']:
+                return 'boolean'
             raise SemanticError(
                 f"Operador relacional '{op}' não suportado para tipos {tipo_esq} e {tipo_dir}."
             )
@@ -1071,8 +1244,9 @@ class SemanticAnalyzer:
         # Operador IN (verifica se o elemento pertence a um conjunto)
         if op == 'in':
             if tipo_dir == 'set':
+                # Variável de conjunto: o tipo dos elementos não é guardado, basta que seja ordinal
                 elem_type = tipo_dir.lower()
-                if tipo_esq != 'enum':
+                if tipo_esq not in ('enum', 'integer', 'char', 'boolean'):
                     raise SemanticError(f"Elemento do tipo {tipo_esq} não compatível com o conjunto de {elem_type}.")
             else:
                 if not (isinstance(tipo_dir, tuple)):
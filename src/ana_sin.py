@@ -1,4 +1,5 @@
 from ana_lex import tokens, build_lexer
+from analise_ast import NoComLinha
 import ply.yacc as yacc
 
 # Definição da tupla 'precedence'
@@ -26,10 +27,15 @@ precedence = (
     ('left', 'COLON'),
 )
 
+# Nó com a linha onde começa o primeiro símbolo da regra (usada pelo mapa de fontes do
+# CodeGenerator); só as instruções e as declarações de sub-rotinas guardam a linha
+def com_linha(p, node):
+    return NoComLinha(node, p.lineno(1))
+
 # PROGRAM <ID> ';' <block> '.'
 def p_program(p):
     'program : PROGRAM ID SEMI block DOT'
-    p[0] = ('program', p[2], p[4])
+    p[0] = com_linha(p, ('program', p[2], p[4]))
 
 
 
@@ -43,13 +49,17 @@ def p_block(p):
 # Declarações
 # Permite zero ou mais declarações sequenciais (const, type, var, ...)
 # Se não houver nenhuma declaração, devolve lista vazia.
+# Uma function precedida da diretiva {$MEMO} é seguida na lista por ('memo', nome).
 def p_declarations(p):
     '''declarations : declarations declaration
+                    | declarations MEMO function_declaration
                     | empty'''
     if p[1] is None:
         p[0] = []
     elif len(p) == 3:
         p[0] = p[1] + [p[2]]
+    else:
+        p[0] = p[1] + [p[3], ('memo', p[3][1])]
 
 
 
@@ -159,7 +169,7 @@ def p_var_item(p):
 # Define uma função com nome, parâmetros, tipo de retorno e corpo
 def p_function_declaration(p):
     'function_declaration : FUNCTION ID LPAREN params RPAREN COLON type SEMI block SEMI'
-    p[0] = ('function', p[2], p[4], p[7], p[9])
+    p[0] = com_linha(p, ('function', p[2], p[4], p[7], p[9]))
 
 
 
@@ -167,7 +177,7 @@ def p_function_declaration(p):
 # Define um procedimento (sem retorno) com nome, parâmetros e corpo
 def p_procedure_declaration(p):
     'procedure_declaration : PROCEDURE ID LPAREN params RPAREN SEMI block SEMI'
-    p[0] = ('procedure', p[2], p[4], p[7])
+    p[0] = com_linha(p, ('procedure', p[2], p[4], p[7]))
 
 
 
@@ -201,9 +211,23 @@ def p_id_type(p):
     p[0] = ('id_type', p[1])
 
 # Reconhece arrays indexados por intervalos (subranges).
+# Um array com várias dimensões, ex: array[1..3, 1..4] of real, é o mesmo que
+# array[1..3] of array[1..4] of real (os elementos ficam num único bloco contíguo).
 def p_array_type_range(p):
-    'array_type : ARRAY LBRACKET range RBRACKET OF type'
-    p[0] = ('array_type', p[3], p[6])
+    'array_type : ARRAY LBRACKET range_list RBRACKET OF type'
+    tipo = p[6]
+    for r in reversed(p[3]):
+        tipo = ('array_type', r, tipo)
+    p[0] = tipo
+
+# Lista de intervalos das dimensões de um array, separados por vírgulas
+def p_range_list(p):
+    '''range_list : range
+                  | range_list COMMA range'''
+    if len(p) == 2:
+        p[0] = [p[1]]
+    else:
+        p[0] = p[1] + [p[3]]
 
 # Reconhece tipos enumerados, que consistem numa lista de identificadores entre parêntesis.
 # Exemplo: (Red, Green, Blue)
@@ -401,22 +425,25 @@ def p_statement(p):
 # Exemplo: x := 10
 def p_assignment(p):
     'assignment : variable ASSIGN expression'
-    p[0] = ('assign', p[1], p[3])
+    p[0] = com_linha(p, ('assign', p[1], p[3]))
 
 
 
 # Variáveis em Pascal podem ser:
 # - Simples (ex: x)
-# - Indexadas (ex: a[1])
+# - Indexadas (ex: a[1]; a[i, j] é o mesmo que a[i][j])
 # - Campos de registo (ex: pessoa.nome)
 def p_variable(p):
-    '''variable : variable LBRACKET expression RBRACKET
+    '''variable : variable LBRACKET expression_list RBRACKET
                 | variable DOT ID
                 | ID'''
     if len(p) == 2:
         p[0] = ('var', p[1])
     elif p[2] == '[':
-        p[0] = ('array', p[1], p[3])
+        node = p[1]
+        for indice in p[3]:
+            node = ('array', node, indice)
+        p[0] = node
     else:
         p[0] = ('field', p[1], p[3])
 
@@ -428,9 +455,9 @@ def p_procedure_call(p):
     '''procedure_call : ID LPAREN expression_list RPAREN
                       | ID'''  
     if len(p) == 2:
-        p[0] = ('call', p[1], [])
+        p[0] = com_linha(p, ('call', p[1], []))
     else:
-        p[0] = ('call', p[1], p[3])
+        p[0] = com_linha(p, ('call', p[1], p[3]))
 
 
 
@@ -440,9 +467,9 @@ def p_if_statement(p):
     '''if_statement : IF expression THEN statement ELSE statement
                     | IF expression THEN statement %prec IFX'''   
     if len(p) == 5:
-        p[0] = ('if', p[2], p[4], None)
+        p[0] = com_linha(p, ('if', p[2], p[4], None))
     else:
-        p[0] = ('if', p[2], p[4], p[6])
+        p[0] = com_linha(p, ('if', p[2], p[4], p[6]))
 
 
 
@@ -452,7 +479,7 @@ def p_for_statement(p):
     '''for_statement : FOR ID ASSIGN expression TO expression DO statement
                      | FOR ID ASSIGN expression DOWNTO expression DO statement'''
     direction = 'to' if p[5].lower() == 'to' else 'downto'
-    p[0] = ('for', p[2], p[4], p[6], direction, p[8])
+    p[0] = com_linha(p, ('for', p[2], p[4], p[6], direction, p[8]))
 
 
 
@@ -460,7 +487,7 @@ def p_for_statement(p):
 # Exemplo: while x < 10 do x := x + 1;
 def p_while_statement(p):
     'while_statement : WHILE expression DO statement'
-    p[0] = ('while', p[2], p[4])
+    p[0] = com_linha(p, ('while', p[2], p[4]))
 
 
 
@@ -468,7 +495,7 @@ def p_while_statement(p):
 # Exemplo: repeat writeln(x); x := x + 1; until x > 10;
 def p_repeat_statement(p):
     'repeat_statement : REPEAT statement_list UNTIL expression'
-    p[0] = ('repeat', p[2], p[4])
+    p[0] = com_linha(p, ('repeat', p[2], p[4]))
 
 
 
@@ -476,7 +503,7 @@ def p_repeat_statement(p):
 # Permite selecionar entre vários ramos com base numa expressão.
 def p_case_statement(p):
     'case_statement : CASE expression OF case_list END'
-    p[0] = ('case', p[2], p[4])
+    p[0] = com_linha(p, ('case', p[2], p[4]))
 
 # Lista de ramos do CASE, cada um separado por ';'
 def p_case_list(p):
@@ -506,7 +533,7 @@ def p_constant_list(p):
 # Instrução WITH (ex: with pessoa do writeln(nome);)
 def p_with_statement(p):
     'with_statement : WITH variable_list DO statement'
-    p[0] = ('with', p[2], p[4])
+    p[0] = com_linha(p, ('with', p[2], p[4]))
 
 # Lista de variáveis usada no WITH
 def p_variable_list(p):
@@ -523,7 +550,7 @@ def p_variable_list(p):
 # Ex: goto 100;
 def p_goto_statement(p):
     'goto_statement : GOTO INTEGER'
-    p[0] = ('goto', p[2])
+    p[0] = com_linha(p, ('goto', p[2]))
 
 
 
@@ -531,7 +558,7 @@ def p_goto_statement(p):
 # Ex: 100: writeln('ola');
 def p_labeled_statement(p):
     'labeled_statement : INTEGER COLON statement'
-    p[0] = ('label_stmt', p[1], p[3])
+    p[0] = com_linha(p, ('label_stmt', p[1], p[3]))
 
 
 
@@ -553,7 +580,6 @@ def p_expression(p):
                   | TIPO LPAREN expression_list RPAREN
                   | ID LPAREN expression_list RPAREN
                   | LPAREN expression RPAREN
-                  | LBRACKET expression_list RBRACKET
                   | NOT expression
                   | expression COLON expression
                   | expression PLUS expression
@@ -586,13 +612,38 @@ def p_expression(p):
         p[0] = p[2]
     elif p[2] == '(':
         p[0] = ('call', p[1], p[3])
-    elif p[1] == '[':
-        p[0] = ('set_lit', p[2])
     else:
         p[0] = ('binop', p[2], p[1], p[3])
 
 
 
+# Conjuntos literais — lista de elementos e intervalos entre parêntesis retos, ou vazio
+# Exemplo: [Mon, Wed..Fri] ou []
+def p_expression_set(p):
+    '''expression : LBRACKET set_elem_list RBRACKET
+                  | LBRACKET RBRACKET'''
+    p[0] = ('set_lit', p[2] if len(p) == 4 else [])
+
+# Lista de elementos de um conjunto literal, separados por vírgulas
+def p_set_elem_list(p):
+    '''set_elem_list : set_elem
+                     | set_elem_list COMMA set_elem'''
+    if len(p) == 2:
+        p[0] = [p[1]]
+    else:
+        p[0] = p[1] + [p[3]]
+
+# Elemento de um conjunto literal: uma expressão ou um intervalo (ex: 'a'..'z')
+def p_set_elem(p):
+    '''set_elem : expression
+                | expression RANGE expression'''
+    if len(p) == 2:
+        p[0] = p[1]
+    else:
+        p[0] = ('range', p[1], p[3])
+
+
+
 # Lista de expressões — usada em chamadas de função, construtores, etc.
 def p_expression_list(p):
     '''expression_list : expression
@@ -630,4 +681,4 @@ def parse(data):
     Retorna a estrutura de programa ou None se erro.
     """
     lexer = build_lexer()
-    return parser.parse(data, lexer=lexer)
\ No newline at end of file
+    return parser.parse(data, lexer=lexer, tracking=True)
\ No newline at end of file
@@ -0,0 +1,309 @@
+# Análises sobre a AST usadas pelo gerador de código (antes da geração das instruções).
+# Os nós da AST são tuplos cujo primeiro elemento é a etiqueta do nó (ex: ('assign', lhs,
+# expr)); os filhos podem ser outros nós ou listas de nós.
+
+# Chamadas que não são sub-rotinas do utilizador
+PREDEFINIDAS = ('write', 'writeln', 'read', 'readln', 'real', 'integer')
+
+
+# Nó da AST com a linha do programa fonte onde começa (instruções e declarações de
+# sub-rotinas, ver ana_sin). Continua a ser um tuplo, por isso as análises e os passos que
+# não conhecem as linhas tratam-no como os outros nós.
+class NoComLinha(tuple):
+    def __new__(cls, node, linha):
+        novo = super().__new__(cls, node)
+        novo.linha = linha
+        return novo
+
+
+# Devolve 'novo' (uma cópia reconstruída de 'original') com a linha de 'original', se tiver
+def manter_linha(original, novo):
+    linha = getattr(original, 'linha', None)
+    if linha is None or not isinstance(novo, tuple) or getattr(novo, 'linha', None) is not None:
+        return novo
+    return NoComLinha(novo, linha)
+
+
+# Itera os nós filhos de um nó (incluindo os que estão dentro de listas)
+def filhos(node):
+    for x in node[1:]:
+        if isinstance(x, tuple) and x and isinstance(x[0], str):
+            yield x
+        elif isinstance(x, (list, tuple)):
+            for y in x:
+                if isinstance(y, tuple) and y and isinstance(y[0], str):
+                    yield y
+                elif isinstance(y, (list, tuple)):
+                    # Listas de pares, ex: os ramos de um case [(constantes, instruções), ...]
+                    yield from filhos(('', *y))
+
+
+# Percorre um nó e todos os seus descendentes (em pré-ordem)
+def percorrer(node):
+    pendentes = [node]
+    while pendentes:
+        n = pendentes.pop()
+        yield n
+        pendentes.extend(reversed(list(filhos(n))))
+
+
+# Nome (em minúsculas) da variável na raiz de um designador: a[i].x -> 'a'
+def raiz(node):
+    while node[0] in ('array', 'field'):
+        node = node[1]
+    return node[1].lower() if node[0] == 'var' else None
+
+
+# Nomes das variáveis que podem ser alteradas por um nó (instrução, bloco ou sub-rotina):
+# destinos de atribuições, variáveis de ciclos for, argumentos de read/readln e de parâmetros
+# var (também em chamadas expandidas em linha), e records abertos por um WITH. 'modos(nome)'
+# devolve os modos dos parâmetros da sub-rotina chamada ('param_val', 'param_var', ...) ou
+# None se não for conhecida; nesse caso, todos os argumentos que são variáveis são
+# considerados alterados.
+def variaveis_escritas(node, modos):
+    escritas = set()
+    for n in percorrer(node):
+        tag = n[0]
+        if tag == 'assign':
+            escritas.add(raiz(n[1]))
+        elif tag == 'for':
+            var = n[1]
+            escritas.add(var[1].lower() if isinstance(var, tuple) else var.lower())
+        elif tag == 'with':
+            escritas.update(raiz(v) for v in n[1])
+        elif tag in ('call', 'inline'):
+            nome = n[1].lower()
+            if nome in ('write', 'writeln'):
+                continue
+            if nome in ('read', 'readln'):
+                ms = ['param_var'] * len(n[2])
+            else:
+                ms = modos(nome)
+                if ms is None:
+                    ms = ['param_var'] * len(n[2])
+            for arg, modo in zip(n[2], ms):
+                if modo == 'param_var' and arg[0] in ('var', 'array', 'field'):
+                    escritas.add(raiz(arg))
+    escritas.discard(None)
+    return escritas
+
+
+# Verifica se um nó chama alguma sub-rotina do utilizador além de 'propria' (nome em
+# minúsculas); 'e_subrotina(nome)' diz se um nome isolado é uma function sem argumentos
+def chama_outras(node, propria, e_subrotina):
+    for n in percorrer(node):
+        if n[0] in ('call', 'inline'):
+            nome = n[1].lower()
+            if nome not in PREDEFINIDAS and nome != propria:
+                return True
+        elif n[0] == 'var' and isinstance(n[1], str):
+            nome = n[1].lower()
+            if nome != propria and e_subrotina(nome):
+                return True
+    return False
+
+
+# Nomes das variáveis da frame de uma sub-rotina (parâmetros por valor, variáveis locais e
+# o resultado), isto é, as que não podem ser o mesmo array que outro nome
+def variaveis_proprias(defn):
+    nomes = {defn[1].lower()}
+    for modo, ids, _ in defn[2] or []:
+        if modo != 'param_var':
+            nomes.update(i.lower() for i in ids)
+    for d in defn[-1][1]:
+        if d and d[0] == 'var_decl':
+            for _, ids, _ in d[1]:
+                nomes.update(i.lower() for i in ids)
+    return nomes
+
+
+# Chamadas recursivas da sub-rotina 'nome' (em minúsculas) em posição de cauda, isto é,
+# a última coisa executada antes de regressar: num procedure, a instrução 'nome(...)'; numa
+# function, a atribuição 'nome := nome(...)'. Segue a última instrução dos blocos
+# begin..end, os dois ramos dos if, os ramos dos case e as instruções com etiqueta.
+def chamadas_cauda(stmts, nome, e_function):
+    encontradas = []
+
+    def ultima(lista):
+        lista = [s for s in lista if s and s[0] != 'empty']
+        if lista:
+            visitar(lista[-1])
+
+    def visitar(stmt):
+        if not stmt:
+            return
+        tag = stmt[0]
+        if tag == 'compound':
+            ultima(stmt[1])
+        elif tag == 'if':
+            visitar(stmt[2])
+            visitar(stmt[3])
+        elif tag == 'case':
+            for _, ramo in stmt[2]:
+                ultima(ramo)
+        elif tag == 'label_stmt':
+            visitar(stmt[2])
+        elif tag == 'call' and not e_function and stmt[1].lower() == nome:
+            encontradas.append(stmt)
+        elif tag == 'assign' and e_function and stmt[1][0] == 'var' and stmt[1][1].lower() == nome \
+                and stmt[2][0] == 'call' and stmt[2][1].lower() == nome:
+            encontradas.append(stmt)
+
+    ultima(stmts)
+    return encontradas
+
+
+# Nomes declarados por uma sub-rotina (parâmetros, variáveis, constantes e sub-rotinas
+# internas), que escondem os de nível global dentro dela
+def nomes_locais(defn):
+    nomes = {defn[1].lower()}
+    for _, ids, _ in defn[2] or []:
+        nomes.update(i.lower() for i in ids)
+    for d in defn[-1][1]:
+        if not d:
+            continue
+        if d[0] == 'var_decl':
+            for _, ids, _ in d[1]:
+                nomes.update(i.lower() for i in ids)
+        elif d[0] == 'consts':
+            nomes.update(nome.lower() for nome, _ in d[1])
+        elif d[0] in ('function', 'procedure'):
+            nomes.add(d[1].lower())
+    return nomes
+
+
+# Nomes usados por uma sub-rotina (ou pelas sub-rotinas declaradas nela) que não são
+# declarados por ela, isto é, que pertencem a um âmbito exterior
+def nomes_livres(defn):
+    usados = set()
+    for n in percorrer(('compound', defn[-1][2])):
+        if n[0] in ('var', 'call') and isinstance(n[1], str):
+            usados.add(n[1].lower())
+        elif n[0] == 'for' and isinstance(n[1], str):
+            usados.add(n[1].lower())
+    for d in defn[-1][1]:
+        if d and d[0] in ('function', 'procedure'):
+            usados |= nomes_livres(d)
+    return usados - nomes_locais(defn)
+
+
+# Nomes (em minúsculas) das sub-rotinas que podem ser executadas várias vezes: as chamadas
+# em mais de um sítio, dentro de um ciclo, por si próprias ou por outra sub-rotina que pode
+# ser executada várias vezes. Uma function sem argumentos é chamada com ('var', nome), menos
+# no destino de uma atribuição (o resultado); o corpo de uma chamada expandida em linha conta
+# no sítio da chamada.
+def subrotinas_repetidas(node):
+    nomes = {n[1].lower() for n in percorrer(node) if n[0] in ('function', 'procedure')}
+    # nome -> [(sub-rotina que chama (None no programa principal), dentro de um ciclo)]
+    sitios = {nome: [] for nome in nomes}
+    pendentes = [(node, None, False)]
+    while pendentes:
+        n, atual, ciclo = pendentes.pop()
+        tag = n[0]
+        if tag == 'inline':
+            pendentes.extend((f, atual, ciclo) for f in (*n[2], n[3][-1]))
+            continue
+        if tag == 'assign' and n[1][0] == 'var':
+            pendentes.append((n[2], atual, ciclo))
+            continue
+        if tag in ('function', 'procedure'):
+            atual, ciclo = n[1].lower(), False
+        elif tag in ('call', 'var') and isinstance(n[1], str) and n[1].lower() in nomes:
+            sitios[n[1].lower()].append((atual, ciclo))
+        ciclo = ciclo or tag in ('while', 'for', 'repeat')
+        pendentes.extend((f, atual, ciclo) for f in filhos(n))
+    repetidas = {nome for nome, s in sitios.items()
+                 if len(s) > 1 or any(ciclo or quem == nome for quem, ciclo in s)}
+    novas = repetidas
+    while novas:
+        novas = {nome for nome, s in sitios.items()
+                 if nome not in repetidas and any(quem in repetidas for quem, _ in s)}
+        repetidas |= novas
+    return repetidas
+
+
+# Literais de texto usados por um nó: texto -> [número de ocorrências, executada várias vezes],
+# em que uma ocorrência é executada várias vezes se está dentro de um ciclo ou do corpo de
+# uma sub-rotina que pode ser executada várias vezes (ver subrotinas_repetidas). O corpo de
+# uma chamada expandida em linha conta no sítio da chamada.
+def literais_texto(node):
+    repetidas = subrotinas_repetidas(node)
+    literais = {}
+    pendentes = [(node, False)]
+    while pendentes:
+        n, repetida = pendentes.pop()
+        tag = n[0]
+        if tag == 'const' and n[1].lower() == 'texto':
+            info = literais.setdefault(n[2], [0, False])
+            info[0] += 1
+            info[1] = info[1] or repetida
+            continue
+        if tag == 'inline':
+            pendentes.extend((f, repetida) for f in (*n[2], n[3][-1]))
+            continue
+        if tag in ('function', 'procedure'):
+            repetida = n[1].lower() in repetidas
+        repetida = repetida or tag in ('while', 'for', 'repeat')
+        pendentes.extend((f, repetida) for f in filhos(n))
+    return literais
+
+
+# Indexações de cada array (nome em minúsculas) com um índice que não é um literal, isto é,
+# calculado em tempo de execução: nome -> [número de ocorrências, executada várias vezes],
+# em que uma indexação é executada várias vezes se está dentro de um ciclo ou do corpo de
+# uma sub-rotina. Num array com várias dimensões conta a indexação mais interior.
+# Uma variável passada inteira a uma sub-rotina conta como indexada várias vezes (o corpo
+# pode indexá-la, e numa expansão em linha fá-lo através da mesma localização).
+def indexacoes_variaveis(node):
+    indexacoes = {}
+    pendentes = [(node, False)]
+    while pendentes:
+        n, repetida = pendentes.pop()
+        tag = n[0]
+        if tag == 'array' and n[1][0] == 'var' and n[2][0] != 'const':
+            info = indexacoes.setdefault(n[1][1].lower(), [0, False])
+            info[0] += 1
+            info[1] = info[1] or repetida
+        elif tag in ('call', 'inline'):
+            for arg in n[2]:
+                if arg[0] == 'var':
+                    info = indexacoes.setdefault(arg[1].lower(), [0, False])
+                    info[0] += 1
+                    info[1] = True
+        repetida = repetida or tag in ('while', 'for', 'repeat', 'function', 'procedure')
+        pendentes.extend((f, repetida) for f in filhos(n))
+    return indexacoes
+
+
+# Cópia de um nó com as leituras da variável 'nome' (em minúsculas) trocadas pelo nó 'valor'.
+# Os destinos das atribuições ficam como estão, e a troca não entra nos WITH (um campo pode
+# ter o mesmo nome) nem nas definições das sub-rotinas expandidas em linha (só nos argumentos).
+def substituir_variavel(node, nome, valor):
+    if isinstance(node, list):
+        return [substituir_variavel(x, nome, valor) for x in node]
+    if not isinstance(node, tuple):
+        return node
+    if not node or not isinstance(node[0], str):
+        return tuple(substituir_variavel(x, nome, valor) for x in node)
+    tag = node[0]
+    if tag == 'var' and isinstance(node[1], str) and node[1].lower() == nome:
+        return valor
+    if tag == 'with':
+        return node
+    if tag == 'inline':
+        return manter_linha(node, node[:2] + (substituir_variavel(node[2], nome, valor), node[3]))
+    if tag == 'assign' and node[1][0] == 'var':
+        return manter_linha(node, ('assign', node[1], substituir_variavel(node[2], nome, valor)))
+    return manter_linha(node, (tag,) + tuple(substituir_variavel(x, nome, valor) for x in node[1:]))
+
+
+# Separa uma expressão da forma e + c, c + e ou e - c (c literal inteiro) em (e, c); as
+# restantes ficam (expressão, 0)
+def separar_constante(node):
+    if node[0] == 'binop' and node[1] in ('+', '-'):
+        _, op, l, r = node
+        if r[0] == 'const' and r[1].lower() == 'integer':
+            return l, (r[2] if op == '+' else -r[2])
+        if op == '+' and l[0] == 'const' and l[1].lower() == 'integer':
+            return r, l[2]
+    return node, 0
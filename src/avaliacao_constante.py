@@ -0,0 +1,422 @@
+from analise_ast import percorrer, variaveis_escritas, variaveis_proprias, manter_linha
+from representacao_intermedia import cabe_inteiro
+
+# Avaliação em tempo de compilação de functions puras chamadas com argumentos constantes,
+# feita sobre a AST antes da geração de código. Uma function é pura se o resultado só
+# depende dos argumentos: não lê nem altera variáveis globais, não faz entrada/saída, não
+# tem parâmetros var e só chama outras functions puras. As chamadas com todos os argumentos
+# constantes são avaliadas por um interpretador de um subconjunto da AST (tipos integer,
+# boolean e char) e substituídas pelo resultado, um nó ('const', tipo, valor).
+
+# Tipos dos parâmetros, variáveis e resultado de uma function avaliável
+TIPOS_AVALIAVEIS = ('integer', 'boolean', 'char')
+
+# Nós permitidos no corpo de uma function avaliável
+NOS_AVALIAVEIS = ('compound', 'assign', 'if', 'while', 'repeat', 'for', 'case', 'empty',
+                  'const', 'const_expr', 'var', 'binop', 'not', 'call')
+
+# Profundidade máxima de chamadas durante uma avaliação
+PROFUNDIDADE_MAXIMA = 200
+
+
+# Erro durante uma avaliação (nó não suportado, divisão por zero, passos esgotados, ...):
+# a chamada fica para ser feita em tempo de execução
+class ErroAvaliacao(Exception):
+    pass
+
+
+# Nome do tipo de um parâmetro, variável ou resultado, se for um dos TIPOS_AVALIAVEIS
+def tipo_avaliavel(tp):
+    if isinstance(tp, tuple) and tp[0] == 'simple_type' and tp[1].lower() in TIPOS_AVALIAVEIS:
+        return tp[1].lower()
+    return None
+
+
+# Divisão inteira com truncagem para zero, como a instrução DIV da EWVM
+def dividir(a, b):
+    if b == 0:
+        raise ErroAvaliacao("Divisão por zero")
+    q = abs(a) // abs(b)
+    return q if (a >= 0) == (b >= 0) else -q
+
+
+# Resultado de uma operação inteira: fora dos 64 bits a EWVM termina com erro, por isso a
+# chamada fica para a execução
+def inteiro(valor):
+    if not cabe_inteiro(valor):
+        raise ErroAvaliacao(f"Inteiro fora dos limites: {valor}")
+    return valor
+
+
+# Verifica a forma de uma function candidata a ser avaliada (sem olhar para as outras
+# sub-rotinas que chama): parâmetros por valor e variáveis dos TIPOS_AVALIAVEIS, só
+# declarações de variáveis e constantes, e corpo apenas com NOS_AVALIAVEIS
+def candidata(defn):
+    if defn[0] != 'function' or tipo_avaliavel(defn[3]) is None:
+        return False
+    for modo, _, tp in defn[2] or []:
+        if modo == 'param_var' or tipo_avaliavel(tp) is None:
+            return False
+    block = defn[-1]
+    for d in block[1]:
+        if not d:
+            continue
+        if d[0] == 'var_decl':
+            if any(tipo_avaliavel(tp) is None for _, _, tp in d[1]):
+                return False
+        elif d[0] != 'consts':
+            return False
+    return all(n[0] in NOS_AVALIAVEIS for n in percorrer(('compound', block[2])))
+
+
+# Nomes que uma function pode usar sem deixar de ser pura: os seus (parâmetros, variáveis,
+# constantes e resultado)
+def nomes_proprios(defn):
+    nomes = variaveis_proprias(defn)
+    for d in defn[-1][1]:
+        if d and d[0] == 'consts':
+            nomes.update(nome.lower() for nome, _ in d[1])
+    return nomes
+
+
+# Functions puras entre as de nível global: candidatas que só alteram as suas variáveis e
+# só usam os seus nomes, constantes globais e outras functions puras (ponto fixo: uma
+# function deixa de ser pura se usar uma que deixou de o ser)
+def functions_puras(subrotinas, consts):
+    puras = {nome: defn for nome, defn in subrotinas.items() if candidata(defn)}
+    usados = {}
+    for nome, defn in list(puras.items()):
+        proprios = nomes_proprios(defn)
+        block = defn[-1]
+        if variaveis_escritas(block, lambda n: None) - proprios:
+            del puras[nome]
+            continue
+        externos = set()
+        for n in percorrer(('compound', block[2])):
+            if n[0] in ('var', 'call'):
+                externos.add(n[1].lower())
+        usados[nome] = externos - proprios - set(consts)
+    mudou = True
+    while mudou:
+        mudou = False
+        for nome in list(puras):
+            if not usados[nome] <= set(puras):
+                del puras[nome]
+                mudou = True
+    return puras
+
+
+class Avaliador:
+    def __init__(self, funcoes, consts, limite):
+        # Functions puras (nome -> definição) e valores das constantes globais
+        self.funcoes = funcoes
+        self.consts = consts
+        # Número máximo de passos (instruções e chamadas) de cada avaliação
+        self.limite = limite
+        self.passos = 0
+        self.profundidade = 0
+        # Resultados já calculados: (nome, argumentos) -> valor
+        self.cache = {}
+
+    # Conta um passo da avaliação em curso
+    def passo(self):
+        self.passos += 1
+        if self.passos > self.limite:
+            raise ErroAvaliacao("Limite de passos esgotado")
+
+    # Valor (inteiro; chars pelo código, booleanos como 0/1) de uma expressão constante,
+    # fora de qualquer function, ou None se não for constante ou não puder ser avaliada
+    def constante(self, node):
+        self.passos = 0
+        self.profundidade = 0
+        try:
+            return self.expr(node, {})
+        except (ErroAvaliacao, RecursionError):
+            return None
+
+    # Resultado de uma chamada com argumentos constantes, ou None se não puder ser avaliada
+    def avaliar(self, nome, args):
+        self.passos = 0
+        self.profundidade = 0
+        try:
+            return self.chamar(nome, tuple(args))
+        except (ErroAvaliacao, RecursionError):
+            return None
+
+    # Executa uma function: parâmetros, variáveis locais (a 0, como as da frame reservada
+    # com PUSHN) e constantes locais num ambiente próprio; devolve o valor do resultado
+    def chamar(self, nome, args):
+        self.passo()
+        chave = (nome, args)
+        if chave in self.cache:
+            return self.cache[chave]
+        if self.profundidade >= PROFUNDIDADE_MAXIMA:
+            raise ErroAvaliacao("Profundidade máxima de chamadas")
+        defn = self.funcoes[nome]
+        ids = [pid.lower() for _, pids, _ in defn[2] or [] for pid in pids]
+        if len(ids) != len(args):
+            raise ErroAvaliacao(f"{nome} espera {len(ids)} args")
+        env = dict(zip(ids, args))
+        env[nome] = 0
+        for d in defn[-1][1]:
+            if d and d[0] == 'var_decl':
+                for _, vids, _ in d[1]:
+                    env.update((v.lower(), 0) for v in vids)
+            elif d and d[0] == 'consts':
+                for cnome, expr in d[1]:
+                    env[cnome.lower()] = self.expr(expr, env)
+        self.profundidade += 1
+        try:
+            self.instrucoes(defn[-1][2], env)
+        finally:
+            self.profundidade -= 1
+        self.cache[chave] = env[nome]
+        return env[nome]
+
+    # Executa uma lista de instruções
+    def instrucoes(self, stmts, env):
+        for stmt in stmts:
+            self.instrucao(stmt, env)
+
+    # Executa uma instrução, com a mesma semântica do código gerado
+    def instrucao(self, node, env):
+        self.passo()
+        if not node:
+            return
+        tag = node[0]
+        if tag == 'empty':
+            return
+        if tag == 'compound':
+            self.instrucoes(node[1], env)
+        elif tag == 'assign':
+            _, lhs, expr = node
+            if lhs[0] != 'var' or lhs[1].lower() not in env:
+                raise ErroAvaliacao(f"Atribuição não suportada: {lhs}")
+            env[lhs[1].lower()] = self.expr(expr, env)
+        elif tag == 'if':
+            _, cond, then_block, else_block = node
+            if self.expr(cond, env):
+                self.instrucao(then_block, env)
+            elif else_block:
+                self.instrucao(else_block, env)
+        elif tag == 'while':
+            while self.expr(node[1], env):
+                self.instrucao(node[2], env)
+        elif tag == 'repeat':
+            while True:
+                self.instrucoes(node[1], env)
+                if self.expr(node[2], env):
+                    break
+        elif tag == 'for':
+            # Como em gen_for: o limite é avaliado em cada iteração e, no fim, a variável
+            # fica com o valor seguinte ao último
+            _, var, start, end, direction, body = node
+            nome = (var[1] if isinstance(var, tuple) else var).lower()
+            if nome not in env:
+                raise ErroAvaliacao(f"Variável de ciclo não suportada: {nome}")
+            incremento = 1 if direction == 'to' else -1
+            env[nome] = self.expr(start, env)
+            while (env[nome] - self.expr(end, env)) * incremento <= 0:
+                self.instrucao(body, env)
+                env[nome] += incremento
+                self.passo()
+        elif tag == 'case':
+            _, expr, items = node
+            v = self.expr(expr, env)
+            for const_list, stmts in items:
+                if any(self.expr(c, {}) == v for c in const_list):
+                    self.instrucoes(stmts, env)
+                    break
+        else:
+            raise ErroAvaliacao(f"Instrução não suportada: {tag}")
+
+    # Valor de uma expressão no ambiente 'env' (variáveis da function em execução)
+    def expr(self, node, env):
+        tag = node[0]
+        if tag in ('const', 'const_expr'):
+            _, tp, val = node
+            tp = tp.lower()
+            if tp == 'integer':
+                return int(val)
+            if tp == 'char':
+                return ord(val)
+            if tp == 'boolean':
+                return int(val.lower() == 'true') if isinstance(val, str) else int(bool(val))
+            if tp == 'id':
+                return self.expr(('var', val), env)
+            raise ErroAvaliacao(f"Constante não suportada: {tp}")
+        if tag == 'var':
+            nome = node[1].lower()
+            if nome in env:
+                return env[nome]
+            if nome in self.funcoes:
+                return self.chamar(nome, ())
+            if nome in self.consts:
+                return self.consts[nome]
+            raise ErroAvaliacao(f"Não é constante: {nome}")
+        if tag == 'call':
+            nome = node[1].lower()
+            if nome not in self.funcoes:
+                raise ErroAvaliacao(f"Chamada não suportada: {nome}")
+            return self.chamar(nome, tuple(self.expr(a, env) for a in node[2]))
+        if tag == 'not':
+            return int(self.expr(node[1], env) == 0)
+        if tag == 'binop':
+            _, op, l, r = node
+            op = op.lower()
+            a = self.expr(l, env)
+            b = self.expr(r, env)
+            if op == '+':
+                return inteiro(a + b)
+            if op == '-':
+                return inteiro(a - b)
+            if op == '*':
+                return inteiro(a * b)
+            if op in ('/', 'div'):
+                return inteiro(dividir(a, b))
+            if op == 'mod':
+                return a - b * dividir(a, b)
+            if op == '=':
+                return int(a == b)
+            if op == '<>':
+                return int(a != b)
+            if op == '<':
+                return int(a < b)
+            if op == '<=':
+                return int(a <= b)
+            if op == '>':
+                return int(a > b)
+            if op == '>=':
+                return int(a >= b)
+            if op == 'and':
+                return int(bool(a) and bool(b))
+            if op == 'or':
+                return int(bool(a) or bool(b))
+            raise ErroAvaliacao(f"Operador não suportado: {op}")
+        raise ErroAvaliacao(f"Expressão não suportada: {tag}")
+
+
+# Nó ('const', tipo, valor) para o valor calculado de uma function com resultado do tipo 'tp',
+# ou None se o valor não puder ser um literal (a chamada fica para a execução)
+def literal(tp, valor):
+    if tp == 'char':
+        if not 0 <= valor <= 255:
+            return None
+        return ('const', 'char', chr(valor))
+    if tp == 'boolean':
+        return ('const', 'boolean', 'true' if valor else 'false')
+    if not cabe_inteiro(valor):
+        return None
+    return ('const', 'integer', valor)
+
+
+# Cópia de um nó com as operações aritméticas inteiras (+, -, *, div, mod) entre literais
+# inteiros substituídas pelo resultado (ex: depois de trocar a variável de um ciclo
+# desenrolado pelo seu valor, 'a[2 * i + 1]' passa a ter um índice constante)
+def dobrar_constantes(node):
+    if isinstance(node, list):
+        return [dobrar_constantes(x) for x in node]
+    if not isinstance(node, tuple) or not node or not isinstance(node[0], str):
+        return tuple(dobrar_constantes(x) for x in node) if isinstance(node, tuple) else node
+    if node[0] == 'inline':
+        return manter_linha(node, node[:2] + (dobrar_constantes(node[2]), node[3]))
+    novo = manter_linha(node, (node[0],) + tuple(dobrar_constantes(x) for x in node[1:]))
+    if novo[0] == 'binop' and novo[1].lower() in ('+', '-', '*', 'div', 'mod') \
+            and all(x[0] == 'const' and x[1].lower() == 'integer' for x in novo[2:]):
+        # Um resultado fora dos limites dos inteiros (ErroAvaliacao) fica como operação, feita
+        # (e detetada) na execução
+        try:
+            return ('const', 'integer', Avaliador({}, {}, 1).expr(novo, {}))
+        except ErroAvaliacao:
+            pass
+    return novo
+
+
+class AvaliacaoConstante:
+    def __init__(self, limite):
+        # Número máximo de passos de cada avaliação (o compilador nunca fica preso)
+        self.limite = limite
+        self.avaliador = None
+        # Chamadas substituídas pelo resultado: nome -> número de chamadas
+        self.avaliadas = {}
+
+    # Devolve a AST do programa com as chamadas constantes de functions puras substituídas
+    # pelo seu valor
+    def avaliar_programa(self, ast):
+        _, nome, block = ast
+        decls = block[1]
+        subrotinas = {d[1].lower(): d for d in decls if d and d[0] in ('function', 'procedure')}
+        # Valores das constantes globais (as que não forem avaliáveis ficam de fora)
+        consts = {}
+        self.avaliador = Avaliador({}, consts, self.limite)
+        for d in decls:
+            if d and d[0] == 'consts':
+                for cnome, expr in d[1]:
+                    v = self.avaliador.constante(expr)
+                    if v is not None:
+                        consts[cnome.lower()] = v
+        self.avaliador.funcoes = functions_puras(subrotinas, consts)
+        if not self.avaliador.funcoes:
+            return ast
+        globais = set()
+        for d in decls:
+            if d and d[0] == 'var_decl':
+                for _, ids, _ in d[1]:
+                    globais.update(i.lower() for i in ids)
+        novas = [self.avaliar_subrotina(d, frozenset(globais)) if d and d[0] in ('function', 'procedure') else d
+                 for d in decls]
+        return manter_linha(ast, ('program', nome, ('block', novas, self.substituir(block[2], frozenset(globais), False))))
+
+    # Substitui as chamadas constantes no corpo de uma sub-rotina (e nas declaradas nela)
+    def avaliar_subrotina(self, defn, escondidos):
+        escondidos = escondidos | nomes_proprios(defn)
+        for d in defn[-1][1]:
+            if d and d[0] in ('function', 'procedure'):
+                escondidos = escondidos | {d[1].lower()}
+        block = defn[-1]
+        decls = [self.avaliar_subrotina(d, escondidos) if d and d[0] in ('function', 'procedure') else d
+                 for d in block[1]]
+        return manter_linha(defn, defn[:-1] + (('block', decls, self.substituir(block[2], escondidos, False)),))
+
+    # Valor de um argumento constante (literal ou constante global não escondida), ou None
+    def argumento(self, arg, escondidos):
+        if any(n[0] in ('var', 'call') and n[1].lower() in escondidos for n in percorrer(arg)):
+            return None
+        return self.avaliador.constante(arg)
+
+    # Reconstrói um nó (ou lista de nós), trocando as chamadas de functions puras com
+    # argumentos constantes pelo resultado. 'escondidos' são as variáveis e sub-rotinas que
+    # escondem nomes globais no ponto da chamada e 'com' indica que o nó está dentro de um
+    # WITH (onde um nome isolado pode ser um campo de record).
+    def substituir(self, node, escondidos, com):
+        if isinstance(node, list):
+            return [self.substituir(x, escondidos, com) for x in node]
+        if not isinstance(node, tuple):
+            return node
+        if not node or not isinstance(node[0], str):
+            return tuple(self.substituir(x, escondidos, com) for x in node)
+        tag = node[0]
+        if tag in ('call', 'var') and isinstance(node[1], str):
+            nome = node[1].lower()
+            args = self.substituir(node[2], escondidos, com) if tag == 'call' else []
+            novo = node if tag == 'var' else manter_linha(node, ('call', node[1], args))
+            if nome not in self.avaliador.funcoes or nome in escondidos or (tag == 'var' and com):
+                return novo
+            valores = [self.argumento(a, escondidos) for a in args]
+            if None in valores:
+                return novo
+            valor = self.avaliador.avaliar(nome, valores)
+            lit = None if valor is None else literal(tipo_avaliavel(self.avaliador.funcoes[nome][3]), valor)
+            if lit is None:
+                return novo
+            self.avaliadas[nome] = self.avaliadas.get(nome, 0) + 1
+            return lit
+        if tag == 'assign':
+            _, lhs, expr = node
+            # O destino nunca é uma chamada (o nome de uma function é a célula do resultado)
+            if lhs[0] != 'var':
+                lhs = self.substituir(lhs, escondidos, com)
+            return manter_linha(node, ('assign', lhs, self.substituir(expr, escondidos, com)))
+        if tag == 'with':
+            return manter_linha(node, ('with', node[1], self.substituir(node[2], escondidos, True)))
+        return manter_linha(node, (tag,) + tuple(self.substituir(x, escondidos, com) for x in node[1:]))
@@ -0,0 +1,156 @@
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+
+from ana_lex import build_lexer
+from ana_sin import parse
+from ana_sem import SemanticAnalyzer, SemanticError
+from gerador_codigo import CodeGenerator
+from gerar_programas import FORMAS, gerar_forma
+
+# Desempenho do próprio compilador: tempo e memória de cada fase na compilação de programas
+# sintéticos (ver gerar_programas) de tamanho crescente, para ver como cada fase escala com
+# cada forma de programa. As fases são as de main.py:
+#   - lexer: build_lexer e a leitura de todos os tokens (o parser volta a fazê-la, por isso
+#     o tempo de parse já inclui o da análise léxica);
+#   - parse, semantica (SemanticAnalyzer.analyze) e, no CodeGenerator, preparar (passos
+#     sobre a AST), build_symtab, gen e write (otimização do CFG e escrita do texto).
+# O tempo de cada fase é o menor das repetições; a memória (pico de memória alocada durante
+# a fase, acima da que já estava alocada no início dela) é medida numa compilação à parte
+# com o tracemalloc, que torna a execução mais lenta. Os resultados são acrescentados a um
+# ficheiro JSON Lines, um registo por forma e tamanho, com a data e o commit, para comparar
+# execuções ao longo do tempo.
+
+FASES = ('lexer', 'parse', 'semantica', 'preparar', 'build_symtab', 'gen', 'write')
+TAMANHOS = (50, 100, 200, 400)
+
+
+# Compila o programa 'texto', chamando medir(fase, função) em cada fase; devolve o número
+# de tokens e o CodeGenerator
+def compilar_fases(texto, medir):
+    def tokens():
+        lexer = build_lexer()
+        lexer.input(texto)
+        return sum(1 for _ in lexer)
+
+    n_tokens = medir('lexer', tokens)
+    ast = medir('parse', lambda: parse(texto))
+    if ast is None:
+        raise SyntaxError("o programa gerado tem erros de sintaxe")
+    medir('semantica', lambda: SemanticAnalyzer().analyze(ast))
+    gen = CodeGenerator()
+    ast = medir('preparar', lambda: gen.preparar(ast))
+    medir('build_symtab', lambda: gen.build_symtab(ast))
+    medir('gen', lambda: gen.gen(ast))
+    medir('write', lambda: gen.write(os.devnull))
+    return n_tokens, gen
+
+
+# Menor tempo (em segundos) de cada fase em 'repeticoes' compilações do programa
+def tempos(texto, repeticoes):
+    melhores = {}
+
+    def medir(fase, f):
+        inicio = time.perf_counter()
+        resultado = f()
+        t = time.perf_counter() - inicio
+        melhores[fase] = min(t, melhores.get(fase, t))
+        return resultado
+
+    for _ in range(repeticoes):
+        gc.collect()
+        n_tokens, gen = compilar_fases(texto, medir)
+    return melhores, n_tokens, gen
+
+
+# Pico de memória alocada (em bytes) durante cada fase e em toda a compilação
+def memoria(texto):
+    picos = {}
+
+    def medir(fase, f):
+        antes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        resultado = f()
+        picos[fase] = tracemalloc.get_traced_memory()[1] - antes
+        return resultado
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        compilar_fases(texto, medir)
+        total = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return picos, total
+
+
+# Commit atual do repositório (None fora de um repositório git)
+def commit_atual():
+    try:
+        res = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                             text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    except OSError:
+        return None
+    return res.stdout.strip() or None
+
+
+# Mede a compilação de um programa de cada forma e tamanho, mostrando uma linha por
+# medição, e devolve os registos. Numa forma, os tamanhos acima de um que falhe (ex: uma
+# expressão encaixada além do limite de recursão do Python) não são medidos.
+def correr(formas, tamanhos, repeticoes):
+    comuns = {'data': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+              'commit': commit_atual(), 'python': platform.python_version()}
+    print(f"{'forma':12} {'tamanho':>7} {'linhas':>7} " +
+          ' '.join(f"{fase:>12}" for fase in FASES) + f" {'total':>9} {'memória':>10}")
+    registos = []
+    for forma in formas:
+        for tamanho in sorted(tamanhos):
+            texto = gerar_forma(forma, tamanho)
+            registo = dict(comuns, forma=forma, tamanho=tamanho,
+                           linhas=texto.count('\n'), caracteres=len(texto))
+            try:
+                ts, n_tokens, gen = tempos(texto, repeticoes)
+                picos, total = memoria(texto)
+            except (RecursionError, SyntaxError, SemanticError) as e:
+                registo['erro'] = f"{type(e).__name__}: {e}"
+                registos.append(registo)
+                print(f"{forma:12} {tamanho:>7} {registo['linhas']:>7}  {registo['erro']}")
+                break
+            registo.update(tokens=n_tokens, instrucoes=gen.cfg.tamanho(), tempos=ts,
+                           memoria=picos, memoria_pico=total)
+            registos.append(registo)
+            colunas = ' '.join(f"{1000 * ts[fase]:>10.1f}ms" for fase in FASES)
+            print(f"{forma:12} {tamanho:>7} {registo['linhas']:>7} {colunas} "
+                  f"{1000 * sum(ts.values()):>7.0f}ms {total / 1024:>8.0f}KB")
+    return registos
+
+
+# Mede as formas e os tamanhos pedidos e acrescenta os resultados ao ficheiro de saída
+def main():
+    ap = argparse.ArgumentParser(description="Tempo e memória de cada fase do compilador em "
+                                             "programas sintéticos de tamanho crescente")
+    ap.add_argument('-f', '--forma', action='append', choices=tuple(FORMAS),
+                    help="forma dos programas (pode ser repetida); por omissão, todas")
+    ap.add_argument('-t', '--tamanhos', type=int, nargs='+', default=TAMANHOS,
+                    help="tamanhos da parte que cresce em cada forma")
+    ap.add_argument('-r', '--repeticoes', type=int, default=3,
+                    help="compilações de cada programa (conta o menor tempo de cada fase)")
+    ap.add_argument('-o', '--saida', default='benchmark_compilador.jsonl',
+                    help="ficheiro JSON Lines onde os resultados são acrescentados")
+    args = ap.parse_args()
+
+    registos = correr(args.forma or list(FORMAS), args.tamanhos, args.repeticoes)
+    with open(args.saida, 'a', encoding='utf-8') as f:
+        for registo in registos:
+            f.write(json.dumps(registo, ensure_ascii=False) + '\n')
+    print(f"Resultados acrescentados a: {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import argparse
+import glob
+import json
+import os
+import sys
+
+from ana_sin import parse
+from ana_sem import SemanticAnalyzer, SemanticError
+from main import compilar, tamanho_codigo
+from maquina_virtual import MaquinaVirtual, ErroVM
+from maquina_rapida import MaquinaRapida
+
+# Suite de benchmarks do código gerado (pasta benchmarks). Cada benchmark <nome>.pas tem o
+# input fixo em <nome>.in (sem o ficheiro, o input é vazio) e a saída esperada em
+# <nome>.out. Os níveis de otimização em que a execução tem de falhar (ex: a pilha da EWVM
+# esgota-se sem a otimização que o benchmark mostra) estão em <nome>.falhas, um por
+# linha; nesses níveis só o tamanho do código é comparado. O ficheiro referencias.json guarda, por benchmark e por nível de otimização,
+# as medidas do código gerado: as instruções executadas na EWVM (deterministas, ao
+# contrário do tempo) e o tamanho do código, em instruções e em carácteres do ficheiro .vm.
+#
+# Para cada benchmark e nível, o programa é compilado, executado e comparado com a saída
+# esperada e com as referências: uma medida acima da referência (mais do que a tolerância)
+# é uma regressão. Depois de uma alteração intencional ao gerador de código, as
+# referências são atualizadas com --atualizar (e as diferenças ficam no histórico do git).
+
+PASTA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks')
+REFERENCIAS = os.path.join(PASTA, 'referencias.json')
+
+# Opções do CodeGenerator de cada nível de otimização: O0 sem nenhuma otimização, O1 só
+# com as otimizações sobre o CFG e O2 com todas (as opções por omissão, usadas por main.py)
+SEM_OTIMIZACOES = dict(otimizar=False, base_deslocada=False, avaliacao_constante=False,
+                       inline=False, eliminar_codigo_morto=False, recursao_cauda=False,
+                       desenrolar=False, reducao_inducao=False, tabela_strings=False)
+NIVEIS = {
+    'O0': SEM_OTIMIZACOES,
+    'O1': dict(SEM_OTIMIZACOES, otimizar=True),
+    'O2': {},
+}
+
+# Medidas guardadas nas referências, pela ordem em que são mostradas
+MEDIDAS = ('instrucoes', 'codigo', 'caracteres')
+
+
+# Nomes dos benchmarks da pasta (os ficheiros .pas), por ordem alfabética
+def listar():
+    return sorted(os.path.basename(f)[:-4] for f in glob.glob(os.path.join(PASTA, '*.pas')))
+
+
+# Conteúdo de um ficheiro da pasta dos benchmarks, ou None se não existir
+def ler(nome):
+    caminho = os.path.join(PASTA, nome)
+    if not os.path.isfile(caminho):
+        return None
+    with open(caminho, encoding='utf-8') as f:
+        return f.read()
+
+
+# Compila a AST 'ast' com as opções do nível, executa o código com o input 'entrada' e
+# devolve a saída do programa, as medidas e o erro de execução (None se não houver; com
+# erro, não há saída nem instruções executadas)
+def medir(ast, nivel, entrada, maquina):
+    gen = compilar(ast, **NIVEIS[nivel])
+    medidas = {'codigo': gen.cfg.tamanho(), 'caracteres': tamanho_codigo(gen)}
+    try:
+        res = maquina('\n'.join(gen.lines()), entrada).executar()
+    except ErroVM as e:
+        return None, medidas, e
+    medidas['instrucoes'] = res.passos
+    return res.saida, medidas, None
+
+
+# Compara as medidas com as da referência: devolve as que pioraram e as que melhoraram
+# (nomes), com a tolerância dada como fração da referência
+def comparar(medidas, referencia, tolerancia):
+    piores, melhores = [], []
+    for m in MEDIDAS:
+        antes, agora = referencia.get(m), medidas.get(m)
+        if antes is None or agora is None:
+            continue
+        if agora > antes * (1 + tolerancia):
+            piores.append(m)
+        elif agora < antes:
+            melhores.append(m)
+    return piores, melhores
+
+
+# Texto de uma medida com a referência e a variação: "1200 (-4.0%)"
+def variacao(agora, antes):
+    if agora is None:
+        return '-'
+    if antes is None or antes == agora:
+        return str(agora)
+    if antes == 0:
+        return f"{agora} (era 0)"
+    return f"{agora} ({100 * (agora - antes) / antes:+.1f}%)"
+
+
+# Executa os benchmarks 'nomes' nos níveis 'niveis' e mostra uma linha por cada par.
+# Devolve as medidas obtidas (nome -> nível -> medidas) e o número de falhas: saídas
+# diferentes da esperada, erros de compilação, erros de execução não esperados (ou
+# esperados que não aconteceram) e regressões.
+def correr(nomes, niveis, referencias, tolerancia, maquina):
+    print(f"{'benchmark':22} {'nível':5} {'instruções':>20} {'código':>15} {'carácteres':>16}  estado")
+    obtidas, falhas = {}, 0
+    for nome in nomes:
+        fonte = ler(nome + '.pas')
+        esperada = ler(nome + '.out')
+        entrada = ler(nome + '.in') or ''
+        falhas_esperadas = (ler(nome + '.falhas') or '').split()
+        try:
+            ast = parse(fonte)
+            if ast is not None:
+                SemanticAnalyzer().analyze(ast)
+        except SemanticError as e:
+            print(e)
+            ast = None
+        if ast is None:
+            print(f"{nome:22} {'':5} erro de compilação")
+            falhas += 1
+            continue
+        for nivel in niveis:
+            saida, medidas, erro = medir(ast, nivel, entrada, maquina)
+            referencia = referencias.get(nome, {}).get(nivel, {})
+            piores, melhores = comparar(medidas, referencia, tolerancia)
+            falha_esperada = nivel in falhas_esperadas
+            if erro is not None and not falha_esperada:
+                estado = f"ERRO DE EXECUÇÃO: {erro}"
+            elif erro is None and falha_esperada:
+                estado = f"A EXECUÇÃO DEVIA FALHAR (ver {nome}.falhas)"
+            elif erro is None and esperada is None:
+                estado = "sem saída esperada"
+            elif erro is None and saida != esperada:
+                estado = "SAÍDA ERRADA"
+            elif piores:
+                estado = "REGRESSÃO: " + ', '.join(piores)
+            elif not referencia:
+                estado = "sem referência"
+            elif melhores:
+                estado = "melhor: " + ', '.join(melhores)
+            elif erro is not None:
+                estado = f"ok (falha esperada: {erro})"
+            else:
+                estado = "ok"
+            if (erro is not None) != falha_esperada or piores \
+                    or (erro is None and saida != esperada):
+                falhas += 1
+            else:
+                obtidas.setdefault(nome, {})[nivel] = medidas
+            colunas = [variacao(medidas.get(m), referencia.get(m)) for m in MEDIDAS]
+            print(f"{nome:22} {nivel:5} {colunas[0]:>20} {colunas[1]:>15} {colunas[2]:>16}  {estado}")
+    return obtidas, falhas
+
+
+# Grava as referências, com uma ordem fixa das chaves (para as diferenças no git serem
+# só as das medidas que mudaram)
+def gravar_referencias(referencias):
+    with open(REFERENCIAS, 'w', encoding='utf-8') as f:
+        json.dump(referencias, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+# Executa os benchmarks pedidos e compara-os com as referências (ou atualiza-as)
+def main():
+    ap = argparse.ArgumentParser(description="Benchmarks do código gerado: instruções executadas "
+                                             "e tamanho do código, comparados com as referências")
+    ap.add_argument('benchmarks', nargs='*',
+                    help="nomes dos benchmarks a executar (sem .pas); por omissão, todos")
+    ap.add_argument('-n', '--nivel', action='append', choices=tuple(NIVEIS),
+                    help="nível de otimização (pode ser repetido); por omissão, todos")
+    ap.add_argument('-t', '--tolerancia', type=float, default=0.0,
+                    help="aumento (em %%) de uma medida em relação à referência que não conta "
+                         "como regressão")
+    ap.add_argument('--maquina', choices=('rapida', 'referencia'), default='rapida',
+                    help="interpretador usado para executar o código gerado")
+    ap.add_argument('--atualizar', action='store_true',
+                    help="grava as medidas obtidas como as novas referências (só as dos "
+                         "benchmarks com a saída esperada)")
+    args = ap.parse_args()
+
+    nomes = args.benchmarks or listar()
+    desconhecidos = [n for n in nomes if ler(n + '.pas') is None]
+    if desconhecidos:
+        print(f"Erro: benchmarks desconhecidos: {', '.join(desconhecidos)}", file=sys.stderr)
+        sys.exit(2)
+    referencias = json.loads(ler('referencias.json') or '{}')
+    maquina = MaquinaRapida if args.maquina == 'rapida' else MaquinaVirtual
+    # Sem comparação com as referências quando vão ser substituídas
+    obtidas, falhas = correr(nomes, args.nivel or list(NIVEIS),
+                             {} if args.atualizar else referencias,
+                             args.tolerancia / 100, maquina)
+    if args.atualizar:
+        for nome, niveis in obtidas.items():
+            for nivel, medidas in niveis.items():
+                referencias.setdefault(nome, {})[nivel] = medidas
+        gravar_referencias(referencias)
+        print(f"Referências gravadas em: {os.path.relpath(REFERENCIAS)}")
+    if falhas:
+        print(f"{falhas} falha(s)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
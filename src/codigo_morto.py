@@ -0,0 +1,139 @@
+from analise_ast import filhos, nomes_locais, manter_linha
+
+# Eliminação de código morto sobre a AST, antes da geração de código: a partir do bloco
+# principal, segue as chamadas (grafo de chamadas) e os nomes usados, e retira as
+# sub-rotinas que nunca são chamadas, as variáveis globais nunca usadas (que ocupariam
+# células da frame global, ou um ALLOCN no layout 'heap') e as constantes só usadas em
+# código retirado. Uma sub-rotina expandida em linha em todas as chamadas também deixa de
+# ser chamada.
+
+# Nomes (em minúsculas) referidos por um nó: variáveis, constantes e chamadas, variáveis de
+# ciclos for, e constantes e tipos nomeados usados em declarações de tipos. Numa chamada
+# expandida em linha, contam os argumentos e os nomes exteriores usados pelo corpo.
+def nomes_usados(node):
+    nomes = set()
+    pendentes = [node]
+    while pendentes:
+        n = pendentes.pop()
+        tag = n[0]
+        if tag == 'inline':
+            _, _, args, defn = n
+            pendentes.extend(args)
+            nomes |= nomes_usados(defn[-1]) - nomes_locais(defn)
+            continue
+        if tag in ('var', 'call', 'id_type') and isinstance(n[1], str):
+            nomes.add(n[1].lower())
+        elif tag == 'for' and isinstance(n[1], str):
+            nomes.add(n[1].lower())
+        elif tag == 'const_expr' and n[1] == 'id':
+            nomes.add(n[2].lower())
+        pendentes.extend(filhos(n))
+    return nomes
+
+
+class EliminacaoCodigoMorto:
+    def __init__(self):
+        # O que foi retirado: 'subrotinas', 'globais' e 'constantes' -> lista de nomes
+        self.removidos = {'subrotinas': [], 'globais': [], 'constantes': []}
+
+    # Devolve a AST do programa só com as declarações alcançáveis a partir do bloco principal
+    def eliminar_programa(self, ast):
+        _, nome, block = ast
+        decls = block[1]
+        usados = nomes_usados(('compound', block[2]))
+        # Os tipos não geram código, mas os nomes usados nas suas definições ficam
+        for d in decls:
+            if d and d[0] == 'types':
+                usados |= nomes_usados(d)
+
+        # Fecho: as sub-rotinas chamadas, as constantes e os tipos das variáveis usadas
+        # acrescentam os nomes que elas próprias usam
+        vistos = set()
+        while True:
+            novos = set()
+            for d in decls:
+                if not d:
+                    continue
+                if d[0] in ('function', 'procedure'):
+                    chave = ('sub', d[1].lower())
+                    if d[1].lower() in usados and chave not in vistos:
+                        vistos.add(chave)
+                        novos |= nomes_usados(d) - nomes_locais(d)
+                elif d[0] == 'consts':
+                    for cnome, expr in d[1]:
+                        chave = ('const', cnome.lower())
+                        if cnome.lower() in usados and chave not in vistos:
+                            vistos.add(chave)
+                            novos |= nomes_usados(expr)
+                elif d[0] == 'var_decl':
+                    for k, (_, ids, tp) in enumerate(d[1]):
+                        chave = ('vars', id(d), k)
+                        if chave not in vistos and any(i.lower() in usados for i in ids):
+                            vistos.add(chave)
+                            novos |= nomes_usados(tp)
+            if novos <= usados:
+                break
+            usados |= novos
+
+        novas = []
+        for d in decls:
+            if not d:
+                novas.append(d)
+            elif d[0] in ('function', 'procedure'):
+                if d[1].lower() in usados:
+                    novas.append(self.eliminar_subrotina(d))
+                else:
+                    self.removidos['subrotinas'].append(d[1])
+            elif d[0] == 'memo':
+                if d[1].lower() in usados:
+                    novas.append(d)
+            elif d[0] == 'consts':
+                itens = []
+                for cnome, expr in d[1]:
+                    if cnome.lower() in usados:
+                        itens.append((cnome, expr))
+                    else:
+                        self.removidos['constantes'].append(cnome)
+                if itens:
+                    novas.append(('consts', itens))
+            elif d[0] == 'var_decl':
+                grupos = []
+                for tag, ids, tp in d[1]:
+                    vivos = [i for i in ids if i.lower() in usados]
+                    self.removidos['globais'].extend(i for i in ids if i.lower() not in usados)
+                    if vivos:
+                        grupos.append((tag, vivos, tp))
+                if grupos:
+                    novas.append(('var_decl', grupos))
+            else:
+                novas.append(d)
+        return manter_linha(ast, ('program', nome, ('block', novas, block[2])))
+
+    # Retira as sub-rotinas internas de uma sub-rotina que não são chamadas pelo seu corpo
+    # (diretamente ou através de outras sub-rotinas internas alcançáveis)
+    def eliminar_subrotina(self, defn):
+        block = defn[-1]
+        internas = {d[1].lower(): d for d in block[1] if d and d[0] in ('function', 'procedure')}
+        if not internas:
+            return defn
+        usados = nomes_usados(('compound', block[2]))
+        pendentes = [n for n in internas if n in usados]
+        alcancadas = set()
+        while pendentes:
+            n = pendentes.pop()
+            if n in alcancadas:
+                continue
+            alcancadas.add(n)
+            pendentes.extend(m for m in nomes_usados(internas[n]) if m in internas)
+        decls = []
+        for d in block[1]:
+            if d and d[0] in ('function', 'procedure'):
+                if d[1].lower() in alcancadas:
+                    decls.append(self.eliminar_subrotina(d))
+                else:
+                    self.removidos['subrotinas'].append(d[1])
+            elif d and d[0] == 'memo' and d[1].lower() not in alcancadas:
+                continue
+            else:
+                decls.append(d)
+        return manter_linha(defn, defn[:-1] + (('block', decls, block[2]),))
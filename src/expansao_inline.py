@@ -0,0 +1,114 @@
+from analise_ast import percorrer, nomes_locais, manter_linha, PREDEFINIDAS
+
+# Expansão em linha (inlining) de sub-rotinas pequenas, feita sobre a AST antes da geração de
+# código. As chamadas ('call', nome, args) de sub-rotinas elegíveis passam a nós
+# ('inline', nome, args, definição), que o CodeGenerator gera sem CALL: os parâmetros, as
+# variáveis locais e o resultado ficam em temporários da frame de quem chama.
+
+# Número de nós da AST de um bloco (medida do custo de o copiar para cada chamada)
+def tamanho_ast(node):
+    return sum(1 for _ in percorrer(node))
+
+
+# Verifica se uma sub-rotina de nível global pode ser expandida em linha: só declara
+# variáveis e constantes, não chama outras sub-rotinas do utilizador (nem a si própria) e
+# não usa goto
+def elegivel(defn, nomes_subrotinas):
+    nome = defn[1].lower()
+    block = defn[-1]
+    for d in block[1]:
+        if d and d[0] not in ('var_decl', 'consts'):
+            return False
+    for n in percorrer(('compound', block[2])):
+        tag = n[0]
+        if tag in ('goto', 'label_stmt'):
+            return False
+        if tag == 'call' and n[1].lower() not in PREDEFINIDAS:
+            return False
+        if tag == 'var' and isinstance(n[1], str) and n[1].lower() in nomes_subrotinas \
+                and n[1].lower() != nome:
+            return False
+    return True
+
+
+# Número de chamadas de cada sub-rotina em todo o programa, sem contar as referências ao
+# próprio nome dentro da sua definição (atribuições do resultado e chamadas recursivas)
+def contar_chamadas(ast, subrotinas):
+    def contar(node):
+        contagem = dict.fromkeys(subrotinas, 0)
+        for n in percorrer(node):
+            if n[0] in ('call', 'var') and isinstance(n[1], str) and n[1].lower() in contagem:
+                contagem[n[1].lower()] += 1
+        return contagem
+    total = contar(ast)
+    return {nome: total[nome] - contar(defn)[nome] for nome, defn in subrotinas.items()}
+
+
+class Expansor:
+    def __init__(self, limite):
+        # Tamanho máximo (em nós da AST) de uma sub-rotina expandida em todas as chamadas;
+        # uma sub-rotina chamada uma única vez é expandida qualquer que seja o tamanho
+        self.limite = limite
+        # Sub-rotinas a expandir: nome -> definição
+        self.candidatas = {}
+
+    # Devolve a AST do programa com as chamadas das sub-rotinas elegíveis expandidas
+    def expandir_programa(self, ast):
+        _, nome, block = ast
+        decls = block[1]
+        subrotinas = {d[1].lower(): d for d in decls if d and d[0] in ('function', 'procedure')}
+        chamadas = contar_chamadas(ast, subrotinas)
+        # As functions com {$MEMO} são sempre chamadas (a tabela de resultados está na entrada)
+        memo = {d[1].lower() for d in decls if d and d[0] == 'memo'}
+        for n, defn in subrotinas.items():
+            if chamadas[n] and n not in memo and elegivel(defn, subrotinas) \
+                    and (chamadas[n] == 1 or tamanho_ast(defn[-1]) <= self.limite):
+                self.candidatas[n] = defn
+        if not self.candidatas:
+            return ast
+        novas = [self.expandir_subrotina(d, frozenset()) if d and d[0] in ('function', 'procedure') else d
+                 for d in decls]
+        return manter_linha(ast, ('program', nome, ('block', novas, self.expandir(block[2], frozenset(), False))))
+
+    # Expande as chamadas no corpo de uma sub-rotina (e nas sub-rotinas declaradas nela)
+    def expandir_subrotina(self, defn, escondidos):
+        escondidos = escondidos | nomes_locais(defn)
+        block = defn[-1]
+        decls = [self.expandir_subrotina(d, escondidos) if d and d[0] in ('function', 'procedure') else d
+                 for d in block[1]]
+        novo = ('block', decls, self.expandir(block[2], escondidos, False))
+        return manter_linha(defn, defn[:-1] + (novo,))
+
+    # Reconstrói um nó (ou lista de nós), trocando as chamadas das candidatas por nós 'inline'.
+    # 'escondidos' são os nomes declarados pelas sub-rotinas envolventes e 'com' indica que o
+    # nó está dentro de um WITH (onde um nome isolado pode ser um campo de record).
+    def expandir(self, node, escondidos, com):
+        if isinstance(node, list):
+            return [self.expandir(x, escondidos, com) for x in node]
+        if not isinstance(node, tuple):
+            return node
+        if not node or not isinstance(node[0], str):
+            return tuple(self.expandir(x, escondidos, com) for x in node)
+        tag = node[0]
+        if tag == 'call':
+            _, nome, args = node
+            args = self.expandir(args, escondidos, com)
+            nl = nome.lower()
+            if nl in self.candidatas and nl not in escondidos:
+                return manter_linha(node, ('inline', nome, args, self.candidatas[nl]))
+            return manter_linha(node, ('call', nome, args))
+        if tag == 'var':
+            nl = node[1].lower() if isinstance(node[1], str) else None
+            if nl in self.candidatas and nl not in escondidos and not com \
+                    and self.candidatas[nl][0] == 'function' and not self.candidatas[nl][2]:
+                return ('inline', node[1], [], self.candidatas[nl])
+            return node
+        if tag == 'assign':
+            _, lhs, expr = node
+            # O destino nunca é uma chamada (o nome de uma function é a célula do resultado)
+            if lhs[0] != 'var':
+                lhs = self.expandir(lhs, escondidos, com)
+            return manter_linha(node, ('assign', lhs, self.expandir(expr, escondidos, com)))
+        if tag == 'with':
+            return manter_linha(node, ('with', node[1], self.expandir(node[2], escondidos, True)))
+        return manter_linha(node, (tag,) + tuple(self.expandir(x, escondidos, com) for x in node[1:]))
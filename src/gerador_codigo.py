@@ -1,3 +1,136 @@
+import json
+from representacao_intermedia import CFG, Op
+from otimizador import otimizar
+from analise_ast import (variaveis_escritas, chama_outras, variaveis_proprias, chamadas_cauda, raiz,
+                         nomes_livres, literais_texto, percorrer, filhos, substituir_variavel,
+                         separar_constante, indexacoes_variaveis)
+from expansao_inline import Expansor, tamanho_ast
+from avaliacao_constante import AvaliacaoConstante, Avaliador, dobrar_constantes
+from codigo_morto import EliminacaoCodigoMorto
+from layout_memoria import (TipoArray, TipoRegisto, TipoConjunto, Frame, Loc, BITS_PALAVRA,
+                            resolver_tipo, tamanho, tipo_base, limites, juntar_intervalos)
+
+
+# Opções do gerador de código (podem ser alteradas no construtor do CodeGenerator)
+OPCOES_PADRAO = {
+    # Aplica as otimizações sobre o CFG antes de escrever o código
+    'otimizar': True,
+    # Onde ficam os arrays globais: 'estatico' (células contíguas da frame global,
+    # acedidas por gp + deslocamento) ou 'heap' (bloco alocado com ALLOCN, acedido
+    # através de um apontador guardado em gp)
+    'layout_arrays': 'estatico',
+    # Base dos arrays globais deslocada de -low * stride (somado por todas as dimensões),
+    # para os índices variáveis serem usados sem subtrair o limite inferior: o array fica na
+    # célula low * stride (com até 'base_deslocada_folga' células livres antes dele) ou é
+    # acedido através de uma célula com o endereço do elemento 0 (ver declarar_global)
+    'base_deslocada': True,
+    'base_deslocada_folga': 16,
+    # Seleção do ramo de um CASE: 'auto' escolhe pelas etiquetas; 'tabela', 'binaria' ou
+    # 'linear' forçam uma das estratégias (para comparar o custo de cada uma)
+    'case_estrategia': 'auto',
+    # Número máximo de etiquetas para usar uma cadeia de comparações
+    'case_max_linear': 3,
+    # Densidade mínima (etiquetas / amplitude dos valores) para usar uma tabela de saltos
+    'case_densidade_tabela': 0.5,
+    # Avaliação em tempo de compilação das chamadas de functions puras com argumentos
+    # constantes (ver avaliacao_constante) e número máximo de passos de cada avaliação
+    'avaliacao_constante': True,
+    'avaliacao_passos': 100000,
+    # Expansão em linha das sub-rotinas pequenas que não chamam outras (ver expansao_inline)
+    'inline': True,
+    # Tamanho máximo, em nós da AST, de uma sub-rotina expandida em várias chamadas
+    'inline_limite': 40,
+    # Retira as sub-rotinas não alcançáveis a partir do programa principal e as variáveis
+    # globais e constantes não usadas (ver codigo_morto)
+    'eliminar_codigo_morto': True,
+    # Chamadas recursivas em posição de cauda compiladas como atribuição dos parâmetros e
+    # salto para o início do corpo (a pilha de chamadas não cresce)
+    'recursao_cauda': True,
+    # Desenrolamento dos ciclos for com limites constantes: completo até 'desenrolar_completo'
+    # iterações; nos restantes, o corpo é repetido 'desenrolar_fator' vezes por cada teste.
+    # O total de cópias do corpo não pode passar 'desenrolar_orcamento' nós da AST.
+    'desenrolar': True,
+    'desenrolar_completo': 8,
+    'desenrolar_fator': 4,
+    'desenrolar_orcamento': 160,
+    # Redução de força das variáveis de indução dos ciclos for: os índices de arrays e os
+    # produtos por constantes da variável do ciclo passam a variáveis auxiliares atualizadas
+    # com uma soma em cada iteração (ver planear_inducao)
+    'reducao_inducao': True,
+    # Literais de texto repetidos criados uma única vez, no início do programa, e guardados
+    # numa célula da frame global (ver strings_partilhadas)
+    'tabela_strings': True,
+}
+
+LAYOUTS_ARRAYS = ('estatico', 'heap')
+ESTRATEGIAS_CASE = ('auto', 'tabela', 'binaria', 'linear')
+
+# Número máximo de células copiadas instrução a instrução (acima disto, a cópia é um ciclo)
+LIMITE_COPIA = 16
+
+# Functions com {$MEMO}: número máximo de entradas de uma tabela indexada pelos valores dos
+# parâmetros (tipos intervalo) e número de entradas da cache usada nos restantes casos
+MEMO_MAX_TABELA = 4096
+MEMO_CACHE = 1024
+
+# Comprimento estimado do operando de um PUSHG/STOREG (deslocamento na frame global)
+DIGITOS_DESLOCAMENTO = 3
+
+# Etiqueta da sub-rotina auxiliar que calcula a interseção de duas palavras de um conjunto
+ETQ_CONJ_AND = 'CONJAND'
+
+
+# Erro de compilação de uma construção que o gerador de código não suporta
+class ErroCompilacao(Exception):
+    pass
+
+
+# Escolhe como selecionar o ramo de um CASE a partir dos valores ordinais das etiquetas:
+#   'linear'  - poucas etiquetas: comparações em sequência
+#   'tabela'  - etiquetas densas: tabela de endereços indexada pelo valor (custo constante)
+#   'binaria' - restantes casos: árvore de decisão equilibrada sobre os intervalos de valores
+def estrategia_case(valores, opcoes):
+    if opcoes['case_estrategia'] != 'auto':
+        return opcoes['case_estrategia']
+    n = len(valores)
+    if n <= opcoes['case_max_linear']:
+        return 'linear'
+    amplitude = max(valores) - min(valores) + 1
+    if n / amplitude >= opcoes['case_densidade_tabela']:
+        return 'tabela'
+    return 'binaria'
+
+
+# Escolhe os literais de texto que ficam numa célula da frame global, a partir de
+# literais_texto (texto -> [ocorrências, executada várias vezes]). Cada PUSHS cria uma
+# string nova sempre que é executado; com a tabela, a string é criada uma vez (PUSHS e
+# STOREG antes do START) e cada ocorrência passa a um PUSHG. Entram os literais executados
+# várias vezes (num ciclo ou numa sub-rotina chamada em vários sítios ou num ciclo) e, dos
+# restantes, os que aparecem tantas vezes que a tabela torna o código mais curto.
+def strings_partilhadas(literais):
+    escolhidos = set()
+    for texto, (ocorrencias, repetida) in literais.items():
+        # Tamanho em carácteres das linhas 'PUSHS "texto"' e 'PUSHG k'
+        pushs = len(texto) + 9
+        acesso = DIGITOS_DESLOCAMENTO + 7
+        if repetida or ocorrencias * pushs > pushs + (acesso + 1) + ocorrencias * acesso:
+            escolhidos.add(texto)
+    return escolhidos
+
+
+# Agrupa os valores das etiquetas de um CASE (valor -> índice do ramo) em intervalos de
+# valores consecutivos do mesmo ramo: [(lo, hi, ramo), ...] por ordem crescente
+def intervalos_case(valores):
+    intervalos = []
+    for v in sorted(valores):
+        k = valores[v]
+        if intervalos and intervalos[-1][1] == v - 1 and intervalos[-1][2] == k:
+            intervalos[-1] = (intervalos[-1][0], v, k)
+        else:
+            intervalos.append((v, v, k))
+    return intervalos
+
+
 # Extrai o valor de nós do tipo 'const', tipo ou valor, ou de constantes nomeadas
 def extrair_valor_constante(ast, consts):
     # Se o nó for um inteiro, devolve-o diretamente
@@ -9,8 +142,8 @@ def extrair_valor_constante(ast, consts):
     # Se for um tuplo, trata-o conforme o tipo de nó (const_expr, var, binop, etc.)
     elif isinstance(ast, tuple):
         tag = ast[0]
-        # Caso seja uma expressão constante ('const_expr', tipo, valor)
-        if tag == 'const_expr':
+        # Caso seja uma expressão constante ('const_expr', tipo, valor) ou um literal ('const', tipo, valor)
+        if tag in ('const_expr', 'const'):
             tipo = ast[1]
             valor = ast[2]
             # Converte o valor para o tipo correspondente
@@ -22,12 +155,15 @@ def extrair_valor_constante(ast, consts):
                 return valor.lower() == 'true'
             elif tipo == 'char':
                 return valor  # Assume que já é um char simples
+            elif tipo == 'id':
+                # Identificador usado num limite (ex: array[1..MAX]): é uma constante nomeada
+                return extrair_valor_constante(('var', valor), consts)
             else:
                 # Se o tipo não for suportado, lança uma exceção
                 raise Exception(f"Tipo constante não suportado: {tipo}")
         # Caso seja uma constante nomeada ('var', nome)
         elif tag == 'var':
-            nome = ast[1]
+            nome = ast[1].lower()
             if nome not in consts:
                 # Se a constante não estiver definida, lança uma exceção
                 raise Exception(f"Constante não definida: {nome}")
@@ -60,135 +196,703 @@ def extrair_valor_constante(ast, consts):
 
 
 class CodeGenerator:
-    def __init__(self):
+    def __init__(self, **opcoes):
+        desconhecidas = set(opcoes) - set(OPCOES_PADRAO)
+        if desconhecidas:
+            raise ValueError(f"Opções desconhecidas: {', '.join(sorted(desconhecidas))}")
+        self.opcoes = dict(OPCOES_PADRAO, **opcoes)
+        if self.opcoes['layout_arrays'] not in LAYOUTS_ARRAYS:
+            raise ValueError(f"layout_arrays inválido: {self.opcoes['layout_arrays']!r}")
+        if self.opcoes['case_estrategia'] not in ESTRATEGIAS_CASE:
+            raise ValueError(f"case_estrategia inválida: {self.opcoes['case_estrategia']!r}")
         # Tabela de símbolos: associa nome a informações de cada identificador
         self.symtab = {}
         # Constantes nomeadas extraídas da AST
         self.consts = {}
-        # Sub-rotinas (functions/procedures): nome -> (etiqueta, número_de_parâmetros)
+        # Sub-rotinas (functions/procedures): nome -> (etiqueta, parâmetros, tipo do resultado),
+        # com os parâmetros como (nome, modo, descritor) e o tipo do resultado None nos procedures
         self.subroutines = {}
-        # Aliases de tipos
+        # Aliases de tipos (nome -> descritor do layout de memória)
         self.types = {}
-        # Lista de instruções de código máquina geradas
-        self.code = []
-        # Próximo offset livre do gp (variáveis globais)
-        self.offset = 0
+        # Records abertos pelos WITH em curso (localizações, do mais exterior para o mais interior)
+        self.com = []
+        # Representação intermédia: blocos básicos com as instruções geradas
+        self.cfg = CFG()
+        # Estatísticas de compilação (preenchidas pelos vários passos)
+        self.stats = {}
+        # Frame global (células a partir de gp) e referência para o PUSHN que a reserva
+        self.globais = Frame()
+        self.reserva_globais = None
+        # Arrays globais (estáticos) acedidos através de uma célula com a base deslocada:
+        # offset do array -> (célula com o endereço do elemento 0, descritor do array)
+        self.bases_deslocadas = {}
+        # Indexações com índices variáveis de cada nome (ver indexacoes_variaveis)
+        self.indexacoes = {}
+        # Frame atual: a global no programa principal ('G', acedida por gp) ou a da sub-rotina
+        # em geração ('L', acedida por fp), e nível de encaixe da sub-rotina (0 no principal)
+        self.frame = self.globais
+        self.base_frame = 'G'
+        self.nivel = 0
+        # Display: células da frame global com o fp da ativação mais recente de cada nível de
+        # encaixe cujas variáveis são usadas por sub-rotinas internas (nível -> deslocamento)
+        self.display = {}
+        # Ramos de uma tabela de saltos em geração (ver gen_case_tabela) e acessos à frame
+        # local feitos dentro deles, cujo deslocamento é corrigido no fim da sub-rotina
+        self.ramos_tabela = 0
+        self.correcoes_fp = []
+        # Âmbito do programa principal (tabela de símbolos, constantes e tipos), usado pelo
+        # corpo das sub-rotinas expandidas em linha
+        self.ambito_global = None
+        # Expansões em linha de functions em curso (o corpo é gerado a meio de uma expressão)
+        self.inline_expressao = 0
+        # Chamadas recursivas em posição de cauda da sub-rotina em geração (nós da AST) e
+        # etiqueta do início do seu corpo, para onde essas chamadas saltam
+        self.chamadas_cauda = ()
+        self.inicio_corpo = None
+        # Bloco executado antes do START, para inicializações pedidas durante a geração
+        self.preambulo = None
+        # Offset da tabela de potências de 2 (conjuntos), reservada só quando é usada
+        self.tabela_potencias = None
+        # Literais de texto escolhidos por strings_partilhadas e células da frame global
+        # onde já foram guardados (texto -> offset, reservado no primeiro uso)
+        self.strings_escolhidas = set()
+        self.tabela_strings = {}
+        # Variáveis de indução dos ciclos for em geração: nome da variável do ciclo ->
+        # (localização, {(a, m): célula auxiliar com o valor (variável + a) * m})
+        self.inducao = {}
+        # Etiquetas das functions declaradas com {$MEMO} (ver gen_memo)
+        self.memo = set()
+        # Sub-rotinas auxiliares usadas pelo código gerado (emitidas no fim do programa)
+        self.auxiliares = set()
         # Contador para criar labels únicas (L0, L1, etc.)
         self.label_counter = 0
+        # Labels (goto) do bloco em geração: número -> etiqueta do CFG
+        self.rotulos = {}
+
+
+    # Insere uma instrução (opcode e operando) no bloco básico atual, ou no bloco indicado
+    def emit(self, op, arg=None, bloco=None):
+        return self.cfg.emit(op, arg, bloco)
 
 
-    # Insere uma instrução na lista de código gerado
-    def emit(self, instr):
-        self.code.append(instr)
+    # Inicia um novo bloco básico com a etiqueta dada
+    def label(self, name):
+        self.cfg.rotulo(name)
+
+
+    # Converte a representação intermédia nas linhas de texto da EWVM (passo final)
+    def lines(self):
+        return self.cfg.lower()
 
 
     # Grava as instruções num ficheiro, uma por linha
     def write(self, filename):
         with open(filename, 'w') as f:
-            for instr in self.code:
+            for instr in self.lines():
                 f.write(instr + '\n')
 
 
+    # Mapa de fontes: para cada instrução de lines(), a linha do programa fonte (None se
+    # não for conhecida) e a sub-rotina (o nome do programa no bloco principal)
+    def mapa(self):
+        return self.cfg.mapa()
+
+
+    # Grava o mapa de fontes em JSON: {"instrucoes": [[linha, sub-rotina], ...]}
+    def write_map(self, filename):
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump({'instrucoes': [list(o) for o in self.mapa()]}, f, ensure_ascii=False)
+
+
+    # Grava a representação intermédia (CFG) em JSON, para depuração
+    def write_ir(self, filename):
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write(self.cfg.to_json(indent=1))
+
+
     # Emite a instrução de verificação de índice de array: CHECK 0,size-1
     def emit_check(self, size):
-        self.emit(f"CHECK 0,{size-1}")
+        self.emit(Op.CHECK, (0, size - 1))
+
+
+    # Procura um identificador na tabela de símbolos (o Pascal não distingue maiúsculas)
+    def simbolo(self, name):
+        return self.symtab.get(name.lower(), (None,))
+
+
+    # Valor de uma expressão constante como ordinal (chars pelo código ASCII, booleanos como 0/1)
+    def ordinal(self, ast):
+        valor = extrair_valor_constante(ast, self.consts)
+        if isinstance(valor, bool):
+            return int(valor)
+        if isinstance(valor, str) and len(valor) == 1:
+            return ord(valor)
+        return valor
+
+
+    # Valor ordinal de uma expressão conhecida em tempo de compilação (literal ou constante
+    # nomeada), ou None se só for conhecida em tempo de execução
+    def valor_constante(self, node):
+        if node[0] == 'const' and node[1] in ('integer', 'char', 'boolean'):
+            return self.ordinal(node)
+        if node[0] == 'var':
+            kind, *info = self.simbolo(node[1])
+            if kind == 'const':
+                return self.valor_constante(info[0])
+        return None
+
+
+    # Regista os valores dos tipos enumerados, ex: (Low, Medium, High), como constantes 0, 1, 2, ...
+    def registar_enumerados(self, tp):
+        if isinstance(tp, tuple) and tp and tp[0] == 'enum':
+            for k, nome in enumerate(tp[1]):
+                expr = ('const', 'integer', k)
+                self.consts[nome.lower()] = expr
+                self.symtab[nome.lower()] = ('const', expr)
+        elif isinstance(tp, (tuple, list)):
+            for x in tp:
+                self.registar_enumerados(x)
+
+
+    # Converte um nó de tipo da AST no descritor usado pelo layout de memória
+    def resolver(self, tp):
+        return resolver_tipo(tp, self.types, self.ordinal)
+
+
+    # Regista uma variável global. Escalares e arrays (no layout estático) ocupam células
+    # contíguas da frame global; no layout 'heap', cada array é alocado com ALLOCN e gp
+    # guarda apenas o apontador para o bloco.
+    # Com a opção 'base_deslocada', o primeiro elemento de um array fica a tp.desvio células
+    # (low * stride, somado por todas as dimensões) do elemento com os índices a 0, para os
+    # índices serem usados sem ajuste: na heap, o apontador é o do elemento 0 (com células
+    # livres no início do bloco, se desvio > 0); na frame global, o array é colocado na
+    # célula desvio ou, se já estiver mais à frente e for indexado com índices variáveis
+    # mais de uma vez (ou num ciclo ou sub-rotina), o endereço gp + offset - desvio fica
+    # guardado numa célula própria.
+    # O endereço do elemento 0 nunca fica antes do início do bloco ou da frame.
+    def declarar_global(self, name, tp):
+        deslocar = isinstance(tp, TipoArray) and self.opcoes['base_deslocada']
+        desvio = tp.desvio if deslocar else 0
+        folga = self.opcoes['base_deslocada_folga']
+        if isinstance(tp, TipoArray) and self.opcoes['layout_arrays'] == 'heap':
+            off = self.globais.reservar()
+            livres = desvio if 0 < desvio <= folga else 0
+            self.emit(Op.PUSHI, tamanho(tp) + livres)  # faz PUSH do tamanho
+            self.emit(Op.ALLOCN)  # faz ALLOC de um bloco de tamanho 'size'
+            if desvio < 0:
+                # O elemento 0 fica depois do início do bloco
+                self.emit(Op.PUSHI, -desvio)
+                self.emit(Op.PADD)
+            elif not livres:
+                desvio = 0
+            self.emit(Op.STOREG, off)  # guarda o endereço em gp[off]
+            self.symtab[name.lower()] = ('heap', off, tp, desvio)
+            if desvio:
+                self.contar_base_deslocada(livres)
+            return
+        ocorrencias, repetida = self.indexacoes.get(name.lower(), (0, False))
+        if deslocar and ocorrencias and 0 < desvio - self.globais.tamanho <= folga:
+            # Células livres antes do array (reutilizadas pelos temporários)
+            livres = desvio - self.globais.tamanho
+            for _ in range(livres):
+                self.globais.libertar(self.globais.reservar())
+            self.contar_base_deslocada(livres)
+        off = self.globais.reservar(tamanho(tp))
+        self.symtab[name.lower()] = ('global', off, tp)
+        if deslocar and off > desvio and (ocorrencias > 1 or repetida):
+            apontador = self.globais.reservar()
+            self.emit(Op.PUSHGP)
+            self.emit(Op.PUSHI, off - desvio)
+            self.emit(Op.PADD)
+            self.emit(Op.STOREG, apontador)
+            self.bases_deslocadas[off] = (apontador, tp)
+            self.contar_base_deslocada(0)
+
+
+    # Conta um array com a base deslocada e as células livres reservadas para isso
+    def contar_base_deslocada(self, livres):
+        contagem = self.stats.setdefault('bases_deslocadas', {'arrays': 0, 'livres': 0})
+        contagem['arrays'] += 1
+        contagem['livres'] += livres
+
+
+    # Localização de um array global inteiro ('loc') a usar numa indexação com um índice
+    # variável: através da célula com a sua base deslocada, se existir
+    def base_deslocada(self, loc):
+        if loc.base == 'G' and not loc.terms:
+            info = self.bases_deslocadas.get(loc.offset)
+            if info is not None and info[1] is loc.tp:
+                return Loc(Loc('G', info[0], 'pointer'), loc.tp.desvio, loc.tp)
+        return loc
+
+
+    # Localização em memória de uma variável ('var', nome), de um elemento de array
+    # ('array', base, idx) ou de um campo de record ('field', base, nome). Índices
+    # constantes e deslocamentos dos campos são resolvidos já aqui.
+    def localizar(self, node):
+        tag = node[0]
+        if tag == 'var':
+            # Dentro de um WITH, os nomes dos campos escondem as restantes variáveis
+            loc = self.campo_com(node[1])
+            if loc is not None:
+                return loc
+            kind, *info = self.simbolo(node[1])
+            if kind == 'global':
+                return Loc('G', info[0], info[1])
+            if kind == 'heap':
+                return Loc(Loc('G', info[0], 'pointer'), info[2], info[1])
+            if kind == 'loc':
+                # Nome ligado a uma localização (parâmetros e locais de uma expansão em linha)
+                return info[0]
+            if kind in ('local', 'ref'):
+                off, tp, nivel = info
+                if nivel == self.nivel:
+                    frame = 'L'
+                else:
+                    # Variável de uma sub-rotina exterior: a frame é a indicada pelo display
+                    if nivel not in self.display:
+                        raise Exception(f"Nível {nivel} sem display: {node[1]}")
+                    frame = Loc('G', self.display[nivel], 'pointer')
+                    contagem = self.stats.setdefault('display', {'profundidade': 0, 'acessos': 0})
+                    contagem['acessos'] += 1
+                if kind == 'ref':
+                    # Parâmetro recebido pelo endereço: a célula da frame guarda um apontador
+                    return Loc(Loc(frame, off, 'pointer'), 0, tp)
+                return Loc(frame, off, tp)
+            raise Exception(f"Variável ou uso incorreto: {node[1]}")
+        if tag == 'array':
+            _, base, idx = node
+            valor = self.valor_constante(idx)
+            loc = self.localizar(base)
+            if valor is None:
+                loc = self.base_deslocada(loc)
+            return loc.indexar(idx, valor)
+        if tag == 'field':
+            _, base, nome = node
+            return self.localizar(base).campo(nome)
+        raise Exception(f"Não é uma variável: {node}")
+
+
+    # Localização do campo 'name' de um dos records abertos pelos WITH em curso, ou None
+    def campo_com(self, name):
+        key = name.lower()
+        for rec in reversed(self.com):
+            if key in rec.tp.campos:
+                return rec.campo(key)
+        return None
+
+
+    # Tipo (descritor) de uma expressão, tanto quanto é preciso para gerar código
+    def tipo_expr(self, node):
+        tag = node[0]
+        if tag == 'const':
+            return node[1]
+        if tag in ('var', 'array', 'field'):
+            if tag == 'var' and self.campo_com(node[1]) is None:
+                kind, *info = self.simbolo(node[1])
+                if kind == 'const':
+                    return self.tipo_expr(info[0])
+                if kind is None and node[1].lower() in self.subroutines:
+                    # Chamada de uma função sem argumentos
+                    return self.subroutines[node[1].lower()][2] or 'integer'
+            return self.localizar(node).tp
+        if tag == 'set_lit':
+            return 'set'
+        if tag == 'not':
+            return 'boolean'
+        if tag == 'binop':
+            op = node[1].lower()
+            if op in ('+', '-', '*'):
+                tipos = (self.tipo_expr(node[2]), self.tipo_expr(node[3]))
+                for t in tipos:
+                    if isinstance(t, TipoConjunto):
+                        return t
+                if 'set' in tipos:
+                    return 'set'
+                return 'real' if 'real' in tipos else 'integer'
+            if op == '/':
+                return 'real'
+            if op in ('div', 'mod'):
+                return 'integer'
+            return 'boolean'
+        if tag == 'call':
+            nl = node[1].lower()
+            if nl == 'real':
+                return 'real'
+            if nl in self.subroutines:
+                return self.subroutines[nl][2] or 'integer'
+        return 'integer'
+
+
+    # Empilha o endereço a partir do qual se conta o deslocamento de uma localização
+    def emit_base(self, base):
+        if base == 'G':
+            self.emit(Op.PUSHGP)
+        elif base == 'L':
+            self.emit(Op.PUSHFP)
+            if self.ramos_tabela:
+                # fp aponta para o fim da frame (ver emit_local)
+                self.emit_local(Op.PUSHI, 0)
+                self.emit(Op.PADD)
+        else:
+            # A base é uma célula que guarda um apontador (array na heap)
+            self.emit_load(base)
+
+
+    # Empilha o deslocamento (em células) de uma localização com índices variáveis,
+    # verificando cada índice com CHECK
+    def emit_deslocamento(self, loc):
+        primeiro, const, sem_ajuste = self.ajustes_deslocamento(loc)
+        for k, (idx, low, high, stride) in enumerate(loc.terms):
+            # Uma constante somada ao índice (ex: a[i - 1]) junta-se ao ajuste
+            idx, c = separar_constante(idx)
+            if k == 0:
+                # A parte do deslocamento constante que é múltipla do stride é somada logo
+                # ao primeiro índice, e os limites do CHECK são ajustados em conformidade
+                ajuste = primeiro
+                auxiliar = self.forma_inducao(idx, ajuste + c, stride)
+                if auxiliar is not None:
+                    # Variável de indução com o índice já ajustado e multiplicado pelo stride
+                    self.emit_load(auxiliar)
+                    self.emit(Op.CHECK, ((low + ajuste) * stride, (high + ajuste) * stride))
+                    continue
+            else:
+                ajuste = 0 if sem_ajuste else -low
+            self.gen(idx)
+            if ajuste + c > 0:
+                self.emit(Op.PUSHI, ajuste + c)
+                self.emit(Op.ADD)
+            elif ajuste + c < 0:
+                self.emit(Op.PUSHI, -(ajuste + c))
+                self.emit(Op.SUB)
+            self.emit(Op.CHECK, (low + ajuste, high + ajuste))
+            if stride != 1:
+                self.emit(Op.PUSHI, stride)
+                self.emit(Op.MUL)
+            if k > 0:
+                self.emit(Op.ADD)
+        if const:
+            self.emit(Op.PUSHI, const)
+            self.emit(Op.ADD)
+
+
+    # Parte constante do deslocamento de uma localização com índices variáveis:
+    # (ajuste somado ao primeiro índice, constante somada no fim, se os restantes índices são
+    # usados sem subtrair o limite inferior). Os índices de um array com várias dimensões
+    # podem ser usados tal como estão, com o low * stride de cada um descontado na constante
+    # (o que não custa nada num array com a base deslocada, ver declarar_global), ou com o
+    # limite inferior subtraído a cada um; fica a forma com menos instruções.
+    def ajustes_deslocamento(self, loc):
+        _, low, _, stride = loc.terms[0]
+        internos = loc.terms[1:]
+        formas = []
+        for sem_ajuste in (True, False):
+            const = loc.offset - (sum(l * s for _, l, _, s in internos) if sem_ajuste else 0)
+            q, const = divmod(const, stride)
+            custo = (q != low) + (const != 0) + (0 if sem_ajuste else sum(l != 0 for _, l, _, _ in internos))
+            formas.append((custo, (q - low, const, sem_ajuste)))
+        return min(formas, key=lambda f: f[0])[1]
+
+
+    # Empilha o valor guardado na localização 'loc'
+    def emit_load(self, loc):
+        if loc.terms:
+            self.emit_base(loc.base)
+            self.emit_deslocamento(loc)
+            self.emit(Op.LOADN)
+        elif loc.base == 'G':
+            self.emit(Op.PUSHG, loc.offset)
+        elif loc.base == 'L':
+            self.emit_local(Op.PUSHL, loc.offset)
+        else:
+            self.emit_load(loc.base)
+            self.emit(Op.LOAD, loc.offset)
+
+
+    # Guarda na localização 'loc' o valor empilhado pela função 'valor'
+    def emit_store(self, loc, valor):
+        if loc.terms:
+            self.emit_base(loc.base)
+            self.emit_deslocamento(loc)
+            valor()
+            self.emit(Op.STOREN)
+        elif loc.base == 'G':
+            valor()
+            self.emit(Op.STOREG, loc.offset)
+        elif loc.base == 'L':
+            valor()
+            self.emit_local(Op.STOREL, loc.offset)
+        else:
+            self.emit_load(loc.base)
+            valor()
+            self.emit(Op.STORE, loc.offset)
+
+
+    # Acesso (PUSHL/STOREL/PUSHI) a um deslocamento 'off' da frame local. Dentro dos ramos
+    # de uma tabela de saltos, fp aponta para o fim da frame da sub-rotina (o CALL do salto
+    # indireto faz fp = sp), por isso o deslocamento é corrigido em gen_subrotina, quando o
+    # tamanho final da frame já é conhecido.
+    def emit_local(self, op, off):
+        ref = self.emit(op, off)
+        if self.ramos_tabela:
+            self.correcoes_fp.append((ref, off))
+
+
+    # Verifica se os valores do tipo 'tp' são passados pelo endereço (arrays, records e
+    # conjuntos com mais de uma palavra) em vez de ocuparem uma única célula
+    def e_agregado(self, tp):
+        return isinstance(tp, (TipoArray, TipoRegisto)) or (isinstance(tp, TipoConjunto) and tp.palavras > 1)
+
+
+    # Empilha o conteúdo de uma variável: o valor, se for escalar, ou o endereço, se for
+    # um array ou record (ex: argumento de uma sub-rotina)
+    def emit_valor(self, loc):
+        if self.e_agregado(loc.tp):
+            self.emit_endereco(loc)
+        else:
+            self.emit_load(loc)
+
+
+    # Empilha o endereço de uma localização (usado para passar arrays e records inteiros)
+    def emit_endereco(self, loc):
+        self.emit_base(loc.base)
+        if loc.terms:
+            self.emit_deslocamento(loc)
+            self.emit(Op.PADD)
+        elif loc.offset:
+            self.emit(Op.PUSHI, loc.offset)
+            self.emit(Op.PADD)
+
+
+    # Copia 'n' células de 'origem' para 'destino' (localizações sem índices variáveis):
+    # instrução a instrução, se forem poucas, ou num ciclo com um contador temporário
+    def emit_copia(self, origem, destino, n):
+        if n <= LIMITE_COPIA:
+            for k in range(n):
+                self.emit_store(Loc(destino.base, destino.offset + k, 'integer'),
+                                lambda: self.emit_load(Loc(origem.base, origem.offset + k, 'integer')))
+            return
+        i = self.label_counter
+        self.label_counter += 1
+        lbl_start = f"L{i}COPIA"
+        lbl_end = f"L{i}ENDCOPIA"
+        k = self.temporario()
+        self.emit_store(k, lambda: self.emit(Op.PUSHI, 0))
+        self.label(lbl_start)
+        self.emit_load(k)
+        self.emit(Op.PUSHI, n)
+        self.emit(Op.INF)
+        self.emit(Op.JZ, lbl_end)
+        # destino[k] := origem[k]
+        self.emit_endereco(destino)
+        self.emit_load(k)
+        self.emit_endereco(origem)
+        self.emit_load(k)
+        self.emit(Op.LOADN)
+        self.emit(Op.STOREN)
+        self.emit_store(k, lambda: (self.emit_load(k), self.emit(Op.PUSHI, 1), self.emit(Op.ADD)))
+        self.emit(Op.JUMP, lbl_start)
+        self.label(lbl_end)
+        self.libertar(k)
+
+
+    # Transformações sobre a AST antes da geração (chamar antes de build_symtab): avaliação
+    # das chamadas constantes de functions puras, expansão em linha das sub-rotinas
+    # pequenas e eliminação do código morto (que inclui as sub-rotinas que deixaram de ser
+    # chamadas com os passos anteriores). Devolve a AST a usar nos passos seguintes.
+    def preparar(self, ast):
+        if self.opcoes['avaliacao_constante']:
+            avaliacao = AvaliacaoConstante(self.opcoes['avaliacao_passos'])
+            ast = avaliacao.avaliar_programa(ast)
+            if avaliacao.avaliadas:
+                self.stats['avaliadas'] = avaliacao.avaliadas
+        if self.opcoes['inline']:
+            ast = Expansor(self.opcoes['inline_limite']).expandir_programa(ast)
+        if self.opcoes['eliminar_codigo_morto']:
+            eliminacao = EliminacaoCodigoMorto()
+            ast = eliminacao.eliminar_programa(ast)
+            if any(eliminacao.removidos.values()):
+                self.stats['codigo_morto'] = eliminacao.removidos
+        return ast
 
 
     # Constrói a tabela de símbolos a partir do nó raiz da AST
     def build_symtab(self, ast):
-        _, _, block = ast  # node = ('program', nome, block)
+        _, nome, block = ast  # node = ('program', nome, block)
         decls, _ = block[1], block[2]  # decls contém todas as declarações (types, consts, var_decl, etc.)
+        # O código fora das sub-rotinas fica com o nome do programa no mapa de fontes
+        self.cfg.origem_atual = self.cfg.origem(getattr(ast, 'linha', None), nome)
+
+        # Reserva da frame global antes do START; o número de células só é conhecido no
+        # fim da geração, por isso o operando do PUSHN é corrigido em gen_program
+        self.reserva_globais = self.emit(Op.PUSHN, 0)
+
+        if self.opcoes['base_deslocada']:
+            self.indexacoes = indexacoes_variaveis(ast)
+        self.declarar(decls)
+        self.ambito_global = (self.symtab, self.consts, self.types)
+        if self.opcoes['tabela_strings']:
+            self.strings_escolhidas = strings_partilhadas(literais_texto(ast))
+
+        # Bloco para inicializações só conhecidas durante a geração (ex: tabela de potências
+        # de 2); o código do programa começa num bloco novo
+        self.preambulo = self.cfg.novo_bloco()
+        self.cfg.novo_bloco()
+
+
+    # Processa as declarações de um bloco (do programa ou de uma sub-rotina): constantes,
+    # tipos, sub-rotinas e variáveis, por esta ordem
+    def declarar(self, decls):
+        # Constantes: armazena em self.consts e em symtab como ('const', expr)
+        for d in decls:
+            if d and d[0] == 'consts':
+                for name, expr in d[1]:
+                    self.consts[name.lower()] = expr
+                    self.symtab[name.lower()] = ('const', expr)
 
-        # Processar declarações de tipos (aliases): armazena em self.types
+        # Tipos (aliases): armazena em self.types o descritor de cada tipo, calculado uma
+        # única vez (inclui o layout dos records)
         for d in decls:
             if d and d[0] == 'types':
                 for name, tp in d[1]:
-                    self.types[name.lower()] = tp
-
-        # Processar declarações de constantes: armazena em self.consts e em symtab como ('const', expr)
-        for d in decls:
-            if d and d[0] == 'consts':
-                for name, expr in d[1]:
-                    self.consts[name] = expr
-                    self.symtab[name] = ('const', expr)
+                    self.registar_enumerados(tp)
+                    self.types[name.lower()] = self.resolver(tp)
 
-        # Processar declarações de sub-rotinas (functions e procedures): para cada uma, é registado o rótulo (upper case) e número de parâmetros
+        # Sub-rotinas (functions e procedures): etiqueta, parâmetros e tipo do resultado
         for d in decls:
             if d and d[0] in ('function', 'procedure'):
-                name = d[1].lower()
-                params = d[2] or []
-                nargs = len(params)
-                label = name.upper()
-                self.subroutines[name] = (label, nargs)
+                self.registar_subrotina(d)
+        for d in decls:
+            if d and d[0] == 'memo':
+                self.memo.add(self.subroutines[d[1].lower()][0])
 
-        # Processar declarações de variáveis globais e arrays
+        # Variáveis: no programa principal ficam na frame global (ou na heap, ver
+        # declarar_global); numa sub-rotina, na frame local, como ('local', offset, tipo, nível)
         for d in decls:
             if d and d[0] == 'var_decl':
                 for _, id_list, raw_tp in d[1]:
-                    # raw_tp pode ser um tipo básico ou um id_type para um alias
-                    tp = raw_tp
-                    # Se for um alias de tipo, é usado para o tipo concreto
-                    if isinstance(tp, tuple) and tp[0] == 'id_type':
-                        alias = tp[1].lower()
-                        if alias in self.types:
-                            tp = self.types[alias]
-
+                    # raw_tp pode ser um tipo básico, um array ou um id_type para um alias
+                    self.registar_enumerados(raw_tp)
+                    tp = self.resolver(raw_tp)
                     for name in id_list:
-                        # Se o tipo for array, é usado ALLOCN para alocar espaço na heap
-                        if isinstance(tp, tuple) and tp[0] == 'array_type':
-                            low_ast, high_ast = tp[1]  # limites inferior e superior
-                            low  = extrair_valor_constante(low_ast, self.consts)
-                            high = extrair_valor_constante(high_ast, self.consts)
-                            size = high - low + 1
-                            self.emit(f"PUSHI {size}")  # faz PUSH do tamanho
-                            self.emit("ALLOCN")  # faz ALLOC de um bloco de tamanho 'size'
-                            self.emit(f"STOREG {self.offset}")  # guarda o endereço em gp[offset]
-                            # Regista a variável do array na tabela: (nome -> ('array', gp_offset, low, size, tipo_elem))
-                            elem_tp = tp[2]  # tipo dos elementos
-                            self.symtab[name] = ('array', self.offset, low, size, elem_tp)
-                            self.offset += 1
+                        if self.nivel == 0:
+                            self.declarar_global(name, tp)
                         else:
-                            # Variável global simples: regista apenas ('global', offset)
-                            self.symtab[name] = ('global', self.offset)
-                            self.offset += 1
+                            self.symtab[name.lower()] = ('local', self.frame.reservar(tamanho(tp)), tp, self.nivel)
+
+
+    # Modos dos parâmetros de uma sub-rotina ('param_val', 'param_var', 'param_const'), ou
+    # None se o nome não for de uma sub-rotina conhecida
+    def modos_parametros(self, name):
+        info = self.subroutines.get(name.lower())
+        return None if info is None else [modo for _, modo, _ in info[1]]
 
 
-    # Escolhe qual 'gen' chamar conforme node[0]
+    # Verifica se os arrays e records passados por valor à sub-rotina 'defn' que ela não altera
+    # podem ser lidos diretamente na memória de quem chama: é preciso que a sub-rotina não
+    # altere variáveis fora da sua frame (um global ou parâmetro var podia ser o mesmo array)
+    # nem chame outras sub-rotinas
+    def agregados_sem_copia(self, defn, escritas):
+        nome = defn[1].lower()
+        return not (escritas - variaveis_proprias(defn)) \
+            and not chama_outras(defn[-1], nome, lambda n: n in self.subroutines)
+
+
+    # Regista uma sub-rotina: etiqueta (o nome em maiúsculas, distinto das já usadas),
+    # parâmetros, um por identificador, e tipo do resultado
+    def registar_subrotina(self, d):
+        if d[0] == 'function':
+            _, name, params, ret_tp, _ = d
+            ret = self.resolver(ret_tp)
+        else:
+            _, name, params, _ = d
+            ret = None
+        label = name.upper()
+        usadas = {info[0] for info in self.subroutines.values()}
+        if label in usadas:
+            label = f"{label}{len(usadas)}"
+        parametros = [(pid, modo, self.resolver(tp)) for modo, ids, tp in (params or []) for pid in ids]
+        self.subroutines[name.lower()] = (label, parametros, ret)
+
+
+    # Escolhe qual 'gen' chamar conforme node[0]. As instruções emitidas para um nó com a
+    # linha do programa fonte (ver NoComLinha) ficam com essa origem no mapa de fontes; as
+    # dos restantes nós ficam com a origem do nó que os contém.
     def gen(self, node):
         fn = getattr(self, f"gen_{node[0]}", None)
         if not fn:
             # Se não existir o método gen_<tipo>, lança exceção
-            raise NotImplementedError(f"gen_{node[0]} não implementado")
-        return fn(node)
+            raise ErroCompilacao(f"Instrução não suportada na geração de código: {node[0]}")
+        linha = getattr(node, 'linha', None)
+        if linha is None:
+            return fn(node)
+        anterior = self.cfg.origem_atual
+        self.cfg.origem_atual = self.cfg.origem(linha, self.cfg.tabela_origens[anterior][1])
+        resultado = fn(node)
+        self.cfg.origem_atual = anterior
+        return resultado
 
 
     # Gera o código para o nó 'program'
     def gen_program(self, node):
         _, _, block = node
         # Início da execução principal: emitir START
-        self.emit("START")
+        self.emit(Op.START)
         # Geração do bloco principal
         self.gen(block)
         # Fim do programa: emitir STOP
-        self.emit("STOP")
+        self.emit(Op.STOP)
 
         # Depois de gerar o bloco principal, emite o código das sub-rotinas
-        for name, (label, _) in self.subroutines.items():
-            # Percorre as declarações para encontrar a definição da sub-rotina
-            for d in block[1]:
-                if d and d[1].lower() == name:
-                    if d[0] == 'function':
-                        self.gen_function(d)
-                    else:
-                        self.gen_procedure(d)
+        for d in block[1]:
+            if d and d[0] in ('function', 'procedure'):
+                self.gen(d)
+
+        # Sub-rotinas auxiliares usadas pelo código gerado
+        if ETQ_CONJ_AND in self.auxiliares:
+            self.cfg.origem_atual = self.cfg.origem(None, ETQ_CONJ_AND)
+            self.gen_conj_and()
+
+        # Tamanho final da frame global
+        if self.reserva_globais is not None:
+            self.cfg.corrigir(self.reserva_globais, self.globais.tamanho)
+        self.stats['globais'] = self.globais.tamanho
 
+        # Otimizações sobre o CFG (a conversão para texto só acontece em write/lines)
+        if self.opcoes['otimizar']:
+            self.stats['cfg'] = otimizar(self.cfg)
 
-    # Gera o código para 'block' (lista de statements)
+
+    # Gera o código para 'block' (lista de statements). Cada label usada no bloco passa a
+    # uma etiqueta do CFG; um goto só pode saltar para as labels do próprio bloco.
     def gen_block(self, node):
         _, _, stmts = node
+        anteriores = self.rotulos
+        self.rotulos = {}
+        for n in percorrer(('compound', stmts)):
+            if n[0] == 'label_stmt':
+                self.rotulos[n[1]] = f"L{self.label_counter}ROTULO{n[1]}"
+                self.label_counter += 1
         for stmt in stmts:
             if stmt:
                 self.gen(stmt)
+        self.rotulos = anteriores
+
+
+    # Gera o código para 'goto': um salto para a etiqueta da label
+    def gen_goto(self, node):
+        _, n = node
+        if n not in self.rotulos:
+            raise ErroCompilacao(f"GOTO {n}: só são suportados saltos para labels da mesma sub-rotina")
+        self.emit(Op.JUMP, self.rotulos[n])
+
+
+    # Gera o código para uma instrução com label: um bloco básico novo com a etiqueta dela
+    def gen_label_stmt(self, node):
+        _, n, stmt = node
+        self.label(self.rotulos[n])
+        if stmt:
+            self.gen(stmt)
 
 
     # Gera o código para 'compound' (lista de statements dentro de begin..end)
@@ -214,13 +918,13 @@ class CodeGenerator:
             if len(args) != 1:
                 raise Exception("real() espera 1 argumento")
             self.gen(args[0])
-            self.emit("ITOF")  # inteiro para real
+            self.emit(Op.ITOF)  # inteiro para real
             return
         if nl == 'integer':
             if len(args) != 1:
                 raise Exception("integer() espera 1 argumento")
             self.gen(args[0])
-            self.emit("FTOI")  # real para inteiro
+            self.emit(Op.FTOI)  # real para inteiro
             return
 
         # write / writeln: imprime texto ou inteiro
@@ -229,193 +933,369 @@ class CodeGenerator:
                 # Se for um literal de texto ('const', 'texto', valor)
                 if isinstance(arg, tuple) and arg[0] == 'const' and arg[1].lower() == 'texto':
                     self.gen(arg)
-                    self.emit('WRITES')  # imprime string
+                    self.emit(Op.WRITES)  # imprime string
                 else:
                     self.gen(arg)
-                    self.emit('WRITEI')  # imprime inteiro
+                    self.emit(Op.WRITEI)  # imprime inteiro
             if nl == 'writeln':
-                self.emit('WRITELN')  # nova linha
+                self.emit(Op.WRITELN)  # nova linha
             return
 
-        # read / readln: lê a string do teclado e converte para char ou inteiro
+        # read / readln: lê a string do teclado e converte-a conforme o tipo do destino
         if nl in ('read', 'readln'):
             for arg in args:
-                tag = arg[0]
-                # Caso de variável simples: read(ch)
-                if tag == 'var':
-                    _, var_name = arg
-                    kind, *info = self.symtab.get(var_name, (None,))
-                    if kind not in ('global', 'local'):
-                        raise Exception(f"Variável não encontrada: {var_name}")
-                    store = 'STOREG' if kind == 'global' else 'STOREL'
-                    # Lê a string completa e empilha o endereço
-                    self.emit("READ")
-                    # Se a variável for char, faz CHARAT para extrair 1º carácter
-                    if self.symtab[var_name][0] == 'global' and isinstance(self.symtab[var_name][-1], tuple) and self.symtab[var_name][-1][0]=='char':
-                        self.emit("CHARAT")
-                    else:
-                        # Caso contrário, converte a string lida para inteiro
-                        self.emit("ATOI")
-                    # Armazena no registo apropriado (global ou local)
-                    self.emit(f"{store} {info[0]}")
-
-                # Caso de atribuição a um elemento de array: arr[idx] := read(...)
-                elif tag == 'array':
-                    # arg = ('array', ('var', var_name), idx_expr)
-                    _, base, idx = arg
-                    _, var_name = base
-                    entry = self.symtab.get(var_name)
-                    if not entry or entry[0] != 'array':
-                        raise Exception(f"Uso incorreto: {var_name} não é array")
-                    _, off, low, size, elem_tp = entry
-                    # Empilha o endereço base do array
-                    self.emit(f"PUSHG {off}")
-                    # Gera o código do índice
-                    self.gen(idx)
-                    if low != 0:
-                        # Ajusta pelo limite inferior se não começar em 0
-                        self.emit(f"PUSHI {low}")
-                        self.emit("SUB")
-                    # Lê string completa do teclado
-                    self.emit("READ")
-                    # Se for array de char, extrai o 1º carácter; senão, converte p/ inteiro
-                    if isinstance(elem_tp, tuple) and elem_tp[0] == 'char':
-                        self.emit("CHARAT")
-                    else:
-                        self.emit("ATOI")
-                    # Armazena no array (STOREN espera valor, índice, endereço)
-                    self.emit("STOREN")
-
-                else:
+                # O destino pode ser uma variável simples, read(ch), um elemento de array, read(arr[idx]),
+                # ou um campo de record, read(rec.campo)
+                if arg[0] not in ('var', 'array', 'field'):
                     raise Exception(f"{nl} requer variáveis ou arrays: {arg}")
+                loc = self.localizar(arg)
+                self.emit_store(loc, lambda: self.emit_leitura(loc.tp))
+            return
+
+        if self.e_chamada_cauda(node):
+            self.gen_chamada_cauda(name, args)
             return
 
         # Chamada de sub-rotina definida pelo utilizador
         if nl not in self.subroutines:
             raise Exception(f"Chamada não declarada: {name}")
-        label, nargs = self.subroutines[nl]
-        if len(args) != nargs:
-            raise Exception(f"{name} espera {nargs} args, recebeu {len(args)}")
-        # Empilha espaço para o valor de retorno
-        self.emit("PUSHI 0")
-        # Avalia e empilha os argumentos
-        for arg in args:
+        label, params, ret = self.subroutines[nl]
+        if len(args) != len(params):
+            raise Exception(f"{name} espera {len(params)} args, recebeu {len(args)}")
+        # Empilha espaço para o valor de retorno (só nas functions)
+        if ret is not None:
+            self.emit(Op.PUSHI, 0)
+        # Avalia e empilha os argumentos: parâmetros var, arrays e records pelo endereço
+        # (ver gen_subrotina), os restantes pelo valor
+        for arg, (pid, modo, tp) in zip(args, params):
+            if modo == 'param_var':
+                if arg[0] not in ('var', 'array', 'field'):
+                    raise Exception(f"O argumento do parâmetro var '{pid}' tem de ser uma variável: {arg}")
+                self.emit_endereco(self.localizar(arg))
+                continue
             self.gen(arg)
+            if tp == 'real' and self.tipo_expr(arg) == 'integer':
+                self.emit(Op.ITOF)
         # Empilha o endereço da sub-rotina e chama
-        self.emit(f"PUSHA {label}")
-        self.emit("CALL")
+        self.emit(Op.PUSHA, label)
+        self.emit(Op.CALL)
+        # Retira os argumentos; o resultado de uma function fica no topo da pilha
+        if params:
+            self.emit(Op.POP, len(params))
+
+    # Verifica se um nó é uma chamada recursiva em posição de cauda da sub-rotina em
+    # geração. Nos ramos de uma tabela de saltos a chamada é normal: cada ramo corre com a
+    # frame do CALL do salto indireto, que o salto para o início do corpo não desfaria.
+    def e_chamada_cauda(self, node):
+        return self.ramos_tabela == 0 and any(node is c for c in self.chamadas_cauda)
+
+
+    # Gera uma chamada recursiva em posição de cauda: os novos argumentos são todos
+    # avaliados (podem usar os parâmetros atuais) e só depois guardados nas células dos
+    # parâmetros, seguindo-se um salto para o início do corpo. A célula do resultado e a
+    # frame são as mesmas, por isso a profundidade da pilha não cresce.
+    def gen_chamada_cauda(self, name, args):
+        _, params, _ = self.subroutines[name.lower()]
+        if len(args) != len(params):
+            raise Exception(f"{name} espera {len(params)} args, recebeu {len(args)}")
+        n = len(params)
+        # Parâmetros que recebem o seu próprio valor (ex: 't' em 'Conta(n - 1, t)') ficam como estão
+        mudam = [k for k, (arg, (pid, _, _)) in enumerate(zip(args, params))
+                 if not (arg[0] == 'var' and arg[1].lower() == pid.lower()
+                         and self.simbolo(pid)[1] == k - n)]
+        for k in mudam:
+            arg, (pid, modo, tp) = args[k], params[k]
+            if modo == 'param_var' or self.e_agregado(tp):
+                self.emit_endereco(self.localizar(arg))
+                continue
+            self.gen(arg)
+            if tp == 'real' and self.tipo_expr(arg) == 'integer':
+                self.emit(Op.ITOF)
+        for k in reversed(mudam):
+            self.emit_local(Op.STOREL, k - n)
+        self.emit(Op.JUMP, self.inicio_corpo)
+        contagem = self.stats.setdefault('chamadas_cauda', {})
+        contagem[name.lower()] = contagem.get(name.lower(), 0) + 1
+
+
+    # Chamadas recursivas de cauda de uma sub-rotina que podem ser compiladas como salto
+    # (chamar depois de declarar os parâmetros): um argumento passado pelo endereço
+    # (parâmetro var ou agregado) não pode estar na própria frame, que a iteração seguinte
+    # reutiliza; pode ser global ou um parâmetro recebido pelo endereço
+    def cauda_valida(self, defn):
+        if not self.opcoes['recursao_cauda']:
+            return []
+        _, params, _ = self.subroutines[defn[1].lower()]
+
+        def fora_da_frame(arg):
+            if arg[0] not in ('var', 'array', 'field'):
+                return False
+            return self.simbolo(raiz(arg) or '')[0] in ('global', 'heap', 'ref')
+
+        validas = []
+        for c in chamadas_cauda(defn[-1][2], defn[1].lower(), defn[0] == 'function'):
+            call = c if c[0] == 'call' else c[2]
+            if len(call[2]) != len(params):
+                continue
+            if all(fora_da_frame(arg) for arg, (_, modo, tp) in zip(call[2], params)
+                   if modo == 'param_var' or self.e_agregado(tp)):
+                validas.append(c)
+        return validas
+
+
+    # Gera o código de uma chamada expandida em linha: ('inline', nome, args, definição). Os
+    # argumentos são ligados aos parâmetros sem cópias quando possível (constantes, variáveis
+    # que o corpo não altera, nem diretamente nem através de um parâmetro var, parâmetros var
+    # e agregados só lidos); os restantes parâmetros, as variáveis locais e o resultado
+    # ocupam temporários da frame atual, libertados no fim.
+    # O corpo é gerado no âmbito global acrescentado destas ligações.
+    def gen_inline(self, node):
+        _, name, args, defn = node
+        if name.lower() not in self.subroutines:
+            # Sub-rotina sem outras chamadas, retirada pela eliminação de código morto
+            self.registar_subrotina(defn)
+        _, params, ret = self.subroutines[name.lower()]
+        block = defn[-1]
+        escritas = variaveis_escritas(block, self.modos_parametros)
+        sem_copia = self.agregados_sem_copia(defn, escritas)
+        ligacoes = {}
+        temporarios = []
+
+        # Localização sem índices variáveis de um designador: se tiver índices variáveis, o
+        # endereço é calculado uma vez para um apontador temporário
+        def fixar(loc):
+            if not loc.terms:
+                return loc
+            tmp = self.temporario()
+            self.emit_store(tmp, lambda: self.emit_endereco(loc))
+            temporarios.append(tmp)
+            return Loc(tmp, 0, loc.tp)
+
+        # Valor de um argumento passado por valor, convertido para real se for preciso
+        def valor_argumento(arg, tp):
+            self.gen(arg)
+            if tp == 'real' and self.tipo_expr(arg) == 'integer':
+                self.emit(Op.ITOF)
+
+        # Variáveis (raízes) passadas a parâmetros var que o corpo altera: um argumento por
+        # valor com o mesmo nome mudaria de valor a meio do corpo se fosse lido onde está
+        alteradas = {raiz(arg) for arg, (pid, modo, _) in zip(args, params)
+                     if modo == 'param_var' and pid.lower() in escritas}
+        for arg, (pid, modo, tp) in zip(args, params):
+            key = pid.lower()
+            if modo == 'param_var' or (self.e_agregado(tp) and sem_copia and key not in escritas):
+                ligacoes[key] = ('loc', fixar(self.localizar(arg)))
+            elif self.e_agregado(tp):
+                origem = fixar(self.localizar(arg))
+                copia = Loc(self.base_frame, self.frame.reservar(tamanho(tp)), tp)
+                self.emit_copia(origem, copia, tamanho(tp))
+                ligacoes[key] = ('loc', copia)
+            elif arg[0] == 'const' and (tp != 'real' or arg[1] == 'real') and key not in escritas:
+                ligacoes[key] = ('const', arg)
+            elif arg[0] == 'var' and key not in escritas and arg[1].lower() not in escritas \
+                    and arg[1].lower() not in alteradas \
+                    and self.simbolo(arg[1])[0] not in ('const', None) and self.tipo_expr(arg) == tp:
+                # Variável que o corpo não altera (pelo nome do parâmetro, pelo seu ou através
+                # de um parâmetro var da mesma chamada)
+                ligacoes[key] = ('loc', self.localizar(arg))
+            else:
+                tmp = self.temporario()
+                self.emit_store(tmp, lambda: valor_argumento(arg, tp))
+                temporarios.append(tmp)
+                ligacoes[key] = ('loc', Loc(tmp.base, tmp.offset, tp))
+
+        # Variáveis locais (escalares em temporários, iniciadas a 0 como pelo PUSHN de uma
+        # chamada) e célula do resultado
+        anterior = (self.symtab, self.consts, self.types, self.com)
+        self.symtab, self.consts, self.types = (dict(x) for x in self.ambito_global)
+        self.com = []
+        locais = [(name, ret)] if ret is not None else []
+        for d in block[1]:
+            if d and d[0] == 'consts':
+                for cname, expr in d[1]:
+                    self.consts[cname.lower()] = expr
+                    ligacoes[cname.lower()] = ('const', expr)
+            elif d and d[0] == 'var_decl':
+                for _, id_list, raw_tp in d[1]:
+                    self.registar_enumerados(raw_tp)
+                    vtp = self.resolver(raw_tp)
+                    locais.extend((vname, vtp) for vname in id_list)
+        for vname, vtp in locais:
+            if self.e_agregado(vtp):
+                loc = Loc(self.base_frame, self.frame.reservar(tamanho(vtp)), vtp)
+            else:
+                tmp = self.temporario()
+                temporarios.append(tmp)
+                loc = Loc(tmp.base, tmp.offset, vtp)
+                self.emit_store(loc, lambda: self.emit(Op.PUSHI, 0))
+            ligacoes[vname.lower()] = ('loc', loc)
+        self.symtab.update(ligacoes)
+        for key, (kind, info) in ligacoes.items():
+            if kind == 'const':
+                self.consts[key] = info
+        resultado = ligacoes[name.lower()][1] if ret is not None else None
+
+        if ret is not None:
+            self.inline_expressao += 1
+        self.gen(block)
+        if ret is not None:
+            self.inline_expressao -= 1
+        self.symtab, self.consts, self.types, self.com = anterior
+        if resultado is not None:
+            self.emit_load(resultado)
+        for tmp in temporarios:
+            self.libertar(tmp)
+        contagem = self.stats.setdefault('inline', {})
+        contagem[name.lower()] = contagem.get(name.lower(), 0) + 1
+
+
+    # Lê uma linha do teclado e converte-a para o tipo 'tp'
+    def emit_leitura(self, tp):
+        # Lê a string completa e empilha o endereço
+        self.emit(Op.READ)
+        if tipo_base(tp) == 'char':
+            # Se a variável for char, extrai o 1º carácter da string
+            self.emit(Op.PUSHI, 0)
+            self.emit(Op.CHARAT)
+        elif tp == 'real':
+            self.emit(Op.ATOF)
+        else:
+            # Caso contrário, converte a string lida para inteiro
+            self.emit(Op.ATOI)
+
 
     # Gera o código para constantes literais
     def gen_const(self, node):
         _, tp, val = node
         t = tp.lower()
         if t == 'integer':
-            self.emit(f"PUSHI {val}")
+            self.emit(Op.PUSHI, val)
         elif t == 'real':
-            self.emit(f"PUSHF {val}")
+            self.emit(Op.PUSHF, val)
         elif t == 'boolean':
             if isinstance(val, str):
                 v = 1 if val.lower() == 'true' else 0
             else:
                 v = 1 if val else 0
-            self.emit(f"PUSHI {v}")
+            self.emit(Op.PUSHI, v)
         elif t == 'char':
             # Usa o código ASCII do carácter
-            self.emit(f"PUSHI {ord(val)}")
+            self.emit(Op.PUSHI, ord(val))
+        elif val in self.strings_escolhidas:
+            # Literal de texto partilhado: criado uma vez no preâmbulo, lido da frame global
+            self.emit(Op.PUSHG, self.string_global(val))
         else:
             # Literal de texto: duplicar aspas e usar PUSHS
-            s = val.replace('"', '""')
-            self.emit(f'PUSHS "{s}"')
+            self.emit(Op.PUSHS, val)
+
+
+    # Célula da frame global com a string de um literal de texto partilhado; na primeira
+    # utilização, reserva a célula e cria a string no preâmbulo
+    def string_global(self, texto):
+        if texto not in self.tabela_strings:
+            off = self.tabela_strings[texto] = self.globais.reservar()
+            self.emit(Op.PUSHS, texto, bloco=self.preambulo)
+            self.emit(Op.STOREG, off, bloco=self.preambulo)
+            self.stats.setdefault('strings', {'literais': 0, 'ocorrencias': 0})['literais'] += 1
+        self.stats['strings']['ocorrencias'] += 1
+        return self.tabela_strings[texto]
 
 
     # Gera o código para variáveis (push do valor armazenado)
     def gen_var(self, node):
         _, name = node
-        kind, *info = self.symtab.get(name, (None,))
-        if kind == 'global':
-            self.emit(f"PUSHG {info[0]}")
-        elif kind == 'const':
-            # Se for umaconstante nomeada, avalia a expressão constante
+        kind, *info = self.simbolo(name)
+        if kind == 'const':
+            # Se for uma constante nomeada, avalia a expressão constante
             self.gen(info[0])
-        elif kind == 'local':
-            self.emit(f"PUSHL {info[0]}")
-        else:
-            raise Exception(f"Variável ou uso incorreto: {name}")
+            return
+        if kind is None and name.lower() in self.subroutines and self.campo_com(name) is None:
+            # Chamada de uma function sem argumentos
+            self.gen_call(('call', name, []))
+            return
+        self.emit_valor(self.localizar(node))
 
 
     # Gera o código para indexação de array: arr[idx]
     def gen_array(self, node):
-        _, base, idxs = node
-        _, name = base
-        _, off, low, size, *_ = self.symtab[name]
-        # Empilha endereço base
-        self.emit(f"PUSHG {off}")
-        # Gera o código para o índice
-        self.gen(idxs)
-        if low != 0:
-            # Ajusta pelo limite inferior
-            self.emit(f"PUSHI {low}")
-            self.emit("SUB")
-        # Verifica o índice (CHECK 0, size-1)
-        self.emit_check(size)
-        # Carrega o valor do array: LOADN
-        self.emit("LOADN")
+        self.emit_valor(self.localizar(node))
+
+
+    # Gera o código para acesso a um campo de record: rec.campo (deslocamento constante)
+    def gen_field(self, node):
+        self.emit_valor(self.localizar(node))
 
 
     # Gera o código para atribuição: lhs := expr
     def gen_assign(self, node):
         _, lhs, expr = node
-        # Se for uma atribuição ao nome de função (retorno), gera apenas a expressão
-        if lhs[0] == 'var' and lhs[1].lower() in self.subroutines and self.subroutines[lhs[1].lower()][1] == len(self.symtab):
-            self.gen(expr)
+        # Variável simples (ou o nome da function, que dá a célula do resultado), elemento de array ('array', base, idx_expr) ou campo ('field', base, nome) := expr
+        if lhs[0] not in ('var', 'array', 'field'):
+            raise Exception(f"Atribuição inválida: {lhs}")
+        if self.e_chamada_cauda(node):
+            # 'f := f(...)' no fim da function: o resultado da chamada é o desta
+            self.gen_chamada_cauda(expr[1], expr[2])
             return
-
-        # Caso seja um array ('array', ('var', name), idx_expr) := expr
-        if lhs[0] == 'array':
-            _, base, idxs = lhs
-            _, name = base
-            entry = self.symtab[name]
-            off    = entry[1]
-            low    = entry[2]
-            size   = entry[3]
-
-            # Empilha o endereço base
-            self.emit(f"PUSHG {off}")
-            # Gera o código do índice
-            self.gen(idxs)
-            if low != 0:
-                self.emit(f"PUSHI {low}")
-                self.emit("SUB")
-            # CHECK de índice
-            self.emit_check(size)
-            # Gera o código da expressão e armazena no array
-            self.gen(expr)
-            self.emit("STOREN")
-        else:  # Caso seja uma variável simples
-            _, name = lhs
-            kind, *info = self.symtab.get(name, (None,))
-            if kind == 'local' and name in self.subroutines:
-                # Atribuição ao nome da função define o valor de retorno
-                self.gen(expr)
-            elif kind == 'global':
-                self.gen(expr)
-                self.emit(f"STOREG {info[0]}")
-            elif kind == 'local':
-                self.gen(expr)
-                self.emit(f"STOREL {info[0]}")
-            else:
-                raise Exception(f"Atribuição inválida: {name}")
+        loc = self.localizar(lhs)
+        if isinstance(loc.tp, TipoConjunto):
+            # Conjuntos são atribuídos palavra a palavra (a palavra i do resultado só depende
+            # das palavras i dos operandos, por isso 's := s + [x]' é seguro)
+            for i in range(loc.tp.palavras):
+                self.emit_store(loc.palavra(i), lambda: self.emit_palavra(expr, i, loc.tp))
+            return
+        self.emit_store(loc, lambda: self.gen(expr))
+
+
+    # Gera o código para a instrução with: os campos dos records indicados ficam acessíveis
+    # pelo nome, através do índice de campos de cada record (deslocamentos constantes)
+    def gen_with(self, node):
+        _, var_list, stmt = node
+        n = len(self.com)
+        temporarios = []
+        for var_node in var_list:
+            loc = self.localizar(var_node)
+            if not isinstance(loc.tp, TipoRegisto):
+                raise Exception(f"WITH requer um record: {var_node}")
+            if loc.terms:
+                # Índices variáveis (ex: with v[i] do): o endereço do record é calculado uma
+                # única vez e guardado numa célula temporária da frame atual
+                tmp = self.temporario()
+                self.emit_store(tmp, lambda: self.emit_endereco(loc))
+                temporarios.append(tmp)
+                loc = Loc(tmp, 0, loc.tp)
+            self.com.append(loc)
+        self.gen(stmt)
+        del self.com[n:]
+        for tmp in temporarios:
+            self.libertar(tmp)
 
 
     # Gera o código para operações binárias lógicas/aritméticas
     def gen_binop(self, node):
         _, op, l, r = node
+        # Produto da variável de um ciclo for por uma constante, mantido numa variável de
+        # indução auxiliar (ver planear_inducao)
+        if op == '*' and self.inducao:
+            for x, y in ((l, r), (r, l)):
+                if y[0] == 'const' and y[1].lower() == 'integer':
+                    auxiliar = self.forma_inducao(x, 0, y[2])
+                    if auxiliar is not None:
+                        self.emit_load(auxiliar)
+                        return
+        # Pertença a um conjunto e operações entre conjuntos
+        if op.lower() == 'in':
+            self.gen_pertence(l, r)
+            return
+        if self.e_conjunto(l) or self.e_conjunto(r):
+            self.gen_binop_conjuntos(node)
+            return
+
         # Caso especial: '<>' é implementado como NOT(EQUAL)
         if op == '<>':
             self.gen(l)
             self.gen(r)
-            self.emit('EQUAL')
-            self.emit('NOT')
+            self.emit(Op.EQUAL)
+            self.emit(Op.NOT)
             return
 
         # Caso geral: gera código recursivamente para operandos
@@ -423,17 +1303,17 @@ class CodeGenerator:
         self.gen(r)
         # Mapas de operadores para instruções da VM
         int_ops = {
-            '+': 'ADD', '-': 'SUB', '*': 'MUL', '/': 'DIV',
-            'div': 'DIV', 'mod': 'MOD',
-            '=': 'EQUAL', '<': 'INF', '<=': 'INFEQ',
-            '>': 'SUP', '>=': 'SUPEQ'
+            '+': Op.ADD, '-': Op.SUB, '*': Op.MUL, '/': Op.DIV,
+            'div': Op.DIV, 'mod': Op.MOD,
+            '=': Op.EQUAL, '<': Op.INF, '<=': Op.INFEQ,
+            '>': Op.SUP, '>=': Op.SUPEQ
         }
         float_ops = {
-            '+': 'FADD', '-': 'FSUB', '*': 'FMUL', '/': 'FDIV',
-            '<': 'FINF', '<=': 'FINFEQ',
-            '>': 'FSUP', '>=': 'FSUPEQ'
+            '+': Op.FADD, '-': Op.FSUB, '*': Op.FMUL, '/': Op.FDIV,
+            '<': Op.FINF, '<=': Op.FINFEQ,
+            '>': Op.FSUP, '>=': Op.FSUPEQ
         }
-        bool_ops = {'and': 'AND', 'or': 'OR', '=': 'EQUAL', '<>': 'NE'}
+        bool_ops = {'and': Op.AND, 'or': Op.OR, '=': Op.EQUAL}
         key = op.lower()
 
         # Se algum operando for literal real, usa mapeamento float
@@ -451,7 +1331,7 @@ class CodeGenerator:
         elif key in int_ops:
             instr = int_ops[key]
         else:
-            raise NotImplementedError(f"Operador não suportado: {op}")
+            raise ErroCompilacao(f"Operador não suportado: {op}")
 
         self.emit(instr)
 
@@ -460,7 +1340,451 @@ class CodeGenerator:
     def gen_not(self, node):
         _, expr = node
         self.gen(expr)
-        self.emit('NOT')
+        self.emit(Op.NOT)
+
+
+    # Célula para um valor temporário na frame atual (global no programa principal, local
+    # numa sub-rotina); as células libertadas são reutilizadas pelos temporários seguintes
+    def temporario(self):
+        return Loc(self.base_frame, self.frame.temporario(), 'integer')
+
+
+    def libertar(self, tmp):
+        self.frame.libertar(tmp.offset)
+
+
+    # Gera o código para um valor temporário: ('temp', localização)
+    def gen_temp(self, node):
+        self.emit_load(node[1])
+
+
+    # Devolve um nó equivalente a 'node' que pode ser avaliado várias vezes sem custo nem
+    # efeitos repetidos: variáveis e constantes ficam como estão; outras expressões são
+    # calculadas uma vez para uma célula temporária (devolvida para ser libertada)
+    def operando_simples(self, node):
+        if node[0] in ('var', 'const', 'temp'):
+            return node, None
+        tmp = self.temporario()
+        self.emit_store(tmp, lambda: self.gen(node))
+        return ('temp', tmp), tmp
+
+
+    # Verifica se uma expressão é um conjunto (literal, variável ou operação entre conjuntos)
+    def e_conjunto(self, node):
+        if node[0] == 'set_lit':
+            return True
+        if node[0] == 'binop' and node[1] in ('+', '-', '*'):
+            return self.e_conjunto(node[2]) or self.e_conjunto(node[3])
+        return isinstance(self.tipo_expr(node), TipoConjunto)
+
+
+    # Tipo de conjunto de uma expressão, obtido a partir das variáveis que nela aparecem
+    # (None se só tiver conjuntos literais)
+    def tipo_conjunto(self, node):
+        if node[0] == 'set_lit':
+            return None
+        if node[0] == 'binop':
+            return self.tipo_conjunto(node[2]) or self.tipo_conjunto(node[3])
+        tp = self.tipo_expr(node)
+        return tp if isinstance(tp, TipoConjunto) else None
+
+
+    # Localização da tabela de potências de 2 (2^0 .. 2^(BITS_PALAVRA-1)), indexada a partir
+    # de 'low'. A tabela é reservada na frame global e preenchida no preâmbulo apenas quando
+    # é usada pela primeira vez.
+    def potencias(self, low=0):
+        if self.tabela_potencias is None:
+            self.tabela_potencias = self.globais.reservar(BITS_PALAVRA)
+            for k in range(BITS_PALAVRA):
+                self.emit(Op.PUSHI, 1 << k, bloco=self.preambulo)
+                self.emit(Op.STOREG, self.tabela_potencias + k, bloco=self.preambulo)
+        return Loc('G', self.tabela_potencias, TipoArray(low, low + BITS_PALAVRA - 1, 'integer'))
+
+
+    # Separa os elementos de um conjunto literal em intervalos constantes (já juntos e
+    # ordenados) e elementos/intervalos só conhecidos em tempo de execução
+    def elementos_literal(self, elems):
+        consts, variaveis = [], []
+        for el in elems:
+            if el[0] == 'range':
+                lo, hi = self.valor_constante(el[1]), self.valor_constante(el[2])
+            else:
+                lo = hi = self.valor_constante(el)
+            if lo is None or hi is None:
+                variaveis.append(el)
+            else:
+                consts.append((lo, hi))
+        return juntar_intervalos(consts), variaveis
+
+
+    # Máscara da palavra 'i' de um conjunto conhecido em tempo de compilação, ou None
+    def mascara_constante(self, e, i, tp):
+        if e[0] == 'set_lit':
+            consts, variaveis = self.elementos_literal(e[1])
+            return None if variaveis else tp.mascara(consts, i)
+        if e[0] == 'binop' and e[1] in ('+', '-', '*'):
+            a = self.mascara_constante(e[2], i, tp)
+            b = self.mascara_constante(e[3], i, tp)
+            if a is None or b is None:
+                return None
+            if e[1] == '+':
+                return a | b
+            if e[1] == '*':
+                return a & b
+            return a & ~b
+        return None
+
+
+    # Empilha a palavra 'i' do conjunto dado pela expressão 'e', do tipo 'tp'
+    def emit_palavra(self, e, i, tp):
+        m = self.mascara_constante(e, i, tp)
+        if m is not None:
+            self.emit(Op.PUSHI, m)
+            return
+        if e[0] == 'set_lit':
+            self.emit_palavra_literal(e[1], i, tp)
+            return
+        if e[0] == 'binop' and e[1] in ('+', '-', '*'):
+            self.emit_palavra_binop(e, i, tp)
+            return
+        loc = self.localizar(e)
+        if not isinstance(loc.tp, TipoConjunto) or (loc.tp.low, loc.tp.palavras) != (tp.low, tp.palavras):
+            raise Exception(f"Conjuntos de tipos incompatíveis: {loc.tp!r} e {tp!r}")
+        self.emit_load(loc.palavra(i))
+
+
+    # Palavra 'i' de um conjunto literal com elementos variáveis: máscara dos elementos
+    # constantes reunida com o bit de cada elemento variável
+    def emit_palavra_literal(self, elems, i, tp):
+        consts, variaveis = self.elementos_literal(elems)
+        m = tp.mascara(consts, i)
+        if m or not variaveis:
+            self.emit(Op.PUSHI, m)
+        for k, el in enumerate(variaveis):
+            if el[0] == 'range':
+                raise Exception("Intervalos com limites variáveis só são suportados com o operador 'in'")
+            self.emit_singular(el, i, tp)
+            if m or k:
+                self.emit_ou()
+
+
+    # Palavra 'i' do conjunto [el], com 'el' conhecido só em tempo de execução
+    def emit_singular(self, el, i, tp):
+        if tp.palavras == 1:
+            # 2^(el - low), com CHECK do índice na tabela de potências
+            self.emit_load(self.potencias(tp.low).indexar(el))
+            return
+        r = el if tp.low == 0 else ('binop', '-', el, ('const', 'integer', tp.low))
+        palavra = ('binop', 'div', r, ('const', 'integer', BITS_PALAVRA))
+        bit = ('binop', 'mod', r, ('const', 'integer', BITS_PALAVRA))
+        # (r div BITS = i) * 2^(r mod BITS)
+        self.gen(palavra)
+        self.emit(Op.PUSHI, i)
+        self.emit(Op.EQUAL)
+        self.emit_load(self.potencias().indexar(bit))
+        self.emit(Op.MUL)
+
+
+    # Palavra 'i' de uma união (+), interseção (*) ou diferença (-) de conjuntos. Quando um
+    # dos operandos é constante, os casos vazio, cheio e com um único bit não precisam de
+    # chamar a sub-rotina auxiliar de interseção.
+    def emit_palavra_binop(self, e, i, tp):
+        _, op, a, b = e
+        ma = self.mascara_constante(a, i, tp)
+        mb = self.mascara_constante(b, i, tp)
+        cheia = tp.cheia(i)
+        if op in ('+', '*') and mb is None and ma is not None:
+            # Operação comutativa: deixa o operando constante à direita
+            a, b, ma, mb = b, a, mb, ma
+        um_bit = mb is not None and mb & (mb - 1) == 0
+        if op == '+':
+            if mb == cheia:
+                self.emit(Op.PUSHI, cheia)
+                return
+            self.emit_palavra(a, i, tp)
+            if mb == 0:
+                return
+            if um_bit:
+                self.emit_ou_bit(mb)
+            else:
+                self.emit_palavra(b, i, tp)
+                self.emit_ou()
+        elif op == '*':
+            if mb == 0:
+                self.emit(Op.PUSHI, 0)
+                return
+            self.emit_palavra(a, i, tp)
+            if mb == cheia:
+                return
+            if um_bit:
+                self.emit_e_bit(mb)
+            else:
+                self.emit_palavra(b, i, tp)
+                self.emit_e()
+        else:
+            # a - b = a - (a * b)
+            if mb == cheia:
+                self.emit(Op.PUSHI, 0)
+                return
+            self.emit_palavra(a, i, tp)
+            if mb == 0:
+                return
+            self.emit(Op.DUP, 1)
+            if um_bit:
+                self.emit_e_bit(mb)
+            else:
+                self.emit_palavra(b, i, tp)
+                self.emit_e()
+            self.emit(Op.SUB)
+
+
+    # Interseção da palavra no topo da pilha com a máscara de um só bit 'p': (w div p mod 2) * p
+    def emit_e_bit(self, p):
+        self.emit(Op.PUSHI, p)
+        self.emit(Op.DIV)
+        self.emit(Op.PUSHI, 2)
+        self.emit(Op.MOD)
+        self.emit(Op.PUSHI, p)
+        self.emit(Op.MUL)
+
+
+    # União da palavra no topo da pilha com a máscara de um só bit 'p': w + p * (1 - bit)
+    def emit_ou_bit(self, p):
+        self.emit(Op.DUP, 1)
+        self.emit(Op.PUSHI, p)
+        self.emit(Op.DIV)
+        self.emit(Op.PUSHI, 2)
+        self.emit(Op.MOD)
+        self.emit(Op.PUSHI, 1)
+        self.emit(Op.SWAP)
+        self.emit(Op.SUB)
+        self.emit(Op.PUSHI, p)
+        self.emit(Op.MUL)
+        self.emit(Op.ADD)
+
+
+    # Interseção das duas palavras no topo da pilha (a EWVM não tem operações bit a bit):
+    # chama a sub-rotina auxiliar, que deixa o resultado no lugar do primeiro operando
+    def emit_e(self):
+        self.auxiliares.add(ETQ_CONJ_AND)
+        self.emit(Op.PUSHA, ETQ_CONJ_AND)
+        self.emit(Op.CALL)
+        self.emit(Op.POP, 1)
+
+
+    # União das duas palavras no topo da pilha: a + b - (a * b)
+    def emit_ou(self):
+        self.emit(Op.DUP, 2)
+        self.emit_e()
+        self.emit(Op.SUB)
+        self.emit(Op.ADD)
+
+
+    # Sub-rotina auxiliar de interseção: recebe as palavras em fp[-2] e fp[-1] e percorre os
+    # bits enquanto ambas forem diferentes de 0; devolve o resultado em fp[-2]
+    def gen_conj_and(self):
+        fim = f"{ETQ_CONJ_AND}FIM"
+        ciclo = f"{ETQ_CONJ_AND}CICLO"
+        self.label(ETQ_CONJ_AND)
+        self.emit(Op.PUSHI, 0)  # fp[0]: resultado
+        self.emit(Op.PUSHI, 1)  # fp[1]: peso do bit atual
+        self.label(ciclo)
+        for arg in (-2, -1):
+            self.emit(Op.PUSHL, arg)
+            self.emit(Op.PUSHI, 0)
+            self.emit(Op.SUP)
+        self.emit(Op.AND)
+        self.emit(Op.JZ, fim)
+        # resultado += peso * (a mod 2) * (b mod 2)
+        for arg in (-2, -1):
+            self.emit(Op.PUSHL, arg)
+            self.emit(Op.PUSHI, 2)
+            self.emit(Op.MOD)
+        self.emit(Op.MUL)
+        self.emit(Op.PUSHL, 1)
+        self.emit(Op.MUL)
+        self.emit(Op.PUSHL, 0)
+        self.emit(Op.ADD)
+        self.emit(Op.STOREL, 0)
+        # a := a div 2; b := b div 2; peso := peso * 2
+        for arg in (-2, -1):
+            self.emit(Op.PUSHL, arg)
+            self.emit(Op.PUSHI, 2)
+            self.emit(Op.DIV)
+            self.emit(Op.STOREL, arg)
+        self.emit(Op.PUSHL, 1)
+        self.emit(Op.PUSHI, 2)
+        self.emit(Op.MUL)
+        self.emit(Op.STOREL, 1)
+        self.emit(Op.JUMP, ciclo)
+        self.label(fim)
+        self.emit(Op.PUSHL, 0)
+        self.emit(Op.STOREL, -2)
+        self.emit(Op.RETURN)
+
+
+    # Gera o código para comparações (=, <>, <=, >=) e operações (+, -, *) entre conjuntos
+    def gen_binop_conjuntos(self, node):
+        _, op, l, r = node
+        # Só com literais, usa-se o tipo 'set of integer' (0..255)
+        tp = self.tipo_conjunto(node) or TipoConjunto(0, 255)
+        if op in ('+', '-', '*'):
+            # Um conjunto como valor na pilha ocupa uma única palavra
+            if tp.palavras != 1:
+                raise Exception(f"Conjunto com mais de {BITS_PALAVRA} elementos usado fora de uma atribuição")
+            self.emit_palavra(node, 0, tp)
+            return
+        for i in range(tp.palavras):
+            if op in ('=', '<>'):
+                self.emit_palavra(l, i, tp)
+                self.emit_palavra(r, i, tp)
+                self.emit(Op.EQUAL)
+            elif op in ('<=', '>='):
+                # a <= b (subconjunto) se a - b for vazio
+                a, b = (l, r) if op == '<=' else (r, l)
+                self.emit_palavra(('binop', '-', a, b), i, tp)
+                self.emit(Op.PUSHI, 0)
+                self.emit(Op.EQUAL)
+            else:
+                raise ErroCompilacao(f"Operador não suportado para conjuntos: {op}")
+            if i:
+                self.emit(Op.AND)
+        if op == '<>':
+            self.emit(Op.NOT)
+
+
+    # Gera o código para um conjunto literal usado como valor (fora de uma atribuição):
+    # uma palavra com os elementos 0..BITS_PALAVRA-1
+    def gen_set_lit(self, node):
+        self.emit_palavra(node, 0, TipoConjunto(0, BITS_PALAVRA - 1))
+
+
+    # Gera o código para 'x in s'
+    def gen_pertence(self, x, s):
+        if s[0] == 'set_lit':
+            self.gen_pertence_literal(x, s[1])
+            return
+        tp = self.tipo_conjunto(s)
+        if tp is None:
+            raise Exception(f"Operador 'in' requer um conjunto: {s}")
+        v = self.valor_constante(x)
+        if v is not None:
+            # Elemento constante: palavra e bit conhecidos em tempo de compilação
+            if not tp.low <= v <= tp.high:
+                self.emit(Op.PUSHI, 0)
+                return
+            i, bit = tp.posicao(v)
+            self.emit_palavra(s, i, tp)
+            self.emit(Op.PUSHI, 1 << bit)
+            self.emit(Op.DIV)
+            self.emit(Op.PUSHI, 2)
+            self.emit(Op.MOD)
+            return
+        # Só é preciso verificar os limites se o tipo de x não couber no tipo base do conjunto
+        lim = limites(self.tipo_expr(x))
+        guarda = lim is None or lim[0] < tp.low or lim[1] > tp.high
+        x, tmp = self.operando_simples(x)
+        if guarda:
+            i = self.label_counter
+            self.label_counter += 1
+            lbl_fora = f"L{i}NOTIN"
+            lbl_fim = f"L{i}ENDIN"
+            self.gen(x)
+            self.emit(Op.PUSHI, tp.low)
+            self.emit(Op.SUPEQ)
+            self.gen(x)
+            self.emit(Op.PUSHI, tp.high)
+            self.emit(Op.INFEQ)
+            self.emit(Op.AND)
+            self.emit(Op.JZ, lbl_fora)
+        self.emit_teste_bit(x, s, tp)
+        if guarda:
+            self.emit(Op.JUMP, lbl_fim)
+            self.label(lbl_fora)
+            self.emit(Op.PUSHI, 0)
+            self.label(lbl_fim)
+        if tmp is not None:
+            self.libertar(tmp)
+
+
+    # Empilha o bit do elemento x (dentro dos limites) do conjunto s: (palavra div 2^bit) mod 2
+    def emit_teste_bit(self, x, s, tp):
+        if tp.palavras == 1:
+            self.emit_palavra(s, 0, tp)
+            self.emit_load(self.potencias(tp.low).indexar(x))
+        else:
+            if s[0] in ('var', 'array', 'field'):
+                loc = self.localizar(s)
+            else:
+                # Resultado de uma operação entre conjuntos: calculado para células da frame atual
+                loc = Loc(self.base_frame, self.frame.reservar(tp.palavras), tp)
+                for i in range(tp.palavras):
+                    self.emit_store(loc.palavra(i), lambda: self.emit_palavra(s, i, tp))
+            r = x if tp.low == 0 else ('binop', '-', x, ('const', 'integer', tp.low))
+            palavras = Loc(loc.base, loc.offset, TipoArray(0, tp.palavras - 1, 'integer'), loc.terms)
+            self.emit_load(palavras.indexar(('binop', 'div', r, ('const', 'integer', BITS_PALAVRA))))
+            self.emit_load(self.potencias().indexar(('binop', 'mod', r, ('const', 'integer', BITS_PALAVRA))))
+        self.emit(Op.DIV)
+        self.emit(Op.PUSHI, 2)
+        self.emit(Op.MOD)
+
+
+    # Gera o código para 'x in [c1, c2, lo..hi, ...]': comparações com os intervalos do
+    # literal, sem construir o conjunto
+    def gen_pertence_literal(self, x, elems):
+        consts, variaveis = self.elementos_literal(elems)
+        if not consts and not variaveis:
+            self.emit(Op.PUSHI, 0)
+            return
+        lim = limites(self.tipo_expr(x))
+        x, tmp = self.operando_simples(x)
+        n = 0
+        for lo, hi in consts:
+            self.emit_no_intervalo(x, lo, hi, lim)
+            if n:
+                self.emit(Op.OR)
+            n += 1
+        for el in variaveis:
+            if el[0] == 'range':
+                self.gen(x)
+                self.gen(el[1])
+                self.emit(Op.SUPEQ)
+                self.gen(x)
+                self.gen(el[2])
+                self.emit(Op.INFEQ)
+                self.emit(Op.AND)
+            else:
+                self.gen(x)
+                self.gen(el)
+                self.emit(Op.EQUAL)
+            if n:
+                self.emit(Op.OR)
+            n += 1
+        if tmp is not None:
+            self.libertar(tmp)
+
+
+    # Empilha lo <= x <= hi, omitindo as comparações garantidas pelos limites 'lim' do tipo de x
+    def emit_no_intervalo(self, x, lo, hi, lim):
+        if lo == hi:
+            self.gen(x)
+            self.emit(Op.PUSHI, lo)
+            self.emit(Op.EQUAL)
+            return
+        testa_lo = lim is None or lo > lim[0]
+        testa_hi = lim is None or hi < lim[1]
+        if testa_lo:
+            self.gen(x)
+            self.emit(Op.PUSHI, lo)
+            self.emit(Op.SUPEQ)
+        if testa_hi:
+            self.gen(x)
+            self.emit(Op.PUSHI, hi)
+            self.emit(Op.INFEQ)
+            if testa_lo:
+                self.emit(Op.AND)
+        if not testa_lo and not testa_hi:
+            self.emit(Op.PUSHI, 1)
 
 
     # Gera o código para instrução if-then-else
@@ -473,16 +1797,158 @@ class CodeGenerator:
 
         # Gera a condição e, se zero, salta para lbl_else
         self.gen(cond)
-        self.emit(f"JZ {lbl_else}")
+        self.emit(Op.JZ, lbl_else)
         # Bloco then
         self.gen(then_block)
-        self.emit(f"JUMP {lbl_end}")
+        self.emit(Op.JUMP, lbl_end)
         # Else
-        self.emit(f"{lbl_else}:")
+        self.label(lbl_else)
         if else_block:
             self.gen(else_block)
         # End-if
-        self.emit(f"{lbl_end}:")
+        self.label(lbl_end)
+
+
+    # Gera o código para a instrução case. O seletor é avaliado uma só vez e o ramo é
+    # escolhido por uma cadeia de comparações, uma tabela de saltos ou uma árvore de decisão
+    # binária, conforme estrategia_case. Se nenhuma etiqueta corresponder ao valor do
+    # seletor, nenhum ramo é executado.
+    def gen_case(self, node):
+        _, expr, items = node
+        i = self.label_counter
+        self.label_counter += 1
+        lbl_end = f"L{i}ENDCASE"
+        # Valor ordinal de cada etiqueta -> índice do ramo
+        valores = {}
+        for k, (const_list, _) in enumerate(items):
+            for c in const_list:
+                v = self.ordinal(c)
+                if v in valores:
+                    raise Exception(f"Etiqueta de CASE repetida: {v}")
+                valores[v] = k
+        ramos = [(f"L{i}CASE{k}", stmts) for k, (_, stmts) in enumerate(items)]
+
+        estrategia = estrategia_case(list(valores), self.opcoes)
+        if estrategia == 'tabela' and self.inline_expressao and self.base_frame == 'L':
+            # Os ramos da tabela contam com a pilha vazia acima da frame, o que não acontece
+            # a meio de uma expressão (corpo de uma function expandida em linha)
+            estrategia = 'binaria'
+        if estrategia == 'tabela' and any(n[0] in ('goto', 'label_stmt')
+                                          for _, stmts in ramos for n in percorrer(('compound', stmts))):
+            # Os ramos da tabela são executados com um CALL, por isso um goto não pode sair deles
+            estrategia = 'binaria'
+        contagem = self.stats.setdefault('case', {})
+        contagem[estrategia] = contagem.get(estrategia, 0) + 1
+
+        lim = limites(self.tipo_expr(expr))
+        x, tmp = self.operando_simples(expr)
+        if estrategia == 'linear':
+            self.gen_case_linear(x, valores, ramos, lim, lbl_end)
+        elif estrategia == 'tabela':
+            self.gen_case_tabela(x, valores, ramos, lim, lbl_end)
+        else:
+            if lim is None:
+                lim = (float('-inf'), float('inf'))
+            self.emit_arvore_case(x, intervalos_case(valores), lim, ramos, lbl_end)
+            for lbl, stmts in ramos:
+                self.label(lbl)
+                self.gen_compound(('compound', stmts))
+                self.emit(Op.JUMP, lbl_end)
+        self.label(lbl_end)
+        if tmp is not None:
+            self.libertar(tmp)
+
+
+    # Cadeia de comparações: cada ramo testa os seus intervalos de valores e, se nenhum
+    # corresponder, salta para o teste do ramo seguinte
+    def gen_case_linear(self, x, valores, ramos, lim, lbl_end):
+        intervalos = intervalos_case(valores)
+        for k, (lbl, stmts) in enumerate(ramos):
+            proprios = [(lo, hi) for lo, hi, ramo in intervalos if ramo == k]
+            for n, (lo, hi) in enumerate(proprios):
+                self.emit_no_intervalo(x, lo, hi, lim)
+                if n:
+                    self.emit(Op.OR)
+            lbl_prox = f"{lbl}NAO"
+            self.emit(Op.JZ, lbl_prox)
+            self.gen_compound(('compound', stmts))
+            self.emit(Op.JUMP, lbl_end)
+            self.label(lbl_prox)
+
+
+    # Árvore de decisão binária sobre os intervalos [(lo, hi, ramo), ...]: cada nível compara
+    # o seletor com o início do intervalo do meio, e as folhas só testam os limites que não
+    # são garantidos pelo caminho percorrido ('lim')
+    def emit_arvore_case(self, x, intervalos, lim, ramos, lbl_fora):
+        if len(intervalos) == 1:
+            lo, hi, k = intervalos[0]
+            if lo > lim[0] or hi < lim[1]:
+                self.emit_no_intervalo(x, lo, hi, lim)
+                self.emit(Op.JZ, lbl_fora)
+            self.emit(Op.JUMP, ramos[k][0])
+            return
+        m = len(intervalos) // 2
+        meio = intervalos[m][0]
+        i = self.label_counter
+        self.label_counter += 1
+        lbl_dir = f"L{i}CASEDIR"
+        self.gen(x)
+        self.emit(Op.PUSHI, meio)
+        self.emit(Op.INF)
+        self.emit(Op.JZ, lbl_dir)
+        self.emit_arvore_case(x, intervalos[:m], (lim[0], meio - 1), ramos, lbl_fora)
+        self.label(lbl_dir)
+        self.emit_arvore_case(x, intervalos[m:], (meio, lim[1]), ramos, lbl_fora)
+
+
+    # Tabela de saltos: células da frame global preenchidas no preâmbulo com o endereço do
+    # ramo de cada valor. O único salto indireto da EWVM é o CALL, por isso cada ramo termina
+    # com RETURN e a execução continua a seguir ao CALL. O custo da seleção é o mesmo para
+    # todos os valores.
+    def gen_case_tabela(self, x, valores, ramos, lim, lbl_end):
+        lo, hi = min(valores), max(valores)
+        # Se a tabela para todos os valores do tipo do seletor for também densa, cobre o
+        # tipo todo e dispensa a verificação de limites
+        guarda = True
+        if lim is not None and len(valores) / (lim[1] - lim[0] + 1) >= self.opcoes['case_densidade_tabela']:
+            lo, hi = lim
+            guarda = False
+        lbl_outro = f"{lbl_end}OUTRO"
+        tabela = self.globais.reservar(hi - lo + 1)
+        for v in range(lo, hi + 1):
+            k = valores.get(v)
+            self.emit(Op.PUSHA, lbl_outro if k is None else ramos[k][0], bloco=self.preambulo)
+            self.emit(Op.STOREG, tabela + v - lo, bloco=self.preambulo)
+
+        if guarda:
+            self.emit_no_intervalo(x, lo, hi, lim)
+            self.emit(Op.JZ, lbl_end)
+        self.emit(Op.PUSHGP)
+        self.gen(x)
+        if not guarda:
+            # Um valor fora do tipo (ex: carácter lido com código > 255) dá um erro na
+            # execução em vez de um acesso fora da tabela
+            self.emit(Op.CHECK, (lo, hi))
+        desloc = tabela - lo
+        if desloc > 0:
+            self.emit(Op.PUSHI, desloc)
+            self.emit(Op.ADD)
+        elif desloc < 0:
+            self.emit(Op.PUSHI, -desloc)
+            self.emit(Op.SUB)
+        self.emit(Op.LOADN)
+        self.emit(Op.CALL)
+        self.emit(Op.JUMP, lbl_end)
+
+        self.ramos_tabela += 1
+        for lbl, stmts in ramos:
+            self.label(lbl)
+            self.gen_compound(('compound', stmts))
+            self.emit(Op.RETURN)
+        self.ramos_tabela -= 1
+        if len(valores) < hi - lo + 1:
+            self.label(lbl_outro)
+            self.emit(Op.RETURN)
 
 
     # Gera o código para ciclo while
@@ -493,25 +1959,69 @@ class CodeGenerator:
         lbl_start = f"L{i}WHILE"
         lbl_end = f"L{i}ENDWHILE"
 
-        self.emit(f"{lbl_start}:")
-        # Se a condição for falsa (0), salta para lbl_end
+        # Ciclo rodado: a condição é testada uma vez antes de entrar e depois no fim de
+        # cada iteração, com um único salto condicional para o início do corpo
         self.gen(cond)
-        self.emit(f"JZ {lbl_end}")
+        self.emit(Op.JZ, lbl_end)
+        self.label(lbl_start)
         # Corpo do while
         self.gen(body)
-        # Loop de regresso ao início
-        self.emit(f"JUMP {lbl_start}")
-        self.emit(f"{lbl_end}:")
+        # Regressa ao início enquanto a condição for verdadeira (a negação é falsa)
+        self.gen_condicao_negada(cond)
+        self.emit(Op.JZ, lbl_start)
+        self.label(lbl_end)
+
+
+    # Gera o código para ciclo repeat: ('repeat', instruções, condição). O corpo é executado
+    # pelo menos uma vez e a condição de saída é testada no fim de cada iteração.
+    def gen_repeat(self, node):
+        _, stmts, cond = node
+        i = self.label_counter
+        self.label_counter += 1
+        lbl_start = f"L{i}REPEAT"
+
+        self.label(lbl_start)
+        for stmt in stmts:
+            if stmt:
+                self.gen(stmt)
+        # Regressa ao início enquanto a condição de saída for falsa
+        self.gen(cond)
+        self.emit(Op.JZ, lbl_start)
+
+
+    # Empilha a negação de uma condição. As comparações são invertidas (ex: '<' passa a
+    # '>=') e 'not c' passa a 'c', para não ser preciso um NOT; nos outros casos (e nas
+    # comparações de conjuntos), a condição é seguida de NOT.
+    def gen_condicao_negada(self, cond):
+        inversas = {'<': '>=', '>=': '<', '>': '<=', '<=': '>', '<>': '='}
+        if cond[0] == 'not':
+            self.gen(cond[1])
+        elif cond[0] == 'binop' and cond[1] in inversas \
+                and not (self.e_conjunto(cond[2]) or self.e_conjunto(cond[3])):
+            self.gen(('binop', inversas[cond[1]], cond[2], cond[3]))
+        else:
+            self.gen(cond)
+            self.emit(Op.NOT)
 
 
     # Gera o código para ciclo for
     def gen_for(self, node):
         _, var_node, start_expr, end_expr, direction, body = node
         # var_node pode ser ('var', nome) ou apenas nome
-        name = var_node[1] if isinstance(var_node, tuple) else var_node
-        kind, off = self.symtab[name][:2]
-        if kind != 'global':
-            raise Exception(f"For inválido: {name}")
+        if not isinstance(var_node, tuple):
+            var_node = ('var', var_node)
+        loc = self.localizar(var_node)
+        if loc.terms or self.e_agregado(loc.tp):
+            raise Exception(f"For inválido: {var_node[1]}")
+
+        if self.opcoes['desenrolar'] and self.desenrolar_for(node, loc):
+            return
+
+        nome = var_node[1].lower()
+        formas, teste, limite = [], None, None
+        if self.opcoes['reducao_inducao']:
+            formas, teste, limite = self.planear_inducao(nome, loc, end_expr, body)
+        passo = 1 if direction == 'to' else -1
 
         i = self.label_counter
         self.label_counter += 1
@@ -519,56 +2029,548 @@ class CodeGenerator:
         lbl_end = f"L{i}ENDFOR"
 
         # Inicializa a variável do for
-        self.gen(start_expr)
-        self.emit(f"STOREG {off}")
+        self.emit_store(loc, lambda: self.gen(start_expr))
 
-        self.emit(f"{lbl_start}:")
-        # Carrega a variável e compara com end_expr
-        self.emit(f"PUSHG {off}")
+        # Ciclo rodado: o limite é testado uma vez antes de entrar e depois no fim de cada
+        # iteração, já com a variável atualizada
+        self.emit_load(loc)
         self.gen(end_expr)
-        self.emit("INFEQ" if direction == 'to' else "SUPEQ")
-        self.emit(f"JZ {lbl_end}")
+        self.emit(Op.INFEQ if direction == 'to' else Op.SUPEQ)
+        self.emit(Op.JZ, lbl_end)
+
+        # Variáveis de indução auxiliares, com o valor inicial (i + a) * m, e limite do
+        # teste quando o ciclo é controlado por uma delas
+        auxiliares = {}
+        for a, m in formas:
+            auxiliares[(a, m)] = self.temporario()
+            self.emit_store(auxiliares[(a, m)], lambda a=a, m=m: self.emit_forma(lambda: self.emit_load(loc), a, m))
+        celula_limite = None
+        if teste and limite is None:
+            celula_limite = self.temporario()
+            self.emit_store(celula_limite, lambda: self.emit_forma(lambda: self.gen(end_expr), *teste))
+        anterior = self.inducao.get(nome)
+        self.inducao[nome] = (loc, auxiliares)
+        self.label(lbl_start)
 
         # Corpo do for
         self.gen(body)
 
-        # Incrementa ou decrementa a variável
-        self.emit(f"PUSHG {off}")
-        self.emit("PUSHI 1")
-        self.emit("ADD" if direction == 'to' else "SUB")
-        self.emit(f"STOREG {off}")
-        # Regressa ao início do loop
-        self.emit(f"JUMP {lbl_start}")
-        self.emit(f"{lbl_end}:")
-
-
-
-# def gen_procedure(self, node):
-#     _, name, params, block = node
-#     label, _ = self.subroutines[name.lower()]
-#     self.emit(f"{label}:")
-#     old_sym = self.symtab.copy()
-#     for idx, param in enumerate(params):
-#         _, ids, _ = param
-#         for id in ids:
-#             self.symtab[id] = ('local', idx)
-#     self.gen(block)
-#     self.emit("RETURN")
-#     self.symtab = old_sym
-
-
-# def gen_function(self, node):
-#     _, name, params, _, block = node
-#     label, _ = self.subroutines[name.lower()]
-#     self.emit(f"{label}:")
-#     nargs = len(params)
-#     old_symtab = self.symtab.copy()
-#     for idx, param in enumerate(params):
-#         _, ids, _ = param
-#         for id in ids:
-#             self.symtab[id] = ('local', idx)
-#     self.symtab[name] = ('local', nargs)
-#     self.gen(block)
-#     self.emit(f"PUSHL {nargs}")
-#     self.emit("RETURN")
-#     self.symtab = old_symtab
\ No newline at end of file
+        if anterior is None:
+            del self.inducao[nome]
+        else:
+            self.inducao[nome] = anterior
+        # Incrementa ou decrementa a variável (exceto se o ciclo for controlado por uma
+        # variável auxiliar) e as variáveis auxiliares
+        if not teste:
+            self.emit_store(loc, lambda: (self.emit_load(loc), self.emit(Op.PUSHI, 1),
+                                          self.emit(Op.ADD if direction == 'to' else Op.SUB)))
+        for (a, m), celula in auxiliares.items():
+            self.emit_store(celula, lambda celula=celula, m=m: (
+                self.emit_load(celula), self.emit(Op.PUSHI, m),
+                self.emit(Op.ADD if direction == 'to' else Op.SUB)))
+        # Regressa ao início enquanto a variável não passar o limite
+        if teste:
+            self.emit_load(auxiliares[teste])
+            if limite is None:
+                self.emit_load(celula_limite)
+            else:
+                self.emit(Op.PUSHI, (limite + teste[0]) * teste[1])
+        else:
+            self.emit_load(loc)
+            self.gen(end_expr)
+        self.emit(Op.SUP if direction == 'to' else Op.INF)
+        self.emit(Op.JZ, lbl_start)
+        if teste:
+            # A variável do ciclo fica com o valor seguinte ao limite, como no ciclo normal
+            if limite is None:
+                self.emit_store(loc, lambda: (self.gen(end_expr), self.emit(Op.PUSHI, 1),
+                                              self.emit(Op.ADD if direction == 'to' else Op.SUB)))
+            else:
+                self.emit_store(loc, lambda: self.emit(Op.PUSHI, limite + passo))
+        self.label(lbl_end)
+        for celula in list(auxiliares.values()) + ([celula_limite] if celula_limite else []):
+            self.libertar(celula)
+
+
+    # Empilha (v + a) * m, sendo v o valor empilhado pela função 'valor'
+    def emit_forma(self, valor, a, m):
+        valor()
+        if a:
+            self.emit(Op.PUSHI, abs(a))
+            self.emit(Op.ADD if a > 0 else Op.SUB)
+        if m != 1:
+            self.emit(Op.PUSHI, m)
+            self.emit(Op.MUL)
+
+
+    # Se 'node' for i, i + c, c + i ou i - c (c constante inteira), sendo i a variável 'nome'
+    # na localização 'loc', devolve c; senão, None
+    def desvio_inducao(self, node, nome, loc):
+        e, c = separar_constante(node)
+        if e[0] == 'var' and isinstance(e[1], str) and e[1].lower() == nome \
+                and self.localizar(e).mesma_celula(loc):
+            return c
+        return None
+
+
+    # Redução de força da variável 'nome' (localização 'loc') de um ciclo for. No corpo,
+    # procura as formas lineares (i + a) * m da variável: o primeiro índice de um acesso a
+    # um array, se for i ± c (a junta c ao ajuste ao limite inferior e m é o stride, ver
+    # emit_deslocamento), e os produtos de i ± c por uma constante inteira. Devolve
+    # (formas, teste, limite):
+    #   formas - formas lineares que passam a variáveis auxiliares, somadas com m em cada
+    #            iteração (4 instruções, contra as 2 ou 4 poupadas em cada uso)
+    #   teste  - forma que também controla o ciclo, quando a variável só é usada nessas
+    #            formas, o corpo não chama sub-rotinas e o limite não muda no ciclo (a
+    #            variável deixa de ser atualizada em cada iteração); ou None
+    #   limite - valor do limite, se for constante (o teste compara com um PUSHI)
+    def planear_inducao(self, nome, loc, end_expr, body):
+        if any(n[0] in ('with', 'goto', 'label_stmt') for n in percorrer(body)) \
+                or nome in variaveis_escritas(body, self.modos_parametros):
+            return [], None, None
+        usos = {}
+        outros = False
+
+        def usar(chave):
+            usos[chave] = usos.get(chave, 0) + 1
+
+        def visitar(n):
+            nonlocal outros
+            tag = n[0]
+            if tag in ('array', 'field'):
+                d = self.localizar(n)
+                for k, (idx, low, _, stride) in enumerate(d.terms):
+                    c = self.desvio_inducao(idx, nome, loc) if k == 0 else None
+                    if c is not None:
+                        usar((self.ajustes_deslocamento(d)[0] + c, stride))
+                    else:
+                        visitar(idx)
+                return
+            if tag == 'var' and isinstance(n[1], str) and n[1].lower() == nome:
+                outros = True
+                return
+            if tag == 'binop' and n[1] == '*':
+                for x, y in ((n[2], n[3]), (n[3], n[2])):
+                    c = self.desvio_inducao(x, nome, loc)
+                    if c is not None and y[0] == 'const' and y[1].lower() == 'integer':
+                        usar((c, y[2]))
+                        return
+            if tag == 'inline':
+                for arg in n[2]:
+                    visitar(arg)
+                return
+            if tag == 'assign' and n[1][0] == 'var':
+                visitar(n[2])
+                return
+            for f in filhos(n):
+                visitar(f)
+
+        # A análise localiza os designadores do corpo (sem gerar código); os acessos ao
+        # display contados por localizar são repostos
+        display = dict(self.stats['display']) if 'display' in self.stats else None
+        try:
+            visitar(body)
+        except Exception:
+            return [], None, None
+        finally:
+            if display is None:
+                self.stats.pop('display', None)
+            else:
+                self.stats['display'] = display
+        if not usos:
+            return [], None, None
+
+        # Instruções poupadas em cada uso de uma forma (a soma de a e o produto por m)
+        def poupanca(chave):
+            a, m = chave
+            return 2 * (a != 0) + 2 * (m != 1)
+
+        # Só com variáveis auxiliares: cada uma custa 4 instruções por iteração
+        formas = [c for c in usos if usos[c] * poupanca(c) > 4]
+        ganho = sum(usos[c] * poupanca(c) - 4 for c in formas)
+        teste = None
+        limite = self.limite_constante(end_expr)
+        invariante = limite is not None or (end_expr[0] == 'var'
+                                            and self.simbolo(end_expr[1])[0] in ('global', 'local', 'loc')
+                                            and end_expr[1].lower() not in variaveis_escritas(body, self.modos_parametros))
+        candidatas = [c for c in usos if c[1] > 0]
+        if not outros and invariante and candidatas \
+                and not chama_outras(body, None, lambda n: n in self.subroutines):
+            # Com o ciclo controlado por uma forma, todas passam a variáveis auxiliares mas a
+            # variável do ciclo deixa de ser atualizada em cada iteração
+            ganho_teste = sum(usos[c] * poupanca(c) - 4 for c in usos) + 4
+            if ganho_teste > max(ganho, 0):
+                formas = list(usos)
+                teste = max(candidatas, key=lambda c: usos[c] * poupanca(c))
+        if formas:
+            contagem = self.stats.setdefault('inducao', {'ciclos': 0, 'testes': 0, 'auxiliares': 0, 'acessos': 0})
+            contagem['ciclos'] += 1
+            contagem['testes'] += teste is not None
+            contagem['auxiliares'] += len(formas)
+        return formas, teste, limite
+
+
+    # Célula da variável de indução auxiliar com o valor (i + c + a) * m, se 'node' for i ± c
+    # (ver desvio_inducao), sendo i a variável de um ciclo for em geração, e essa forma tiver
+    # sido escolhida; ou None
+    def forma_inducao(self, node, a, m):
+        for nome, (loc, auxiliares) in self.inducao.items():
+            c = self.desvio_inducao(node, nome, loc)
+            if c is not None and (a + c, m) in auxiliares:
+                self.stats['inducao']['acessos'] += 1
+                return auxiliares[(a + c, m)]
+        return None
+
+
+    # Valor de uma expressão conhecida em tempo de compilação (literais, constantes nomeadas e
+    # operações entre eles, calculada pelo Avaliador), ou None
+    def limite_constante(self, node):
+        v = self.valor_constante(node)
+        if v is not None:
+            return v
+        for n in percorrer(node):
+            if n[0] == 'call' or (n[0] == 'var' and self.simbolo(n[1])[0] != 'const'):
+                return None
+        valores = {}
+        avaliador = Avaliador({}, valores, self.opcoes['avaliacao_passos'])
+        for nome, expr in self.consts.items():
+            v = avaliador.constante(expr)
+            if v is not None:
+                valores[nome] = v
+        return avaliador.constante(node)
+
+
+    # Desenrola um ciclo for com limites constantes cujo corpo não altera a variável do ciclo.
+    # Com poucas iterações, o corpo é repetido uma vez por valor, com a variável substituída
+    # pelo valor; com mais, o corpo é repetido 'desenrolar_fator' vezes por cada teste e as
+    # iterações que sobram vão a seguir ao ciclo. No fim, a variável fica com o mesmo valor
+    # que no ciclo normal. Devolve False se o ciclo não puder (ou não compensar) ser desenrolado.
+    def desenrolar_for(self, node, loc):
+        _, var_node, start_expr, end_expr, direction, body = node
+        nome = (var_node[1] if isinstance(var_node, tuple) else var_node).lower()
+        inicio = self.limite_constante(start_expr)
+        fim = self.limite_constante(end_expr)
+        if inicio is None or fim is None:
+            return False
+        if nome in variaveis_escritas(body, self.modos_parametros) \
+                or any(n[0] in ('goto', 'label_stmt') for n in percorrer(body)):
+            return False
+        passo = 1 if direction == 'to' else -1
+        iteracoes = max(0, (fim - inicio) * passo + 1)
+        copia = tamanho_ast(body)
+        orcamento = self.opcoes['desenrolar_orcamento']
+
+        def guardar(valor):
+            self.emit_store(loc, lambda: self.emit(Op.PUSHI, valor))
+
+        def incrementar():
+            self.emit_store(loc, lambda: (self.emit_load(loc), self.emit(Op.PUSHI, 1),
+                                          self.emit(Op.ADD if passo == 1 else Op.SUB)))
+
+        if iteracoes <= self.opcoes['desenrolar_completo'] and iteracoes * copia <= orcamento:
+            # Desenrolamento completo: no corpo, as leituras da variável passam a ser o valor
+            # constante (e as operações com ele são calculadas já); a variável só é guardada em cada iteração se o corpo chamar
+            # sub-rotinas (que a podem ler) ou abrir um WITH (onde não há substituição)
+            chama = chama_outras(body, None, lambda n: n in self.subroutines) \
+                or any(n[0] == 'with' for n in percorrer(body))
+            for k in range(iteracoes):
+                valor = inicio + k * passo
+                if chama:
+                    guardar(valor)
+                self.gen(dobrar_constantes(substituir_variavel(body, nome, ('const', 'integer', valor))))
+            guardar(inicio + iteracoes * passo)
+            self.contar_desenrolado('completos')
+            return True
+
+        fator = self.opcoes['desenrolar_fator']
+        while fator > 1 and (fator + iteracoes % fator) * copia > orcamento:
+            fator //= 2
+        if fator < 2 or iteracoes < 2 * fator:
+            return False
+        blocos, resto = divmod(iteracoes, fator)
+        i = self.label_counter
+        self.label_counter += 1
+        lbl_start = f"L{i}FOR"
+        guardar(inicio)
+        self.label(lbl_start)
+        for _ in range(fator):
+            self.gen(body)
+            incrementar()
+        # Regressa ao início enquanto faltarem blocos completos de 'fator' iterações
+        self.emit_load(loc)
+        self.emit(Op.PUSHI, inicio + (blocos - 1) * fator * passo)
+        self.emit(Op.SUP if passo == 1 else Op.INF)
+        self.emit(Op.JZ, lbl_start)
+        for _ in range(resto):
+            self.gen(body)
+            incrementar()
+        self.contar_desenrolado('parciais')
+        return True
+
+
+    def contar_desenrolado(self, forma):
+        self.stats.setdefault('desenrolados', {'completos': 0, 'parciais': 0})[forma] += 1
+
+
+    # Gera o código de uma function: ('function', nome, params, tipo, block)
+    def gen_function(self, node):
+        self.gen_subrotina(node)
+
+
+    # Gera o código de um procedure: ('procedure', nome, params, block)
+    def gen_procedure(self, node):
+        self.gen_subrotina(node)
+
+
+    # Gera a entrada de uma function com {$MEMO}, que guarda os resultados já calculados numa
+    # tabela da frame global (ou da heap, com layout_arrays='heap'). Se todos os parâmetros
+    # forem de tipos intervalo e houver no máximo MEMO_MAX_TABELA combinações de valores, a
+    # tabela tem uma entrada por combinação, [preenchida, resultado]; senão, é uma cache de
+    # MEMO_CACHE entradas, [preenchida, argumentos..., resultado], escolhida por dispersão dos
+    # argumentos, em que cada resultado novo substitui o anterior. Se o valor não estiver na
+    # tabela, o corpo (etiqueta <nome>MEMO) é chamado com os mesmos argumentos e o resultado
+    # é guardado. A entrada usa uma célula da sua frame, fp[0], para a posição na tabela.
+    def gen_memo(self, name, label, params):
+        n = len(params)
+        lims = [limites(tp) for _, _, tp in params]
+        entradas = 1
+        for lim in lims:
+            entradas = None if lim is None or entradas is None else entradas * (lim[1] - lim[0] + 1)
+        tabela = entradas is not None and entradas <= MEMO_MAX_TABELA
+        if not tabela:
+            entradas = MEMO_CACHE
+        chaves = 0 if tabela else n
+        passo = chaves + 2
+        celulas = entradas * passo
+
+        if self.opcoes['layout_arrays'] == 'heap':
+            apontador = self.globais.reservar()
+            self.emit(Op.PUSHI, celulas, bloco=self.preambulo)
+            self.emit(Op.ALLOCN, bloco=self.preambulo)
+            self.emit(Op.STOREG, apontador, bloco=self.preambulo)
+            inicio = 0
+            base = lambda: self.emit(Op.PUSHG, apontador)
+        else:
+            inicio = self.globais.reservar(celulas)
+            base = lambda: self.emit(Op.PUSHGP)
+        lbl_falha = f"{label}MEMOFALHA"
+        lbl_direta = f"{label}MEMODIRETA"
+
+        # Chama o corpo com os argumentos recebidos; o resultado fica no topo da pilha
+        def chamar_corpo():
+            self.emit(Op.PUSHI, 0)
+            for k in range(n):
+                self.emit(Op.PUSHL, k - n)
+            self.emit(Op.PUSHA, f"{label}MEMO")
+            self.emit(Op.CALL)
+            self.emit(Op.POP, n)
+
+        # Célula 'campo' da entrada atual: empilha o endereço e o índice para LOADN/STOREN
+        def celula(campo):
+            base()
+            self.emit(Op.PUSHL, 0)
+            if campo:
+                self.emit(Op.PUSHI, campo)
+                self.emit(Op.ADD)
+
+        self.label(label)
+        self.emit(Op.PUSHN, 1)
+        if tabela:
+            # Posição pelos valores: argumentos fora do tipo não têm entrada na tabela
+            for k, (lo, hi) in enumerate(lims):
+                self.emit(Op.PUSHL, k - n)
+                self.emit(Op.PUSHI, lo)
+                self.emit(Op.SUPEQ)
+                self.emit(Op.PUSHL, k - n)
+                self.emit(Op.PUSHI, hi)
+                self.emit(Op.INFEQ)
+                self.emit(Op.AND)
+                self.emit(Op.JZ, lbl_direta)
+            for k, (lo, hi) in enumerate(lims):
+                if k:
+                    self.emit(Op.PUSHI, hi - lo + 1)
+                    self.emit(Op.MUL)
+                self.emit(Op.PUSHL, k - n)
+                if lo:
+                    self.emit(Op.PUSHI, lo)
+                    self.emit(Op.SUB)
+                if k:
+                    self.emit(Op.ADD)
+        else:
+            # Dispersão: h = (h * 31 + a) mod MEMO_CACHE, somando MEMO_CACHE se for negativo
+            for k in range(n):
+                if k:
+                    self.emit(Op.PUSHI, 31)
+                    self.emit(Op.MUL)
+                self.emit(Op.PUSHL, k - n)
+                self.emit(Op.PUSHI, entradas)
+                self.emit(Op.MOD)
+                if k:
+                    self.emit(Op.ADD)
+            self.emit(Op.PUSHI, entradas)
+            self.emit(Op.MOD)
+            self.emit(Op.STOREL, 0)
+            self.emit(Op.PUSHL, 0)
+            self.emit(Op.PUSHI, 0)
+            self.emit(Op.INF)
+            self.emit(Op.JZ, f"{label}MEMOPOS")
+            self.emit(Op.PUSHL, 0)
+            self.emit(Op.PUSHI, entradas)
+            self.emit(Op.ADD)
+            self.emit(Op.STOREL, 0)
+            self.label(f"{label}MEMOPOS")
+            self.emit(Op.PUSHL, 0)
+        self.emit(Op.PUSHI, passo)
+        self.emit(Op.MUL)
+        if inicio:
+            self.emit(Op.PUSHI, inicio)
+            self.emit(Op.ADD)
+        self.emit(Op.STOREL, 0)
+
+        # Resultado já calculado (na cache, também com os mesmos argumentos)?
+        celula(0)
+        self.emit(Op.LOADN)
+        for k in range(chaves):
+            celula(1 + k)
+            self.emit(Op.LOADN)
+            self.emit(Op.PUSHL, k - n)
+            self.emit(Op.EQUAL)
+            self.emit(Op.AND)
+        self.emit(Op.JZ, lbl_falha)
+        celula(passo - 1)
+        self.emit(Op.LOADN)
+        self.emit(Op.STOREL, -n - 1)
+        self.emit(Op.RETURN)
+
+        # Calcula e guarda o resultado
+        self.label(lbl_falha)
+        chamar_corpo()
+        self.emit(Op.STOREL, -n - 1)
+        celula(passo - 1)
+        self.emit(Op.PUSHL, -n - 1)
+        self.emit(Op.STOREN)
+        celula(0)
+        self.emit(Op.PUSHI, 1)
+        self.emit(Op.STOREN)
+        for k in range(chaves):
+            celula(1 + k)
+            self.emit(Op.PUSHL, k - n)
+            self.emit(Op.STOREN)
+        self.emit(Op.RETURN)
+
+        if tabela:
+            self.label(lbl_direta)
+            chamar_corpo()
+            self.emit(Op.STOREL, -n - 1)
+            self.emit(Op.RETURN)
+        self.stats.setdefault('memo', {})[name.lower()] = ('tabela' if tabela else 'cache', entradas, celulas)
+
+
+    # Verifica se alguma sub-rotina declarada dentro de 'defn' usa os seus parâmetros, as suas
+    # variáveis ou o seu resultado (acessos feitos através do display)
+    def usa_display(self, defn):
+        proprias = {defn[1].lower()} | {pid.lower() for _, ids, _ in defn[2] or [] for pid in ids}
+        for d in defn[-1][1]:
+            if d and d[0] == 'var_decl':
+                for _, ids, _ in d[1]:
+                    proprias.update(i.lower() for i in ids)
+        return any(nomes_livres(d) & proprias for d in defn[-1][1]
+                   if d and d[0] in ('function', 'procedure'))
+
+
+    # Gera o código de uma sub-rotina. Convenção de chamada:
+    #   quem chama empilha a célula do resultado (só nas functions) e os argumentos, faz
+    #   PUSHA/CALL e, no regresso, POP dos argumentos, deixando o resultado no topo;
+    #   a sub-rotina reserva as variáveis locais e temporários com um único PUSHN e termina
+    #   com RETURN, que repõe sp = fp.
+    # Com n parâmetros, o parâmetro k (0..n-1) fica em fp[k - n] e o resultado em fp[-n - 1];
+    # as variáveis locais ocupam fp[0], fp[1], ... Parâmetros var, arrays e records são
+    # recebidos pelo endereço; um array ou record passado por valor só é copiado para a frame
+    # local, à entrada, se a sub-rotina o puder alterar (ver agregados_sem_copia).
+    def gen_subrotina(self, node):
+        name, block = node[1], node[-1]
+        label, params, ret = self.subroutines[name.lower()]
+        # Âmbito exterior, reposto no fim
+        anterior = (self.symtab, self.consts, self.types, self.subroutines,
+                    self.frame, self.base_frame, self.correcoes_fp,
+                    self.chamadas_cauda, self.inicio_corpo, self.cfg.origem_atual)
+        # O código da sub-rotina fica com a linha do cabeçalho e o nome dela no mapa de fontes
+        self.cfg.origem_atual = self.cfg.origem(getattr(node, 'linha', None), name)
+        self.symtab = dict(self.symtab)
+        self.consts = dict(self.consts)
+        self.types = dict(self.types)
+        self.subroutines = dict(self.subroutines)
+        self.frame = Frame()
+        self.base_frame = 'L'
+        self.correcoes_fp = []
+        self.nivel += 1
+
+        # Numa function com {$MEMO}, a etiqueta da sub-rotina é a da entrada que consulta a
+        # tabela de resultados (gen_memo) e o corpo fica noutra etiqueta
+        memo = label in self.memo
+        self.label(f"{label}MEMO" if memo else label)
+        # O tamanho da frame só é conhecido no fim (os temporários também ficam nela)
+        reserva = self.emit(Op.PUSHN, 0)
+        # Se as sub-rotinas internas usarem variáveis desta, o fp fica no display durante a
+        # execução; o valor anterior (de outra ativação do mesmo nível) é reposto no fim
+        guardado = None
+        if self.usa_display(node):
+            if self.nivel not in self.display:
+                self.display[self.nivel] = self.globais.reservar()
+            guardado = self.frame.reservar()
+            self.emit(Op.PUSHG, self.display[self.nivel])
+            self.emit(Op.STOREL, guardado)
+            self.emit(Op.PUSHFP)
+            self.emit(Op.STOREG, self.display[self.nivel])
+            contagem = self.stats.setdefault('display', {'profundidade': 0, 'acessos': 0})
+            contagem['profundidade'] = max(contagem['profundidade'], self.nivel + 1)
+        # As chamadas recursivas de cauda saltam para aqui (depois de reservar a frame)
+        self.chamadas_cauda = ()
+        self.inicio_corpo = f"{label}CORPO"
+        self.label(self.inicio_corpo)
+        self.declarar(block[1])
+        n = len(params)
+        escritas = variaveis_escritas(block, self.modos_parametros)
+        sem_copia = self.agregados_sem_copia(node, escritas)
+        copias = []
+        for k, (pid, modo, tp) in enumerate(params):
+            key = pid.lower()
+            if modo == 'param_var' or (self.e_agregado(tp) and sem_copia and key not in escritas):
+                self.symtab[key] = ('ref', k - n, tp, self.nivel)
+            elif self.e_agregado(tp):
+                copia = Loc('L', self.frame.reservar(tamanho(tp)), tp)
+                copias.append((Loc(Loc('L', k - n, 'pointer'), 0, tp), copia))
+                self.symtab[key] = ('local', copia.offset, tp, self.nivel)
+            else:
+                self.symtab[key] = ('local', k - n, tp, self.nivel)
+            if self.e_agregado(tp) and modo != 'param_var':
+                contagem = self.stats.setdefault('parametros_agregados', {'endereco': 0, 'copia': 0})
+                contagem['endereco' if sem_copia and key not in escritas else 'copia'] += 1
+        if ret is not None:
+            self.symtab[name.lower()] = ('local', -n - 1, ret, self.nivel)
+        for origem, copia in copias:
+            self.emit_copia(origem, copia, tamanho(copia.tp))
+
+        self.chamadas_cauda = self.cauda_valida(node)
+        self.gen(block)
+        if guardado is not None:
+            self.emit(Op.PUSHL, guardado)
+            self.emit(Op.STOREG, self.display[self.nivel])
+        self.emit(Op.RETURN)
+
+        self.cfg.corrigir(reserva, self.frame.tamanho)
+        for ref, off in self.correcoes_fp:
+            self.cfg.corrigir(ref, off - self.frame.tamanho)
+        self.stats.setdefault('frames', {})[name.lower()] = self.frame.tamanho
+        if memo:
+            self.gen_memo(name, label, params)
+
+        # Sub-rotinas declaradas dentro desta
+        for d in block[1]:
+            if d and d[0] in ('function', 'procedure'):
+                self.gen(d)
+
+        self.nivel -= 1
+        (self.symtab, self.consts, self.types, self.subroutines,
+         self.frame, self.base_frame, self.correcoes_fp,
+         self.chamadas_cauda, self.inicio_corpo, self.cfg.origem_atual) = anterior
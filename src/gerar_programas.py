@@ -0,0 +1,173 @@
+import argparse
+import random
+import sys
+
+# Gerador de programas Pascal sintéticos, válidos e de tamanho configurável, para medir como
+# as fases do compilador escalam (ver benchmark_compilador). Cada parte do programa cresce
+# com um parâmetro próprio e as partes podem ser combinadas:
+#   - globais: variáveis globais inteiras, todas inicializadas e somadas no programa principal;
+#   - instrucoes: instruções do programa principal (atribuições, if, while, for e writeln);
+#   - profundidade: encaixe das expressões (parênteses) em 10 atribuições;
+#   - subrotinas: functions com parâmetros e variáveis locais, cada uma a chamar a anterior;
+#   - ramos_case: etiquetas de um CASE sobre um inteiro;
+#   - campos: campos de um record (de vários tipos), usados num array de records e com WITH.
+# As sub-rotinas só usam parâmetros e variáveis locais e o programa principal inicializa
+# todas as globais antes de as ler (o analisador semântico rejeita as leituras de variáveis
+# não inicializadas). Os valores usados nos cálculos vêm de um readln, para as chamadas não
+# serem avaliadas na compilação, e os campos reais só entram em comparações com literais
+# reais (o gerador de código escolhe as instruções de vírgula flutuante pelos literais).
+
+# Forma de cada programa sintético: o parâmetro que cresce com o tamanho pedido
+FORMAS = {
+    'globais': 'globais',
+    'instrucoes': 'instrucoes',
+    'expressoes': 'profundidade',
+    'subrotinas': 'subrotinas',
+    'case': 'ramos_case',
+    'records': 'campos',
+}
+
+OPERADORES = ('+', '-', '*', '+')
+TIPOS_CAMPOS = ('integer', 'real', 'boolean', 'char')
+
+
+# Declarações de variáveis 'nomes' do tipo 'tipo', com até 'por_linha' nomes por linha
+def declarar(nomes, tipo, por_linha=10):
+    return [f"    {', '.join(nomes[i:i + por_linha])}: {tipo};"
+            for i in range(0, len(nomes), por_linha)]
+
+
+# Expressão com 'profundidade' níveis de parênteses sobre a variável 'var'
+def expressao(var, profundidade, rnd):
+    e = var
+    for k in range(profundidade):
+        op = rnd.choice(OPERADORES)
+        e = f"({e} {op} {k % 9 + 1})" if k % 2 else f"({k % 9 + 1} {op} {e})"
+    return f"{e} mod 1000"
+
+
+# Functions F1..Fn: cada Fk (k > 1) chama F(k-1), por isso nenhuma é uma folha expandida
+# em linha; as contas ficam limitadas com mod para não transbordarem
+def gerar_subrotinas(n):
+    linhas = []
+    for k in range(1, n + 1):
+        chamada = f"F{k - 1}(b, t) mod 100" if k > 1 else "b"
+        linhas += [
+            f"function F{k}(a, b: integer): integer;",
+            "var t, u: integer;",
+            "begin",
+            f"    t := (a * {k % 7 + 2} + b) mod 1000;",
+            "    u := 0;",
+            "    while t > 10 do",
+            "    begin",
+            "        u := u + t mod 10;",
+            "        t := t div 10",
+            "    end;",
+            f"    if u > {k % 20} then",
+            f"        F{k} := u + {chamada}",
+            "    else",
+            f"        F{k} := t - {chamada}",
+            "end;",
+            "",
+        ]
+    return linhas
+
+
+# Instruções do programa principal, com as formas repetidas por ordem
+def gerar_instrucoes(n):
+    formas = (
+        lambda k: [f"a := (a + {k}) mod 1000;"],
+        lambda k: ["if a > b then", f"    b := a - {k % 5}", "else", f"    a := b + {k % 3};"],
+        lambda k: [f"for i := 1 to {k % 4 + 1} do", f"    c := (c + i * {k % 7}) mod 1000;"],
+        lambda k: ["while c > 500 do", "    c := c - 7;"],
+        lambda k: [f"b := (a * {k % 11} + c) mod 1000;"],
+        lambda k: ["if (a = b) or (c < 10) then", "    writeln(a, ', ', b, ', ', c);"],
+    )
+    linhas = []
+    for k in range(n):
+        linhas += formas[k % len(formas)](k)
+    return linhas
+
+
+# Texto de um programa sintético com as partes dadas (ver o início do ficheiro); 'semente'
+# fixa os operadores escolhidos para as expressões
+def gerar(globais=0, instrucoes=0, profundidade=0, subrotinas=0, ramos_case=0, campos=0,
+          semente=0):
+    rnd = random.Random(semente)
+    nome_globais = [f"g{k}" for k in range(1, globais + 1)]
+    decl = ["program Sintetico;"]
+    if campos:
+        decl += ["type", "    Registo = record"]
+        decl += [f"        c{k}: {TIPOS_CAMPOS[k % len(TIPOS_CAMPOS)]};" for k in range(1, campos + 1)]
+        decl += ["    end;"]
+    decl += ["var", "    x, a, b, c, i, s: integer;"]
+    decl += declarar(nome_globais, 'integer')
+    if campos:
+        decl += ["    r: Registo;", "    v: array[1..3] of Registo;"]
+    decl.append("")
+    if subrotinas:
+        decl += gerar_subrotinas(subrotinas)
+
+    corpo = ["readln(x);", "a := x;", "b := x + 1;", "c := 0;", "s := 0;"]
+    corpo += [f"{g} := x + {k};" for k, g in enumerate(nome_globais, 1)]
+    corpo += [f"s := (s + {g}) mod 10000;" for g in nome_globais]
+    corpo += gerar_instrucoes(instrucoes)
+    for k in range(10 if profundidade else 0):
+        corpo.append(f"a := {expressao('a', profundidade, rnd)};")
+    if subrotinas:
+        corpo += [f"s := (s + F{k}(x, {k})) mod 10000;" for k in range(1, subrotinas + 1)]
+    if ramos_case:
+        corpo += ["for i := 1 to 20 do", f"    case (x + i * 7) mod {ramos_case} of"]
+        corpo += [f"        {k}: s := s + {k % 13 + 1};" for k in range(ramos_case)]
+        corpo += ["    end;"]
+    if campos:
+        tipos = [TIPOS_CAMPOS[k % len(TIPOS_CAMPOS)] for k in range(campos + 1)]
+        valores = {'integer': "x + i * {k}", 'real': "real(x) * 0.5 + {k}.0",
+                   'boolean': "x > {k}", 'char': "'a'"}
+        corpo += ["for i := 1 to 3 do", "begin"]
+        corpo += [f"    v[i].c{k} := {valores[tipos[k]].format(k=k)};" for k in range(1, campos + 1)]
+        corpo += ["    s := s + i", "end;", "i := x;", "with r do", "begin"]
+        corpo += [f"    c{k} := {valores[tipos[k]].format(k=k)};" for k in range(1, campos + 1)]
+        corpo += ["    s := s + 1", "end;"]
+        for k in range(1, campos + 1):
+            if tipos[k] == 'integer':
+                corpo.append(f"s := (s + v[{k % 3 + 1}].c{k}) mod 10000;")
+            elif tipos[k] == 'real':
+                corpo += [f"if v[{k % 3 + 1}].c{k} > {k}.5 then", "    s := s + 1;"]
+        corpo += ["with r do", "begin"]
+        corpo += [f"    s := (s + c{k}) mod 10000;" for k in range(1, campos + 1) if tipos[k] == 'integer']
+        corpo += ["    s := s + 1", "end;"]
+    corpo.append("writeln(a, ', ', b, ', ', c, ', ', s)")
+    return '\n'.join(decl + ["begin"] + ["    " + linha for linha in corpo] + ["end."]) + '\n'
+
+
+# Programa sintético de uma das FORMAS, com 'tamanho' elementos da parte que cresce
+def gerar_forma(forma, tamanho, semente=0):
+    return gerar(**{FORMAS[forma]: tamanho}, semente=semente)
+
+
+# Escreve um programa sintético com as partes pedidas na linha de comandos
+def main():
+    ap = argparse.ArgumentParser(description="Gerador de programas Pascal sintéticos")
+    ap.add_argument('--globais', type=int, default=0, help="número de variáveis globais")
+    ap.add_argument('--instrucoes', type=int, default=0, help="instruções do programa principal")
+    ap.add_argument('--profundidade', type=int, default=0,
+                    help="níveis de parênteses das expressões (em 10 atribuições)")
+    ap.add_argument('--subrotinas', type=int, default=0, help="número de functions")
+    ap.add_argument('--ramos-case', type=int, default=0, help="etiquetas de um CASE")
+    ap.add_argument('--campos', type=int, default=0, help="campos de um record")
+    ap.add_argument('--semente', type=int, default=0, help="semente dos valores aleatórios")
+    ap.add_argument('-o', '--saida', help="ficheiro .pas a gravar; por omissão, o stdout")
+    args = ap.parse_args()
+
+    texto = gerar(args.globais, args.instrucoes, args.profundidade, args.subrotinas,
+                  args.ramos_case, args.campos, args.semente)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            f.write(texto)
+    else:
+        sys.stdout.write(texto)
+
+
+if __name__ == "__main__":
+    main()
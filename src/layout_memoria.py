@@ -0,0 +1,299 @@
+# Layout de memória usado pelo gerador de código.
+# Converte os tipos da AST em descritores com tamanho conhecido em tempo de compilação
+# e distribui as variáveis pelas células de uma frame (a frame global, indexada a
+# partir de gp, ou a frame de uma sub-rotina, indexada a partir de fp).
+
+
+# Descritor de um array: limites do índice e tipo dos elementos. Um array com várias
+# dimensões é um array de arrays, guardado num único bloco contíguo; os strides de todas
+# as dimensões ficam calculados na construção.
+#   stride: número de células ocupadas por cada elemento
+#   desvio: soma de low * stride de todas as dimensões, isto é, quantas células o primeiro
+#           elemento fica à frente do elemento com todos os índices a 0
+class TipoArray:
+    __slots__ = ('low', 'high', 'elem', 'stride', 'desvio')
+
+    def __init__(self, low, high, elem):
+        self.low = low
+        self.high = high
+        self.elem = elem
+        self.stride = tamanho(elem)
+        self.desvio = low * self.stride + (elem.desvio if isinstance(elem, TipoArray) else 0)
+
+    # Número de elementos
+    @property
+    def size(self):
+        return self.high - self.low + 1
+
+    def __repr__(self):
+        return f"array[{self.low}..{self.high}] of {self.elem!r}"
+
+
+# Número de bits guardados em cada palavra de um conjunto (fica abaixo do bit de sinal de um
+# inteiro de 32 bits, para que todas as máscaras sejam inteiros positivos)
+BITS_PALAVRA = 30
+
+
+# Descritor de um tipo ordinal com limites conhecidos: enumerados (0..n-1) e subranges
+class TipoIntervalo:
+    __slots__ = ('low', 'high', 'base')
+
+    def __init__(self, low, high, base):
+        self.low = low
+        self.high = high
+        self.base = base  # 'integer', 'char' ou 'enum'
+
+    def __repr__(self):
+        return f"{self.low}..{self.high} ({self.base})"
+
+
+# Descritor de um conjunto: vetor de bits, BITS_PALAVRA por palavra. O elemento de valor
+# ordinal 'x' corresponde ao bit (x - low) % BITS_PALAVRA da palavra (x - low) // BITS_PALAVRA.
+class TipoConjunto:
+    __slots__ = ('low', 'high')
+
+    def __init__(self, low, high):
+        self.low = low
+        self.high = high
+
+    # Número de palavras (células) ocupadas
+    @property
+    def palavras(self):
+        return (self.high - self.low) // BITS_PALAVRA + 1
+
+    # Palavra e bit do elemento de valor ordinal 'x'
+    def posicao(self, x):
+        return divmod(x - self.low, BITS_PALAVRA)
+
+    # Máscara da palavra 'i' com todos os elementos do tipo base
+    def cheia(self, i):
+        n = min(BITS_PALAVRA, self.high - self.low + 1 - i * BITS_PALAVRA)
+        return (1 << n) - 1
+
+    # Máscara da palavra 'i' com os elementos dos intervalos constantes [(lo, hi), ...]
+    def mascara(self, intervalos, i):
+        m = 0
+        for lo, hi in intervalos:
+            if lo < self.low or hi > self.high:
+                raise Exception(f"Elemento fora do tipo base do conjunto: {lo}..{hi}")
+            for x in range(max(lo, self.low + i * BITS_PALAVRA),
+                           min(hi, self.low + (i + 1) * BITS_PALAVRA - 1) + 1):
+                m |= 1 << (x - self.low) % BITS_PALAVRA
+        return m
+
+    def __repr__(self):
+        return f"set of {self.low}..{self.high}"
+
+
+# Base de um tipo ordinal ('integer', 'char', 'boolean', 'enum', ...)
+def tipo_base(tp):
+    if isinstance(tp, TipoIntervalo):
+        return tp.base
+    return tp
+
+
+# Limites (low, high) dos valores de um tipo ordinal, ou None se não forem limitados
+def limites(tp):
+    if isinstance(tp, TipoIntervalo):
+        return tp.low, tp.high
+    if tp == 'char':
+        return 0, 255
+    if tp == 'boolean':
+        return 0, 1
+    return None
+
+
+# Junta uma lista de intervalos constantes [(lo, hi), ...] em intervalos disjuntos e ordenados
+def juntar_intervalos(intervalos):
+    juntos = []
+    for lo, hi in sorted(intervalos):
+        if hi < lo:
+            continue
+        if juntos and lo <= juntos[-1][1] + 1:
+            juntos[-1] = (juntos[-1][0], max(juntos[-1][1], hi))
+        else:
+            juntos.append((lo, hi))
+    return juntos
+
+
+# Descritor de um record: cada campo tem um deslocamento fixo (em células) a partir do
+# início do record. Os campos das várias alternativas de uma parte variante começam
+# todos no mesmo deslocamento e partilham as mesmas células.
+class TipoRegisto:
+    __slots__ = ('campos', 'celulas')
+
+    def __init__(self):
+        # Índice dos campos: nome (minúsculas) -> (deslocamento, tipo)
+        self.campos = {}
+        self.celulas = 0
+
+    def definir(self, nome, offset, tp):
+        key = nome.lower()
+        if key in self.campos:
+            raise Exception(f"Campo '{nome}' duplicado em record.")
+        self.campos[key] = (offset, tp)
+
+    # Deslocamento e tipo do campo 'nome'
+    def campo(self, nome):
+        try:
+            return self.campos[nome.lower()]
+        except KeyError:
+            raise Exception(f"Campo '{nome}' não existe no record.") from None
+
+    def __repr__(self):
+        campos = '; '.join(f"{n}@{off}: {tp!r}" for n, (off, tp) in self.campos.items())
+        return f"record {campos} end"
+
+
+# Número de células de memória ocupadas por um valor do tipo 'tp'
+def tamanho(tp):
+    if isinstance(tp, TipoArray):
+        return tp.size * tamanho(tp.elem)
+    if isinstance(tp, TipoRegisto):
+        return tp.celulas
+    if isinstance(tp, TipoConjunto):
+        return tp.palavras
+    # Tipos escalares (integer, real, boolean, char, enum) ocupam uma célula
+    return 1
+
+
+# Atribui deslocamentos consecutivos, a partir de 'inicio', aos campos de uma field_list
+# e devolve o deslocamento seguinte ao último campo
+def _dispor_campos(reg, field_list, inicio, tipos, avaliar):
+    off = inicio
+    for _, nomes, campo_tp in field_list:
+        desc = resolver_tipo(campo_tp, tipos, avaliar)
+        for nome in nomes:
+            reg.definir(nome, off, desc)
+            off += tamanho(desc)
+    return off
+
+
+# Layout de um record: primeiro os campos fixos, depois o discriminador (se não for já um
+# campo) e, por fim, as alternativas da parte variante sobrepostas umas às outras
+def _resolver_registo(tp, tipos, avaliar):
+    _, field_list, variant_part = tp
+    reg = TipoRegisto()
+    fim = _dispor_campos(reg, field_list, 0, tipos, avaliar)
+    if variant_part is not None:
+        _, discrim, discrim_tp, variantes = variant_part
+        if discrim.lower() not in reg.campos:
+            reg.definir(discrim, fim, discrim_tp.lower())
+            fim += 1
+        inicio = fim
+        for _, campos_variante in variantes:
+            fim = max(fim, _dispor_campos(reg, campos_variante, inicio, tipos, avaliar))
+    reg.celulas = fim
+    return reg
+
+
+# Converte um nó de tipo da AST num descritor. 'tipos' contém os aliases declarados, já
+# convertidos (nome -> descritor), e 'avaliar' calcula o valor de uma expressão constante.
+def resolver_tipo(tp, tipos, avaliar):
+    kind = tp[0]
+    if kind == 'simple_type':
+        return tp[1].lower()
+    if kind == 'id_type':
+        alias = tp[1].lower()
+        return tipos.get(alias, alias)
+    if kind == 'record':
+        return _resolver_registo(tp, tipos, avaliar)
+    if kind == 'array_type':
+        low_ast, high_ast = tp[1]
+        low = avaliar(low_ast)
+        high = avaliar(high_ast)
+        if high < low:
+            raise Exception(f"Array com limites inválidos: {low}..{high}")
+        return TipoArray(low, high, resolver_tipo(tp[2], tipos, avaliar))
+    if kind == 'packed':
+        return resolver_tipo(tp[1], tipos, avaliar)
+    if kind == 'subrange':
+        low_ast, high_ast = tp[1], tp[2]
+        base = 'char' if low_ast[1] == 'char' else 'integer'
+        return TipoIntervalo(avaliar(low_ast), avaliar(high_ast), base)
+    if kind == 'enum':
+        return TipoIntervalo(0, len(tp[1]) - 1, 'enum')
+    if kind == 'set':
+        elem = resolver_tipo(tp[1], tipos, avaliar)
+        lim = limites(elem)
+        if lim is None:
+            if elem != 'integer':
+                raise Exception(f"Tipo base de conjunto não ordinal: {elem!r}")
+            # 'set of integer': como é habitual nos compiladores de Pascal, limitado a 0..255
+            lim = (0, 255)
+        return TipoConjunto(*lim)
+    return kind
+
+
+# Frame de variáveis: atribui deslocamentos consecutivos a partir de 0
+class Frame:
+    def __init__(self):
+        self.tamanho = 0
+        # Células temporárias já libertadas, prontas a reutilizar
+        self.livres = []
+
+    # Reserva 'n' células contíguas e devolve o deslocamento da primeira
+    def reservar(self, n=1):
+        off = self.tamanho
+        self.tamanho += n
+        return off
+
+    # Célula para um valor temporário: reutiliza uma célula libertada, se existir
+    def temporario(self):
+        return self.livres.pop() if self.livres else self.reservar()
+
+    def libertar(self, off):
+        self.livres.append(off)
+
+
+# Localização de um valor em memória: endereço base + deslocamento constante + termos
+# de índice calculados em tempo de execução.
+#   base: 'G' (frame global), 'L' (frame local) ou outra Loc que contém um apontador
+#   offset: deslocamento constante (em células) a partir da base
+#   terms: lista de (expr_indice, low, high, stride) para os índices não constantes
+#   tp: descritor do tipo do valor localizado
+class Loc:
+    __slots__ = ('base', 'offset', 'terms', 'tp')
+
+    def __init__(self, base, offset, tp, terms=()):
+        self.base = base
+        self.offset = offset
+        self.tp = tp
+        self.terms = tuple(terms)
+
+    # Localização do elemento de índice 'idx' (nó da AST) deste array. Se o índice for
+    # constante ('valor' não é None), o elemento fica com um deslocamento constante.
+    def indexar(self, idx, valor=None):
+        tp = self.tp
+        if not isinstance(tp, TipoArray):
+            raise Exception(f"Indexação de um valor que não é array: {tp!r}")
+        stride = tp.stride
+        if valor is not None:
+            if not tp.low <= valor <= tp.high:
+                raise Exception(f"Índice {valor} fora dos limites {tp.low}..{tp.high}")
+            return Loc(self.base, self.offset + (valor - tp.low) * stride, tp.elem, self.terms)
+        return Loc(self.base, self.offset, tp.elem,
+                   self.terms + ((idx, tp.low, tp.high, stride),))
+
+    # Localização da palavra 'i' deste conjunto
+    def palavra(self, i):
+        return Loc(self.base, self.offset + i, 'integer', self.terms)
+
+    # Localização do campo 'nome' deste record: soma apenas um deslocamento constante
+    def campo(self, nome):
+        tp = self.tp
+        if not isinstance(tp, TipoRegisto):
+            raise Exception(f"Acesso ao campo '{nome}' de um valor que não é record: {tp!r}")
+        off, campo_tp = tp.campo(nome)
+        return Loc(self.base, self.offset + off, campo_tp, self.terms)
+
+    # Verifica se duas localizações sem índices variáveis são a mesma célula
+    def mesma_celula(self, outra):
+        if not isinstance(outra, Loc) or self.terms or outra.terms or self.offset != outra.offset:
+            return False
+        if isinstance(self.base, Loc):
+            return self.base.mesma_celula(outra.base)
+        return self.base == outra.base
+
+    def __repr__(self):
+        return f"<Loc base={self.base!r} offset={self.offset} terms={len(self.terms)} tp={self.tp!r}>"
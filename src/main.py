@@ -1,15 +1,84 @@
 import sys
 import os
+import argparse
 from ana_sin import parse
 from ana_sem import*
-from gerador_codigo import CodeGenerator
+from gerador_codigo import CodeGenerator, ErroCompilacao
+from maquina_virtual import MaquinaVirtual, ErroVM
+from maquina_rapida import MaquinaRapida
+from perfil import perfilar, gravar
+
+# Gera o código de um programa já analisado, com as opções do CodeGenerator dadas
+def compilar(ast, **opcoes):
+    gen = CodeGenerator(**opcoes)
+    ast = gen.preparar(ast)
+    gen.build_symtab(ast)
+    gen.gen(ast)
+    return gen
+
+
+# Tamanho, em carácteres, do ficheiro .vm com o código gerado
+def tamanho_codigo(gen):
+    return sum(len(linha) + 1 for linha in gen.lines())
+
+
+# Número de instruções PUSHS no código gerado (cada uma cria uma string quando é executada)
+def contar_pushs(gen):
+    return sum(1 for linha in gen.lines() if linha.split(maxsplit=1)[:1] == ['PUSHS'])
+
+
+# Strings criadas na execução do código de cada CodeGenerator com o input 'entrada' (só o
+# interpretador de referência as conta), ou None se alguma execução falhar
+def strings_criadas(geradores, entrada):
+    try:
+        return [MaquinaVirtual('\n'.join(g.lines()), entrada).executar().strings for g in geradores]
+    except ErroVM:
+        return None
+
 
 def main():
-    if len(sys.argv) != 2:
-        print("Uso: python main.py <nome do ficheiro_pascal>")
-        sys.exit(1)
+    ap = argparse.ArgumentParser(usage="python main.py <nome do ficheiro_pascal> [opções]")
+    ap.add_argument('ficheiro', help="nome do ficheiro Pascal (dentro da pasta tests)")
+    ap.add_argument('-O0', dest='otimizar', action='store_false',
+                    help="desativa as otimizações sobre o CFG")
+    ap.add_argument('--layout-arrays', choices=('estatico', 'heap'), default='estatico',
+                    help="arrays globais na frame global (estatico) ou alocados na heap")
+    ap.add_argument('--case', dest='case_estrategia', default='auto',
+                    choices=('auto', 'tabela', 'binaria', 'linear'),
+                    help="seleção do ramo de um CASE (auto escolhe pela densidade das etiquetas)")
+    ap.add_argument('--sem-base-deslocada', dest='base_deslocada', action='store_false',
+                    help="subtrai o limite inferior em cada indexação de um array global")
+    ap.add_argument('--sem-avaliacao', dest='avaliacao_constante', action='store_false',
+                    help="não avalia na compilação as chamadas de functions puras com argumentos constantes")
+    ap.add_argument('--sem-inline', dest='inline', action='store_false',
+                    help="desativa a expansão em linha das sub-rotinas pequenas")
+    ap.add_argument('--sem-eliminacao', dest='eliminar_codigo_morto', action='store_false',
+                    help="mantém as sub-rotinas, variáveis globais e constantes não usadas")
+    ap.add_argument('--sem-cauda', dest='recursao_cauda', action='store_false',
+                    help="compila as chamadas recursivas de cauda como chamadas normais")
+    ap.add_argument('--sem-desenrolar', dest='desenrolar', action='store_false',
+                    help="não desenrola os ciclos for com limites constantes")
+    ap.add_argument('--sem-inducao', dest='reducao_inducao', action='store_false',
+                    help="não reduz os índices e produtos da variável dos ciclos for a somas")
+    ap.add_argument('--sem-tabela-strings', dest='tabela_strings', action='store_false',
+                    help="gera um PUSHS em cada ocorrência dos literais de texto")
+    ap.add_argument('--executar', action='store_true',
+                    help="executa o código gerado no interpretador da EWVM (input lido do stdin)")
+    ap.add_argument('--maquina', choices=('rapida', 'referencia'), default='rapida',
+                    help="interpretador usado por --executar: a máquina rápida (código encadeado "
+                         "com superinstruções) ou a de referência (verifica os tipos dos operandos)")
+    ap.add_argument('--mapa', action='store_true',
+                    help="grava também o mapa de fontes (linha e sub-rotina de cada instrução) "
+                         "em <ficheiro>.mapa.json")
+    ap.add_argument('--perfil', action='store_true',
+                    help="executa o código gerado no interpretador de referência (input lido do "
+                         "stdin) e grava a listagem anotada em <ficheiro>.perfil.txt e as pilhas "
+                         "colapsadas (flame graphs) em <ficheiro>.folded")
+    ap.add_argument('--ri', action='store_true',
+                    help="grava também a representação intermédia (CFG) em <ficheiro>.ri.json")
+    args = ap.parse_args()
 
-    nome_ficheiro = sys.argv[1]
+    nome_ficheiro = args.ficheiro
     caminho_ficheiro = f"../tests/{nome_ficheiro}"
 
     if not os.path.isfile(caminho_ficheiro):
@@ -33,15 +102,114 @@ def main():
         if result!=None:
             analyzer = SemanticAnalyzer()
             analyzer.analyze(result)
-            gen = CodeGenerator()
-            gen.build_symtab(result)
-            gen.gen(result)
+            opcoes = dict(otimizar=args.otimizar, layout_arrays=args.layout_arrays,
+                          base_deslocada=args.base_deslocada,
+                          case_estrategia=args.case_estrategia, inline=args.inline,
+                          avaliacao_constante=args.avaliacao_constante,
+                          recursao_cauda=args.recursao_cauda,
+                          eliminar_codigo_morto=args.eliminar_codigo_morto,
+                          tabela_strings=args.tabela_strings, desenrolar=args.desenrolar,
+                          reducao_inducao=args.reducao_inducao)
+            gen = compilar(result, **opcoes)
             out = caminho_ficheiro.rsplit('.', 1)[0] + '.vm'
             gen.write(out)
             print(f"Código gerado em: {out}")
+            avaliadas = gen.stats.get('avaliadas')
+            if avaliadas:
+                lista = ', '.join(f"{nome} ({n}x)" for nome, n in avaliadas.items())
+                print(f"Chamadas avaliadas na compilação: {lista}")
+            expandidas = gen.stats.get('inline')
+            if expandidas:
+                # Compara com o código gerado sem expansão em linha
+                sem_inline = compilar(result, **dict(opcoes, inline=False))
+                lista = ', '.join(f"{nome} ({n}x)" for nome, n in expandidas.items())
+                print(f"Expandidas em linha: {lista}; instruções: "
+                      f"{sem_inline.cfg.tamanho()} -> {gen.cfg.tamanho()}")
+            for nome, (forma, entradas, celulas) in gen.stats.get('memo', {}).items():
+                print(f"{{$MEMO}} {nome}: {forma} com {entradas} entradas ({celulas} células)")
+            morto = gen.stats.get('codigo_morto')
+            if morto:
+                # Compara com o código gerado sem a eliminação
+                completo = compilar(result, **dict(opcoes, eliminar_codigo_morto=False))
+                partes = [f"{k}: {', '.join(v)}" for k, v in morto.items() if v]
+                print(f"Código morto retirado ({'; '.join(partes)}); instruções: "
+                      f"{completo.cfg.tamanho()} -> {gen.cfg.tamanho()}; células globais: "
+                      f"{completo.stats['globais']} -> {gen.stats['globais']}")
+            desenrolados = gen.stats.get('desenrolados')
+            if desenrolados:
+                # Compara com o código gerado sem desenrolar os ciclos
+                enrolado = compilar(result, **dict(opcoes, desenrolar=False))
+                print(f"Ciclos for desenrolados: {desenrolados['completos']} completos, "
+                      f"{desenrolados['parciais']} parciais; instruções: "
+                      f"{enrolado.cfg.tamanho()} -> {gen.cfg.tamanho()}")
+            bases = gen.stats.get('bases_deslocadas')
+            if bases:
+                # Compara com o código gerado com a subtração do limite inferior
+                sem_desvio = compilar(result, **dict(opcoes, base_deslocada=False))
+                print(f"Arrays com a base deslocada: {bases['arrays']} ({bases['livres']} células "
+                      f"livres); instruções: {sem_desvio.cfg.tamanho()} -> {gen.cfg.tamanho()}")
+            inducao = gen.stats.get('inducao')
+            if inducao:
+                print(f"Variáveis de indução: {inducao['auxiliares']} auxiliares em {inducao['ciclos']} "
+                      f"ciclos ({inducao['testes']} controlados por uma delas); "
+                      f"{inducao['acessos']} índices e produtos sem SUB/MUL")
+            strings = gen.stats.get('strings')
+            sem_tabela = None
+            if strings:
+                # Compara o tamanho do código e os PUSHS com o gerado com um PUSHS em cada
+                # ocorrência (e, com --executar ou --perfil, as strings criadas na execução)
+                sem_tabela = compilar(result, **dict(opcoes, tabela_strings=False))
+                print(f"Tabela de strings: {strings['literais']} literais em "
+                      f"{strings['ocorrencias']} ocorrências; tamanho do código: "
+                      f"{tamanho_codigo(sem_tabela)} -> {tamanho_codigo(gen)} carácteres; "
+                      f"PUSHS: {contar_pushs(sem_tabela)} -> {contar_pushs(gen)}")
+            reutilizadas = gen.stats.get('cfg', {}).get('passos', {}).get('reutilizar_valores')
+            if reutilizadas:
+                print(f"Subexpressões repetidas substituídas por DUP: {reutilizadas} instruções retiradas")
+            display = gen.stats.get('display')
+            if display:
+                print(f"Display: encaixe até ao nível {display['profundidade']}, "
+                      f"{display['acessos']} acessos a variáveis de sub-rotinas exteriores")
+            cauda = gen.stats.get('chamadas_cauda')
+            if cauda:
+                lista = ', '.join(f"{nome} ({n}x)" for nome, n in cauda.items())
+                print(f"Chamadas recursivas de cauda compiladas como salto: {lista}")
+            entrada = '' if sys.stdin.isatty() or not (args.executar or args.perfil) else sys.stdin.read()
+            if args.executar:
+                try:
+                    maquina = MaquinaRapida if args.maquina == 'rapida' else MaquinaVirtual
+                    res = maquina('\n'.join(gen.lines()), entrada).executar()
+                    sys.stdout.write(res.saida)
+                    pilha = '' if res.max_pilha is None else f"pilha máxima: {res.max_pilha} células; "
+                    print(f"Execução: {res.passos} instruções executadas; {pilha}"
+                          f"heap: {res.heap} células")
+                except ErroVM as e:
+                    print(f"Erro de execução: {e}")
+            base = caminho_ficheiro.rsplit('.', 1)[0]
+            if args.mapa:
+                gen.write_map(base + '.mapa.json')
+                print(f"Mapa de fontes gravado em: {base}.mapa.json")
+            if args.perfil:
+                try:
+                    _, perfil = perfilar('\n'.join(gen.lines()), gen.mapa(), entrada)
+                    gravar(perfil, codigo, base)
+                    print(perfil.resumo())
+                    print(f"Perfil gravado em: {base}.perfil.txt e {base}.folded")
+                except ErroVM as e:
+                    print(f"Erro de execução: {e}")
+            if sem_tabela is not None and (args.executar or args.perfil):
+                criadas = strings_criadas((sem_tabela, gen), entrada)
+                if criadas is not None:
+                    print(f"Tabela de strings: strings criadas na execução: {criadas[0]} -> {criadas[1]}")
+            if args.ri:
+                out_ri = caminho_ficheiro.rsplit('.', 1)[0] + '.ri.json'
+                gen.write_ir(out_ri)
+                print(f"Representação intermédia gravada em: {out_ri}")
     except SemanticError as e:
         print(e)
+    except ErroCompilacao as e:
+        print(f"Erro de compilação: {e}")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
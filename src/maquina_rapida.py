@@ -0,0 +1,485 @@
+import math
+
+from representacao_intermedia import Op, INTEIRO_MIN, INTEIRO_MAX
+from maquina_virtual import ErroVM, Resultado, carregar, dividir, resto, inteiro, texto_real
+
+# Máquina rápida da EWVM (código encadeado).
+# O programa é pré-descodificado uma vez numa lista de handlers (closures), um por
+# posição do programa, com os operandos e os destinos dos saltos já resolvidos; cada
+# handler executa a sua instrução e devolve o índice do próximo, e o ciclo principal
+# resume-se a 'pc = codigo[pc]()'. As sequências frequentes do código gerado (ex:
+# PUSHG x; PUSHI k; ADD; STOREG x) são fundidas em superinstruções: um só handler executa
+# a sequência inteira, sem passar os valores intermédios pela pilha.
+#
+# O código de cada handler é gerado em Python a partir das instruções da sequência (ver
+# FonteHandler) e compilado uma vez por forma diferente; os operandos de cada ocorrência
+# são ligados como variáveis da closure.
+#
+# Diferenças em relação ao interpretador de referência (maquina_virtual), que continua a
+# ser o que verifica os programas:
+#   - não há verificação do tipo dos operandos: um programa mal formado pode dar um
+#     resultado diferente em vez de um erro (ex: WRITEI de um real);
+#   - os endereços são inteiros: a pilha começa no endereço 0 e a heap (uma única lista
+#     com os blocos seguidos, sem verificação dos limites de cada bloco) em BASE_HEAP;
+#   - o número de instruções executadas é exato, mas o limite de passos é verificado
+#     por handler e no fim; o tamanho da pilha só é verificado em CALL e PUSHN, e a pilha
+#     máxima e as strings criadas não são medidas.
+
+# Endereço da primeira célula da heap
+BASE_HEAP = 1 << 40
+
+# Classes de instruções usadas nos padrões das superinstruções
+VALOR = frozenset((Op.PUSHI, Op.PUSHG, Op.PUSHL))
+ARITMETICA = frozenset((Op.ADD, Op.SUB, Op.MUL))
+COMPARACAO = frozenset((Op.INF, Op.INFEQ, Op.SUP, Op.SUPEQ, Op.EQUAL))
+GUARDAR = frozenset((Op.STOREG, Op.STOREL))
+
+# Sequências fundidas numa superinstrução, pela ordem em que são tentadas (as mais longas
+# primeiro). Escolhidas pela frequência com que são executadas nos testes e benchmarks.
+SUPERINSTRUCOES = (
+    (VALOR, VALOR, ARITMETICA, GUARDAR),            # x := y + z, i := i + 1
+    (VALOR, VALOR, COMPARACAO, {Op.JZ}),            # while i <= n, if a = b
+    (VALOR, {Op.CHECK}, {Op.ADD}, {Op.LOADN}),      # a[i] (sem multiplicação)
+    (VALOR, {Op.CHECK}, VALOR, ARITMETICA),         # i * passo (com verificação)
+    (VALOR, VALOR, ARITMETICA),
+    (VALOR, VALOR, COMPARACAO),
+    (COMPARACAO, {Op.JZ}),
+    (VALOR, ARITMETICA),
+    (VALOR, GUARDAR),
+    (VALOR, {Op.CHECK}),
+    ({Op.ADD}, {Op.LOADN}),
+    (GUARDAR, {Op.JUMP}),
+    (VALOR, VALOR),
+)
+
+# Instruções cujo código gerado depende do operando (e não só do seu valor)
+FORMA_COM_OPERANDO = frozenset((Op.POP, Op.DUP))
+
+# Operadores das instruções binárias: modelo da expressão e se o resultado é uma condição
+# (um bool do Python, que só passa a 0/1 quando é empilhado)
+BINARIAS = {
+    Op.ADD: ('({a} + {b})', False), Op.SUB: ('({a} - {b})', False),
+    Op.MUL: ('({a} * {b})', False), Op.DIV: ('dividir({a}, {b})', False),
+    Op.MOD: ('resto({a}, {b})', False),
+    Op.INF: ('({a} < {b})', True), Op.INFEQ: ('({a} <= {b})', True),
+    Op.SUP: ('({a} > {b})', True), Op.SUPEQ: ('({a} >= {b})', True),
+    Op.EQUAL: ('({a} == {b})', True),
+    Op.AND: ('({a} != 0 and {b} != 0)', True), Op.OR: ('({a} != 0 or {b} != 0)', True),
+    Op.FADD: ('({a} + {b})', False), Op.FSUB: ('({a} - {b})', False),
+    Op.FMUL: ('({a} * {b})', False), Op.FDIV: ('({a} / {b})', False),
+    Op.FINF: ('({a} < {b})', True), Op.FINFEQ: ('({a} <= {b})', True),
+    Op.FSUP: ('({a} > {b})', True), Op.FSUPEQ: ('({a} >= {b})', True),
+    Op.PADD: ('({a} + {b})', False), Op.CONCAT: ('({a} + {b})', False),
+}
+
+# Instruções binárias com um resultado inteiro, verificado contra os limites dos inteiros
+INTEIRAS = frozenset((Op.ADD, Op.SUB, Op.MUL, Op.DIV))
+
+# Operações de um operando: modelo da expressão e se o resultado é uma condição
+UNARIAS = {
+    Op.NOT: ('({a} == 0)', True), Op.FCOS: ('cos({a})', False), Op.FSIN: ('sin({a})', False),
+    Op.CHRCODE: ('codigo_char({a})', False), Op.STRLEN: ('len({a})', False),
+    Op.ATOI: ('atoi({a})', False), Op.ATOF: ('atof({a})', False),
+    Op.ITOF: ('float({a})', False), Op.FTOI: ('ftoi({a})', False),
+    Op.STRI: ('str({a})', False), Op.STRF: ('texto_real({a})', False),
+}
+
+# Escritas: modelo do texto escrito
+ESCRITAS = {
+    Op.WRITEI: 'str({a})', Op.WRITEF: 'texto_real({a})', Op.WRITES: '{a}',
+    Op.WRITECHR: 'chr({a})',
+}
+
+
+# Exceção usada pelo STOP para terminar o ciclo principal
+class Parar(Exception):
+    pass
+
+
+# Funções auxiliares usadas pelo código dos handlers
+def codigo_char(s):
+    return ord(s[0]) if s else 0
+
+
+def carater(s, i):
+    if not 0 <= i < len(s):
+        raise ErroVM(f"CHARAT: índice {i} fora da string")
+    return ord(s[i])
+
+
+def atoi(s):
+    try:
+        v = int(s.strip())
+    except ValueError:
+        raise ErroVM(f"ATOI: '{s}' não é um inteiro")
+    return inteiro('ATOI', v)
+
+
+def atof(s):
+    try:
+        return float(s.strip())
+    except ValueError:
+        raise ErroVM(f"ATOF: '{s}' não é um real")
+
+
+def ftoi(x):
+    if not math.isfinite(x):
+        raise ErroVM(f"FTOI: {x} não tem parte inteira")
+    return inteiro('FTOI', int(x))
+
+
+def falhar_check(limites, v):
+    raise ErroVM(f"CHECK {limites[0]},{limites[1]}: índice {v} fora dos limites")
+
+
+# Nomes globais visíveis no código dos handlers
+AMBIENTE = {
+    'ErroVM': ErroVM, 'Parar': Parar, 'H': BASE_HEAP, 'dividir': dividir, 'resto': resto,
+    'inteiro': inteiro, 'texto_real': texto_real, 'cos': math.cos, 'sin': math.sin,
+    'codigo_char': codigo_char, 'carater': carater, 'atoi': atoi, 'atof': atof, 'ftoi': ftoi,
+    'falhar_check': falhar_check,
+}
+
+
+# Gera o código Python do handler de uma sequência de instruções. Os valores empilhados
+# pelas instruções da sequência ficam como expressões pendentes (sem efeitos: constantes,
+# leituras de células e variáveis temporárias) e são usados diretamente pelas instruções
+# seguintes; só o que fica no fim (ou antes de uma instrução que altere a memória) é
+# empilhado de facto.
+#
+# Variáveis do handler: m (pilha), h (heap), r (registos: r[0] é o fp), ch (pilha de
+# chamadas), e (e[0]: instruções executadas além de uma por handler), escrever e ler
+# (output e input), A<i> (operando da instrução i) e P (índice da instrução seguinte).
+class FonteHandler:
+    def __init__(self):
+        self.linhas = []
+        self.pendentes = []
+        self.temporarias = 0
+
+    def emitir(self, linha):
+        self.linhas.append(linha)
+
+    def temporaria(self, expressao):
+        nome = f"t{self.temporarias}"
+        self.temporarias += 1
+        self.emitir(f"{nome} = {expressao}")
+        return nome
+
+    # Empilha uma expressão pendente ('condicao': é um bool que só passa a 0/1 na pilha)
+    def empilhar(self, expressao, condicao=False):
+        self.pendentes.append((expressao, condicao))
+
+    # Expressão do valor do topo da pilha (pendente ou retirado da pilha da máquina); uma
+    # condição passa a 0/1, a não ser que quem a usa só precise do seu valor lógico
+    def desempilhar(self, logico=False):
+        if self.pendentes:
+            expressao, condicao = self.pendentes.pop()
+            return f"int({expressao})" if condicao and not logico else expressao
+        return self.temporaria('pop()')
+
+    # Empilha de facto as expressões pendentes, pela ordem em que foram empilhadas
+    def descarregar(self):
+        for expressao, condicao in self.pendentes:
+            self.emitir(f"push(int({expressao}))" if condicao else f"push({expressao})")
+        self.pendentes = []
+
+    # Expressão que lê a célula do endereço 'x' (variável), na pilha ou na heap
+    @staticmethod
+    def ler(x):
+        return f"(m[{x}] if {x} < H else h[{x} - H])"
+
+    def escrever_celula(self, x, v):
+        self.emitir(f"if {x} < H: m[{x}] = {v}")
+        self.emitir(f"else: h[{x} - H] = {v}")
+
+    # Temporária com o resultado de uma instrução inteira, verificado (como em CHECK) contra
+    # os limites dos inteiros de 64 bits no ponto em que a instrução é executada
+    def inteiro(self, op, expressao):
+        t = self.temporaria(expressao)
+        self.emitir(f"if not {INTEIRO_MIN} <= {t} <= {INTEIRO_MAX}: inteiro('{op.name}', {t})")
+        return t
+
+    # Gera o código da instrução 'op' (i-ésima da sequência, com o operando 'arg').
+    # Devolve True se a instrução termina o handler (com um return).
+    def instrucao(self, i, op, arg):
+        a = f"A{i}"
+        if op in (Op.PUSHI, Op.PUSHF, Op.PUSHS, Op.PUSHA):
+            self.empilhar(a)
+        elif op == Op.PUSHG:
+            self.empilhar(f"m[{a}]")
+        elif op == Op.PUSHL:
+            self.empilhar(f"m[r[0] + {a}]")
+        elif op == Op.PUSHGP:
+            self.empilhar('0')
+        elif op == Op.PUSHFP:
+            self.empilhar(self.temporaria('r[0]'))
+        elif op == Op.PUSHSP:
+            self.descarregar()
+            self.emitir('push(len(m))')
+        elif op == Op.PUSHN:
+            self.descarregar()
+            self.emitir(f"m.extend([0] * {a})")
+            self.emitir("if len(m) > LIMITE_PILHA: raise ErroVM('Pilha esgotada (stack overflow)')")
+        elif op == Op.LOAD:
+            x = self.temporaria(f"{self.desempilhar()} + {a}")
+            self.empilhar(self.temporaria(self.ler(x)))
+        elif op == Op.LOADN:
+            k = self.desempilhar()
+            x = self.temporaria(f"{self.desempilhar()} + {k}")
+            self.empilhar(self.temporaria(self.ler(x)))
+        elif op == Op.DUP and arg == 1 and self.pendentes:
+            v = self.pendentes.pop()[0]
+            if not v.isidentifier():
+                v = self.temporaria(v)
+            self.empilhar(v)
+            self.empilhar(v)
+        elif op == Op.DUP:
+            self.descarregar()
+            self.emitir(f"m.extend(m[-{a}:])")
+        elif op == Op.DUPN:
+            k = self.temporaria(self.desempilhar())
+            self.descarregar()
+            self.emitir(f"m.extend(m[-{k}:])")
+        elif op == Op.POP and arg <= len(self.pendentes):
+            if arg:
+                del self.pendentes[-arg:]
+        elif op in (Op.POP, Op.POPN):
+            k = a if op == Op.POP else self.temporaria(self.desempilhar())
+            self.descarregar()
+            self.emitir(f"del m[len(m) - {k}:]")
+        elif op in (Op.STOREG, Op.STOREL):
+            v = self.desempilhar()
+            self.descarregar()
+            self.emitir(f"m[{a}] = {v}" if op == Op.STOREG else f"m[r[0] + {a}] = {v}")
+        elif op in (Op.STORE, Op.STOREN):
+            v = self.temporaria(self.desempilhar())
+            k = a if op == Op.STORE else self.desempilhar()
+            x = self.temporaria(f"{self.desempilhar()} + {k}")
+            self.descarregar()
+            self.escrever_celula(x, v)
+        elif op == Op.SWAP:
+            if len(self.pendentes) >= 2:
+                self.pendentes[-1], self.pendentes[-2] = self.pendentes[-2], self.pendentes[-1]
+            else:
+                self.descarregar()
+                self.emitir('m[-1], m[-2] = m[-2], m[-1]')
+        elif op == Op.CHECK:
+            v = self.desempilhar()
+            if not v.isidentifier():
+                v = self.temporaria(v)
+            self.emitir(f"if not {a}[0] <= {v} <= {a}[1]: falhar_check({a}, {v})")
+            self.empilhar(v)
+        elif op in (Op.ALLOC, Op.ALLOCN):
+            k = a if op == Op.ALLOC else self.temporaria(self.desempilhar())
+            x = self.temporaria('H + len(h)')
+            self.emitir(f"h.extend([0] * {k})")
+            self.empilhar(x)
+        elif op == Op.FREE:
+            self.desempilhar()
+        elif op in BINARIAS:
+            modelo, condicao = BINARIAS[op]
+            b = self.desempilhar()
+            expressao = modelo.format(a=self.desempilhar(), b=b)
+            if op in INTEIRAS:
+                expressao = self.inteiro(op, expressao)
+            self.empilhar(expressao, condicao)
+        elif op in UNARIAS:
+            modelo, condicao = UNARIAS[op]
+            self.empilhar(modelo.format(a=self.desempilhar()), condicao)
+        elif op == Op.CHARAT:
+            i_ = self.desempilhar()
+            self.empilhar(f"carater({self.desempilhar()}, {i_})")
+        elif op in ESCRITAS:
+            self.emitir(f"escrever({ESCRITAS[op].format(a=self.desempilhar())})")
+        elif op == Op.WRITELN:
+            self.emitir("escrever('\\n')")
+        elif op == Op.READ:
+            self.empilhar(self.temporaria('ler()'))
+        elif op == Op.ERR:
+            self.emitir(f"raise ErroVM({a})")
+            return True
+        elif op == Op.JUMP:
+            self.descarregar()
+            self.emitir(f"return {a}")
+            return True
+        elif op == Op.JZ:
+            c = self.desempilhar(logico=True)
+            if self.pendentes:
+                c = self.temporaria(c)
+                self.descarregar()
+            self.emitir(f"if {c}: return P")
+            self.emitir(f"return {a}")
+            return True
+        elif op == Op.CALL:
+            destino = self.temporaria(self.desempilhar())
+            self.descarregar()
+            self.emitir('ch.append((P, r[0]))')
+            self.emitir("if len(ch) > LIMITE_PILHA: raise ErroVM('Pilha de chamadas esgotada (stack overflow)')")
+            self.emitir('r[0] = len(m)')
+            self.emitir(f"return {destino}")
+            return True
+        elif op == Op.RETURN:
+            self.descarregar()
+            self.emitir('del m[r[0]:]')
+            self.emitir('destino, r[0] = ch.pop()')
+            self.emitir('return destino')
+            return True
+        elif op == Op.START:
+            self.descarregar()
+            self.emitir('r[0] = len(m)')
+        elif op == Op.STOP:
+            self.descarregar()
+            self.emitir('raise Parar')
+            return True
+        elif op != Op.NOP:
+            raise ErroVM(f"Instrução não suportada: {op.name}")
+        return False
+
+    # Código da função que cria o handler da sequência 'ops' (lista de pares (op, arg));
+    # 'extra' é o número de instruções executadas além de uma
+    def fabrica(self, ops, extra):
+        terminou = False
+        for i, (op, arg) in enumerate(ops):
+            terminou = self.instrucao(i, op, arg)
+        if not terminou:
+            self.descarregar()
+            self.emitir('return P')
+        if extra:
+            self.linhas.insert(0, f"e[0] += {extra}")
+        operandos = ''.join(f", A{i}" for i in range(len(ops)))
+        nome = '_'.join(op.name for op, _ in ops)
+        corpo = ''.join(f"\n        {linha}" for linha in self.linhas)
+        return (f"def fabrica(m, h, r, ch, e, escrever, ler, LIMITE_PILHA, P{operandos}):\n"
+                f"    push = m.append\n"
+                f"    pop = m.pop\n"
+                f"    def {nome}():{corpo}\n"
+                f"    return {nome}\n")
+
+
+# Funções que criam os handlers, por forma da sequência de instruções (partilhadas por
+# todas as máquinas)
+_fabricas = {}
+
+
+# Função que cria o handler da sequência 'ops' (compilada na primeira vez que é pedida)
+def fabrica(ops, extra):
+    forma = (tuple((op, arg if op in FORMA_COM_OPERANDO else None) for op, arg in ops), extra)
+    f = _fabricas.get(forma)
+    if f is None:
+        ambiente = dict(AMBIENTE)
+        exec(FonteHandler().fabrica(ops, extra), ambiente)
+        f = _fabricas[forma] = ambiente['fabrica']
+    return f
+
+
+# Índices das instruções que podem ser o destino de um salto ou de um regresso: destinos
+# de JUMP/JZ, endereços empilhados por PUSHA e instruções a seguir a um CALL
+def destinos(programa):
+    alvos = {0}
+    for i, (op, arg) in enumerate(programa):
+        if op in (Op.JUMP, Op.JZ, Op.PUSHA):
+            alvos.add(arg)
+        elif op == Op.CALL:
+            alvos.add(i + 1)
+    return alvos
+
+
+# Divide o programa nas sequências executadas por cada handler: lista de (início, ops),
+# em que ops é a lista de (op, arg) da sequência. Uma sequência não inclui destinos de
+# saltos a não ser na primeira instrução; as posições dentro de uma superinstrução também
+# têm o handler da sua instrução isolada (não são alcançadas).
+def sequencias(programa):
+    alvos = destinos(programa)
+    resultado = []
+    for i, (op, arg) in enumerate(programa):
+        escolhida = [(op, arg)]
+        for padrao in SUPERINSTRUCOES:
+            n = len(padrao)
+            if i + n <= len(programa) and all(programa[i + k][0] in padrao[k] for k in range(n)) \
+                    and not any(i + k in alvos for k in range(1, n)):
+                escolhida = list(programa[i:i + n])
+                break
+        resultado.append((i, escolhida))
+    return resultado
+
+
+# Segue uma cadeia de saltos incondicionais a partir da instrução 'i': devolve o índice
+# da primeira instrução que não é um JUMP e o número de JUMPs seguidos
+def seguir_saltos(programa, i):
+    saltos = 0
+    while i < len(programa) and programa[i][0] == Op.JUMP and saltos < len(programa):
+        i = programa[i][1]
+        saltos += 1
+    return i, saltos
+
+
+class MaquinaRapida:
+    # Os argumentos são os mesmos de MaquinaVirtual (sem contar). O programa é carregado
+    # e dividido em sequências uma vez; cada execução liga os handlers a memória nova.
+    def __init__(self, programa, entrada='', max_passos=100_000_000, max_pilha=1_000_000):
+        self.programa = carregar(programa) if isinstance(programa, str) else programa
+        self.entrada = entrada.splitlines() if isinstance(entrada, str) else list(entrada)
+        self.max_passos = max_passos
+        self.max_pilha = max_pilha
+        self.plano = []
+        for i, ops in sequencias(self.programa):
+            proximo = i + len(ops)
+            extra = len(ops) - 1
+            op, arg = ops[-1]
+            if op == Op.JUMP:
+                # Um salto para outro salto vai diretamente para o fim da cadeia, e um salto
+                # para um RETURN é o próprio RETURN (as instruções saltadas contam na mesma)
+                destino, saltos = seguir_saltos(self.programa, arg)
+                extra += saltos
+                if destino < len(self.programa) and self.programa[destino][0] == Op.RETURN:
+                    ops = ops[:-1] + [self.programa[destino]]
+                    extra += 1
+                else:
+                    ops = ops[:-1] + [(Op.JUMP, destino)]
+            self.plano.append((ops, extra, proximo))
+
+    # Nome da instrução na posição 'pc' (para as mensagens de erro)
+    def nome(self, pc):
+        return self.programa[pc][0].name if 0 <= pc < len(self.programa) else 'fim do código'
+
+    # Executa o programa desde a primeira instrução até ao STOP e devolve um Resultado
+    def executar(self):
+        m, h, r, ch, e = [], [], [0], [], [0]
+        saida = []
+        entrada = iter(self.entrada)
+
+        def ler():
+            try:
+                return next(entrada)
+            except StopIteration:
+                raise ErroVM("READ sem input disponível")
+
+        codigo = [fabrica(ops, extra)(m, h, r, ch, e, saida.append, ler, self.max_pilha,
+                                      proximo, *(arg for _, arg in ops))
+                  for ops, extra, proximo in self.plano]
+        codigo.append(None)
+
+        pc = n = 0
+        try:
+            for n in range(self.max_passos):
+                pc = codigo[pc]()
+            raise ErroVM(f"Limite de {self.max_passos} passos excedido")
+        except Parar:
+            pass
+        except IndexError:
+            raise ErroVM(f"Acesso fora da memória ou pilha vazia na instrução {pc} ({self.nome(pc)})")
+        except TypeError:
+            if codigo[pc] is None:
+                raise ErroVM("Fim do código sem STOP")
+            raise ErroVM(f"Operando ilegal na instrução {pc} ({self.nome(pc)})")
+        except ZeroDivisionError:
+            raise ErroVM("Divisão por zero")
+        passos = n + 1 + e[0]
+        if passos > self.max_passos:
+            raise ErroVM(f"Limite de {self.max_passos} passos excedido")
+        return Resultado(''.join(saida), passos, None, None, len(h), None, None)
+
+
+# Carrega e executa um programa .vm (texto) na máquina rápida com o input 'entrada'
+def executar(texto, entrada='', **opcoes):
+    return MaquinaRapida(texto, entrada, **opcoes).executar()
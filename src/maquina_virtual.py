@@ -0,0 +1,519 @@
+import argparse
+import math
+import sys
+
+from representacao_intermedia import Op, OPERANDO, SEM_OPERANDO, INTEIRO, REAL, TEXTO, PAR, cabe_inteiro
+
+# Interpretador de referência da EWVM.
+# Executa o código produzido pelo CodeGenerator (ficheiros .vm) sem depender da ferramenta
+# web: lê o programa em texto, resolve as etiquetas e interpreta instrução a instrução, com
+# o input dado como texto (uma leitura por linha), a saída devolvida como texto, contadores
+# das instruções executadas (também por pilha de chamadas, para o perfil de execução, ver
+# perfil.py) e um limite de passos (um ciclo infinito termina com erro).
+#
+# Modelo de memória (como na EWVM):
+#   - os valores têm tipo: inteiros, reais, strings e endereços; cada instrução verifica o
+#     tipo dos operandos (ex: ADD só soma inteiros, FADD só soma reais, LOADN precisa de um
+#     endereço) e um operando ilegal termina a execução com erro;
+#   - os inteiros têm 64 bits (os limites dos operandos inteiros, ver cabe_inteiro) e uma
+#     instrução com um resultado inteiro fora desses limites termina a execução com erro;
+#   - a pilha de operandos guarda também as variáveis globais (gp aponta para a célula 0)
+#     e as frames das sub-rotinas (fp aponta para a base da frame atual); CALL guarda pc e
+#     fp na pilha de chamadas e faz fp = sp, RETURN repõe sp = fp, fp e pc;
+#   - a heap de estruturas é formada por blocos (ALLOC/ALLOCN) e um acesso fora do bloco
+#     é um erro; as strings são guardadas diretamente como valores.
+
+
+class ErroVM(Exception):
+    pass
+
+
+# Endereço da EWVM: segmento ('pilha', 'heap' ou 'codigo'), bloco da heap (None nos
+# outros segmentos) e índice da célula (ou da instrução) dentro do segmento/bloco
+class Endereco:
+    __slots__ = ('segmento', 'bloco', 'indice')
+
+    def __init__(self, segmento, bloco, indice):
+        self.segmento = segmento
+        self.bloco = bloco
+        self.indice = indice
+
+    # Endereço 'k' células à frente deste
+    def mais(self, k):
+        return Endereco(self.segmento, self.bloco, self.indice + k)
+
+    def __eq__(self, outro):
+        return isinstance(outro, Endereco) and self.segmento == outro.segmento \
+            and self.bloco == outro.bloco and self.indice == outro.indice
+
+    def __hash__(self):
+        return hash((self.segmento, self.bloco, self.indice))
+
+    def __repr__(self):
+        bloco = '' if self.bloco is None else f"#{self.bloco}"
+        return f"@{self.segmento}{bloco}[{self.indice}]"
+
+
+# Lê o literal de uma string entre aspas (aspas internas duplicadas, como em texto_instrucao)
+def ler_string(texto):
+    texto = texto.strip()
+    if len(texto) < 2 or texto[0] != '"' or texto[-1] != '"':
+        raise ErroVM(f"String mal formada: {texto}")
+    return texto[1:-1].replace('""', '"')
+
+
+# Converte o texto de um ficheiro .vm numa lista de instruções (Op, operando), com as
+# etiquetas resolvidas para índices de instrução
+def carregar(texto):
+    instrucoes = []
+    etiquetas = {}
+    pendentes = []
+    for n, linha in enumerate(texto.splitlines(), 1):
+        linha = linha.strip()
+        if not linha or linha.startswith('//'):
+            continue
+        # Etiquetas ("NOME:") podem preceder uma instrução na mesma linha
+        while not linha.startswith('"'):
+            fim = linha.find(':')
+            if fim <= 0 or ' ' in linha[:fim] or '"' in linha[:fim]:
+                break
+            etiquetas[linha[:fim]] = len(instrucoes)
+            linha = linha[fim + 1:].strip()
+        if not linha:
+            continue
+        partes = linha.split(None, 1)
+        try:
+            op = Op[partes[0].upper()]
+        except KeyError:
+            raise ErroVM(f"Instrução desconhecida na linha {n}: {partes[0]}")
+        tipo = OPERANDO[op]
+        resto = partes[1] if len(partes) > 1 else ''
+        try:
+            if tipo == SEM_OPERANDO:
+                arg = None
+            elif tipo == INTEIRO:
+                arg = int(resto)
+            elif tipo == REAL:
+                arg = float(resto)
+            elif tipo == TEXTO:
+                arg = ler_string(resto)
+            elif tipo == PAR:
+                a, b = resto.split(',')
+                arg = (int(a), int(b))
+            else:
+                arg = resto.strip()
+                pendentes.append((len(instrucoes), arg, n))
+        except ValueError:
+            raise ErroVM(f"Operando inválido na linha {n}: {linha}")
+        instrucoes.append([op, arg])
+    for i, nome, n in pendentes:
+        if nome not in etiquetas:
+            raise ErroVM(f"Etiqueta não definida na linha {n}: {nome}")
+        instrucoes[i][1] = etiquetas[nome]
+    return [tuple(i) for i in instrucoes]
+
+
+# Divisão inteira com truncagem para zero (semântica de div do Pascal) e o resto
+# correspondente (com o sinal do dividendo, como o mod do Pascal)
+def dividir(a, b):
+    if b == 0:
+        raise ErroVM("Divisão por zero")
+    q = abs(a) // abs(b)
+    return q if (a >= 0) == (b >= 0) else -q
+
+
+def resto(a, b):
+    return a - b * dividir(a, b)
+
+
+# Resultado inteiro de uma instrução, que tem de caber nos inteiros de 64 bits da máquina
+def inteiro(nome, v):
+    if not cabe_inteiro(v):
+        raise ErroVM(f"{nome}: resultado {v} fora dos limites dos inteiros de 64 bits")
+    return v
+
+
+# Escrita de um real (WRITEF e STRF)
+def texto_real(x):
+    return repr(float(x))
+
+
+# Resultado de uma execução
+class Resultado:
+    def __init__(self, saida, passos, contagens, max_pilha, heap, strings, max_chamadas,
+                 perfil=None):
+        # Texto escrito pelo programa
+        self.saida = saida
+        # Número total de instruções executadas
+        self.passos = passos
+        # Número de execuções de cada instrução (lista indexada pela posição no programa),
+        # se pedido com contar=True
+        self.contagens = contagens
+        # Tamanho máximo atingido pela pilha de operandos (em células); este e os outros
+        # campos que não são medidos pela máquina rápida (maquina_rapida) ficam None
+        self.max_pilha = max_pilha
+        # Células da heap de estruturas alocadas (ALLOC/ALLOCN)
+        self.heap = heap
+        # Número de strings criadas (PUSHS, READ, STRI, STRF, CONCAT)
+        self.strings = strings
+        # Profundidade máxima da pilha de chamadas
+        self.max_chamadas = max_chamadas
+        # Número de execuções de cada instrução por pilha de chamadas, se pedido com
+        # perfil=True: (entradas, posição) -> execuções, em que 'entradas' é o tuplo das
+        # posições onde começam as sub-rotinas chamadas e ainda em curso
+        self.perfil = perfil
+
+    def __repr__(self):
+        return (f"<Resultado passos={self.passos} max_pilha={self.max_pilha} "
+                f"heap={self.heap} strings={self.strings}>")
+
+
+class MaquinaVirtual:
+    # programa: texto .vm ou lista de instruções já carregada; entrada: texto (uma leitura
+    # por linha) ou lista de linhas; max_passos e max_pilha: limites da execução; contar:
+    # conta as execuções de cada instrução; perfil: conta-as por pilha de chamadas
+    def __init__(self, programa, entrada='', max_passos=100_000_000, max_pilha=1_000_000,
+                 contar=False, perfil=False):
+        self.programa = carregar(programa) if isinstance(programa, str) else programa
+        self.entrada = entrada.splitlines() if isinstance(entrada, str) else list(entrada)
+        self.max_passos = max_passos
+        self.max_pilha = max_pilha
+        self.contar = contar
+        self.perfil = perfil
+
+    # Verifica o tipo de um operando da instrução 'op' e devolve-o
+    @staticmethod
+    def operando(op, valor, tipo):
+        if tipo is not object and type(valor) is not tipo:
+            nomes = {int: 'inteiro', float: 'real', str: 'string', Endereco: 'endereço'}
+            raise ErroVM(f"{op.name}: operando ilegal {valor!r} (esperado {nomes[tipo]})")
+        return valor
+
+    # Lista de células e índice apontados por um endereço de dados, verificando os limites
+    def celula(self, op, endereco):
+        self.operando(op, endereco, Endereco)
+        if endereco.segmento == 'pilha':
+            memoria = self.pilha
+        elif endereco.segmento == 'heap':
+            memoria = self.blocos[endereco.bloco]
+        else:
+            raise ErroVM(f"{op.name}: {endereco!r} não é um endereço de dados")
+        if not 0 <= endereco.indice < len(memoria):
+            raise ErroVM(f"{op.name}: acesso fora da memória em {endereco!r}")
+        return memoria, endereco.indice
+
+    # Executa o programa desde a primeira instrução até ao STOP e devolve um Resultado
+    def executar(self):
+        prog = self.programa
+        self.pilha = pilha = []
+        self.blocos = blocos = []
+        chamadas = []
+        saida = []
+        entrada = iter(self.entrada)
+        contagens = [0] * len(prog) if self.contar else None
+        perfil = {} if self.perfil else None
+        # Posições de entrada das sub-rotinas em curso (só com perfil)
+        entradas = ()
+        operando, celula = self.operando, self.celula
+        pop, push = pilha.pop, pilha.append
+        pc = fp = 0
+        passos = max_pilha = max_chamadas = strings = 0
+
+        # Retira os dois operandos (b no topo) de uma operação binária do tipo 'tipo'
+        def dois(op, tipo):
+            if len(pilha) < 2:
+                raise ErroVM(f"{op.name}: pilha vazia")
+            b = operando(op, pop(), tipo)
+            return operando(op, pop(), tipo), b
+
+        # Retira o operando do topo da pilha, do tipo 'tipo'
+        def um(op, tipo):
+            if not pilha:
+                raise ErroVM(f"{op.name}: pilha vazia")
+            return operando(op, pop(), tipo)
+
+        while True:
+            if pc >= len(prog):
+                raise ErroVM("Fim do código sem STOP")
+            op, arg = prog[pc]
+            passos += 1
+            if passos > self.max_passos:
+                raise ErroVM(f"Limite de {self.max_passos} passos excedido")
+            if contagens is not None:
+                contagens[pc] += 1
+            if perfil is not None:
+                chave = (entradas, pc)
+                perfil[chave] = perfil.get(chave, 0) + 1
+            pc += 1
+            if len(pilha) > max_pilha:
+                max_pilha = len(pilha)
+                if max_pilha > self.max_pilha:
+                    raise ErroVM("Pilha esgotada (stack overflow)")
+
+            # Empilhar valores
+            if op == Op.PUSHI or op == Op.PUSHF:
+                push(arg)
+            elif op == Op.PUSHS:
+                strings += 1
+                push(arg)
+            elif op == Op.PUSHA:
+                push(Endereco('codigo', None, arg))
+            elif op == Op.PUSHN:
+                pilha.extend([0] * arg)
+            elif op == Op.PUSHG:
+                memoria, i = celula(op, Endereco('pilha', None, arg))
+                push(memoria[i])
+            elif op == Op.PUSHL:
+                memoria, i = celula(op, Endereco('pilha', None, fp + arg))
+                push(memoria[i])
+            elif op == Op.PUSHGP:
+                push(Endereco('pilha', None, 0))
+            elif op == Op.PUSHFP:
+                push(Endereco('pilha', None, fp))
+            elif op == Op.PUSHSP:
+                push(Endereco('pilha', None, len(pilha)))
+            elif op == Op.LOAD:
+                memoria, i = celula(op, um(op, Endereco).mais(arg))
+                push(memoria[i])
+            elif op == Op.LOADN:
+                k = um(op, int)
+                memoria, i = celula(op, um(op, Endereco).mais(k))
+                push(memoria[i])
+            elif op == Op.DUP or op == Op.DUPN:
+                k = arg if op == Op.DUP else um(op, int)
+                if not 0 < k <= len(pilha):
+                    raise ErroVM(f"{op.name}: pilha com menos de {k} valores")
+                pilha.extend(pilha[-k:])
+            # Retirar e guardar valores
+            elif op == Op.POP or op == Op.POPN:
+                k = arg if op == Op.POP else um(op, int)
+                if not 0 <= k <= len(pilha):
+                    raise ErroVM(f"{op.name}: pilha com menos de {k} valores")
+                del pilha[len(pilha) - k:]
+            elif op == Op.STOREG or op == Op.STOREL:
+                v = um(op, object)
+                memoria, i = celula(op, Endereco('pilha', None, arg if op == Op.STOREG else fp + arg))
+                memoria[i] = v
+            elif op == Op.STORE:
+                v = um(op, object)
+                memoria, i = celula(op, um(op, Endereco).mais(arg))
+                memoria[i] = v
+            elif op == Op.STOREN:
+                v = um(op, object)
+                k = um(op, int)
+                memoria, i = celula(op, um(op, Endereco).mais(k))
+                memoria[i] = v
+            elif op == Op.SWAP:
+                if len(pilha) < 2:
+                    raise ErroVM("SWAP: pilha vazia")
+                pilha[-1], pilha[-2] = pilha[-2], pilha[-1]
+            elif op == Op.CHECK:
+                v = operando(op, pilha[-1] if pilha else None, int)
+                if not arg[0] <= v <= arg[1]:
+                    raise ErroVM(f"CHECK {arg[0]},{arg[1]}: índice {v} fora dos limites")
+            # Heap
+            elif op == Op.ALLOC or op == Op.ALLOCN:
+                k = arg if op == Op.ALLOC else um(op, int)
+                if k < 0:
+                    raise ErroVM(f"{op.name}: tamanho inválido {k}")
+                blocos.append([0] * k)
+                push(Endereco('heap', len(blocos) - 1, 0))
+            elif op == Op.FREE:
+                um(op, Endereco)
+            # Aritmética e lógica inteira
+            elif op == Op.ADD:
+                a, b = dois(op, int); push(inteiro('ADD', a + b))
+            elif op == Op.SUB:
+                a, b = dois(op, int); push(inteiro('SUB', a - b))
+            elif op == Op.MUL:
+                a, b = dois(op, int); push(inteiro('MUL', a * b))
+            elif op == Op.DIV:
+                a, b = dois(op, int); push(inteiro('DIV', dividir(a, b)))
+            elif op == Op.MOD:
+                a, b = dois(op, int); push(resto(a, b))
+            elif op == Op.NOT:
+                push(int(um(op, int) == 0))
+            elif op == Op.INF:
+                a, b = dois(op, int); push(int(a < b))
+            elif op == Op.INFEQ:
+                a, b = dois(op, int); push(int(a <= b))
+            elif op == Op.SUP:
+                a, b = dois(op, int); push(int(a > b))
+            elif op == Op.SUPEQ:
+                a, b = dois(op, int); push(int(a >= b))
+            elif op == Op.AND:
+                a, b = dois(op, int); push(int(a != 0 and b != 0))
+            elif op == Op.OR:
+                a, b = dois(op, int); push(int(a != 0 or b != 0))
+            elif op == Op.EQUAL:
+                a, b = dois(op, object)
+                push(int(type(a) is type(b) and a == b))
+            # Aritmética de reais
+            elif op == Op.FADD:
+                a, b = dois(op, float); push(a + b)
+            elif op == Op.FSUB:
+                a, b = dois(op, float); push(a - b)
+            elif op == Op.FMUL:
+                a, b = dois(op, float); push(a * b)
+            elif op == Op.FDIV:
+                a, b = dois(op, float)
+                if b == 0:
+                    raise ErroVM("Divisão por zero")
+                push(a / b)
+            elif op == Op.FCOS:
+                push(math.cos(um(op, float)))
+            elif op == Op.FSIN:
+                push(math.sin(um(op, float)))
+            elif op == Op.FINF:
+                a, b = dois(op, float); push(int(a < b))
+            elif op == Op.FINFEQ:
+                a, b = dois(op, float); push(int(a <= b))
+            elif op == Op.FSUP:
+                a, b = dois(op, float); push(int(a > b))
+            elif op == Op.FSUPEQ:
+                a, b = dois(op, float); push(int(a >= b))
+            # Endereços e strings
+            elif op == Op.PADD:
+                k = um(op, int)
+                push(um(op, Endereco).mais(k))
+            elif op == Op.CONCAT:
+                a, b = dois(op, str)
+                strings += 1
+                push(a + b)
+            elif op == Op.CHRCODE:
+                s = um(op, str)
+                push(ord(s[0]) if s else 0)
+            elif op == Op.STRLEN:
+                push(len(um(op, str)))
+            elif op == Op.CHARAT:
+                i = um(op, int)
+                s = um(op, str)
+                if not 0 <= i < len(s):
+                    raise ErroVM(f"CHARAT: índice {i} fora da string")
+                push(ord(s[i]))
+            # Conversões
+            elif op == Op.ATOI:
+                s = um(op, str)
+                try:
+                    v = int(s.strip())
+                except ValueError:
+                    raise ErroVM(f"ATOI: '{s}' não é um inteiro")
+                push(inteiro('ATOI', v))
+            elif op == Op.ATOF:
+                s = um(op, str)
+                try:
+                    push(float(s.strip()))
+                except ValueError:
+                    raise ErroVM(f"ATOF: '{s}' não é um real")
+            elif op == Op.ITOF:
+                push(float(um(op, int)))
+            elif op == Op.FTOI:
+                x = um(op, float)
+                if not math.isfinite(x):
+                    raise ErroVM(f"FTOI: {x} não tem parte inteira")
+                push(inteiro('FTOI', int(x)))
+            elif op == Op.STRI:
+                strings += 1
+                push(str(um(op, int)))
+            elif op == Op.STRF:
+                strings += 1
+                push(texto_real(um(op, float)))
+            # Input / output
+            elif op == Op.WRITEI:
+                saida.append(str(um(op, int)))
+            elif op == Op.WRITEF:
+                saida.append(texto_real(um(op, float)))
+            elif op == Op.WRITES:
+                saida.append(um(op, str))
+            elif op == Op.WRITECHR:
+                saida.append(chr(um(op, int)))
+            elif op == Op.WRITELN:
+                saida.append('\n')
+            elif op == Op.READ:
+                try:
+                    push(next(entrada))
+                except StopIteration:
+                    raise ErroVM("READ sem input disponível")
+                strings += 1
+            elif op == Op.ERR:
+                raise ErroVM(arg)
+            # Controlo
+            elif op == Op.JUMP:
+                pc = arg
+            elif op == Op.JZ:
+                if um(op, int) == 0:
+                    pc = arg
+            elif op == Op.CALL:
+                destino = um(op, Endereco)
+                if destino.segmento != 'codigo':
+                    raise ErroVM(f"CALL: {destino!r} não é um endereço de código")
+                chamadas.append((pc, fp, entradas))
+                if perfil is not None:
+                    entradas += (destino.indice,)
+                if len(chamadas) > max_chamadas:
+                    max_chamadas = len(chamadas)
+                    if max_chamadas > self.max_pilha:
+                        raise ErroVM("Pilha de chamadas esgotada (stack overflow)")
+                fp = len(pilha)
+                pc = destino.indice
+            elif op == Op.RETURN:
+                if not chamadas:
+                    raise ErroVM("RETURN sem CALL")
+                del pilha[fp:]
+                pc, fp, entradas = chamadas.pop()
+            elif op == Op.START:
+                fp = len(pilha)
+            elif op == Op.STOP:
+                break
+            elif op != Op.NOP:
+                raise ErroVM(f"Instrução não suportada: {op.name}")
+
+        return Resultado(''.join(saida), passos, contagens, max_pilha,
+                         sum(len(b) for b in blocos), strings, max_chamadas, perfil)
+
+
+# Carrega e executa um programa .vm (texto) com o input 'entrada'
+def executar(texto, entrada='', **opcoes):
+    return MaquinaVirtual(texto, entrada, **opcoes).executar()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Interpretador de referência da EWVM")
+    ap.add_argument('ficheiro', help="ficheiro .vm a executar")
+    ap.add_argument('-i', '--input', help="ficheiro com o input do programa (uma leitura por linha); "
+                                          "sem esta opção, o input é lido do stdin")
+    ap.add_argument('--max-passos', type=int, default=100_000_000,
+                    help="número máximo de instruções executadas")
+    ap.add_argument('--rapida', action='store_true',
+                    help="executa na máquina rápida (maquina_rapida), sem verificação de tipos")
+    ap.add_argument('--stats', action='store_true',
+                    help="mostra no stderr o número de instruções executadas e o uso de memória")
+    args = ap.parse_args()
+
+    with open(args.ficheiro, encoding='utf-8') as f:
+        texto = f.read()
+    if args.input:
+        with open(args.input, encoding='utf-8') as f:
+            entrada = f.read()
+    else:
+        entrada = '' if sys.stdin.isatty() else sys.stdin.read()
+    try:
+        if args.rapida:
+            from maquina_rapida import MaquinaRapida
+            res = MaquinaRapida(texto, entrada, max_passos=args.max_passos).executar()
+        else:
+            res = executar(texto, entrada, max_passos=args.max_passos)
+    except ErroVM as e:
+        print(f"Erro de execução: {e}", file=sys.stderr)
+        sys.exit(1)
+    sys.stdout.write(res.saida)
+    if args.stats:
+        medidas = [f"instruções executadas: {res.passos}", f"heap: {res.heap} células"]
+        if res.max_pilha is not None:
+            medidas[1:1] = [f"pilha máxima: {res.max_pilha} células"]
+            medidas.append(f"strings criadas: {res.strings}")
+        print('; '.join(medidas).capitalize(), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
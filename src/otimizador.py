@@ -0,0 +1,315 @@
+from array import array
+from representacao_intermedia import Op
+
+# Otimizações sobre o grafo de fluxo de controlo (CFG) produzido pelo CodeGenerator.
+# Cada passo recebe o CFG, altera-o no lugar e devolve o número de alterações feitas,
+# para que otimizar() possa repetir os passos até não haver mais nada a melhorar.
+
+
+# Blocos alcançáveis a partir do início do programa ou de uma etiqueta usada por PUSHA
+# (pontos de entrada das sub-rotinas)
+def blocos_alcancaveis(cfg):
+    cfg.ligar()
+    if not cfg.blocos:
+        return set()
+    por_id = {b.id: b for b in cfg.blocos}
+    raizes = [cfg.blocos[0].id]
+    for b in cfg.blocos:
+        for op, raw in zip(b.ops, b.args):
+            if op == Op.PUSHA:
+                raizes.append(cfg.destino(raw).id)
+    vistos = set()
+    pendentes = list(raizes)
+    while pendentes:
+        bid = pendentes.pop()
+        if bid in vistos:
+            continue
+        vistos.add(bid)
+        pendentes.extend(por_id[bid].succs)
+    return vistos
+
+
+# Remove os blocos que nunca podem ser executados
+def remover_inalcancaveis(cfg):
+    vivos = blocos_alcancaveis(cfg)
+    antes = len(cfg.blocos)
+    removidos = [b for b in cfg.blocos if b.id not in vivos]
+    cfg.blocos = [b for b in cfg.blocos if b.id in vivos]
+    for b in removidos:
+        if b.label is not None:
+            del cfg.etq_bloco[b.label]
+    return antes - len(cfg.blocos)
+
+
+# Posição no layout do primeiro bloco não vazio a partir da posição 'pos'
+def _proximo_nao_vazio(cfg, pos):
+    while pos < len(cfg.blocos) and not cfg.blocos[pos].ops:
+        pos += 1
+    return pos
+
+
+# Destino final de um salto para a etiqueta 'label', seguindo blocos vazios (que caem
+# no seguinte) e blocos que só contêm um JUMP
+def _destino_final(cfg, label, posicoes):
+    vistos = set()
+    while label not in vistos:
+        vistos.add(label)
+        bloco = cfg.etq_bloco[label]
+        if not bloco.ops:
+            pos = _proximo_nao_vazio(cfg, posicoes[bloco.id])
+            if pos >= len(cfg.blocos):
+                break
+            seguinte = cfg.blocos[pos]
+            # O bloco seguinte tem de ter nome para poder ser alvo de um salto
+            if seguinte.label is None:
+                break
+            label = seguinte.label
+        elif len(bloco.ops) == 1 and bloco.ops[0] == Op.JUMP:
+            label = bloco.args[0]
+        else:
+            break
+    return label
+
+
+# Encadeamento de saltos: um JUMP/JZ para um bloco vazio ou para outro JUMP passa a
+# saltar diretamente para o destino final
+def encadear_saltos(cfg):
+    posicoes = {b.id: i for i, b in enumerate(cfg.blocos)}
+    alteracoes = 0
+    for b in cfg.blocos:
+        for i, op in enumerate(b.ops):
+            if op in (Op.JUMP, Op.JZ):
+                novo = _destino_final(cfg, b.args[i], posicoes)
+                if novo != b.args[i]:
+                    b.args[i] = novo
+                    alteracoes += 1
+    return alteracoes
+
+
+# Remove JUMPs para o bloco que se segue no layout (ignorando blocos vazios)
+def remover_saltos_redundantes(cfg):
+    alteracoes = 0
+    for pos, b in enumerate(cfg.blocos):
+        if b.ultima() != Op.JUMP:
+            continue
+        alvo = cfg.etq_bloco[b.args[-1]]
+        seguinte = _proximo_nao_vazio(cfg, pos + 1)
+        # O alvo pode ser um dos blocos vazios entre este e o próximo não vazio
+        entre = cfg.blocos[pos + 1:seguinte + 1]
+        if any(x is alvo for x in entre):
+            b.ops.pop()
+            b.args.pop()
+            b.origens.pop()
+            alteracoes += 1
+    return alteracoes
+
+
+# Remove blocos vazios cujo nome não é usado por nenhuma instrução
+def remover_blocos_vazios(cfg):
+    usadas = cfg.etiquetas_usadas()
+    antes = len(cfg.blocos)
+    mantidos = []
+    for b in cfg.blocos:
+        if not b.ops and (b.label is None or b.label not in usadas):
+            if b.label is not None:
+                del cfg.etq_bloco[b.label]
+            continue
+        mantidos.append(b)
+    cfg.blocos = mantidos
+    return antes - len(cfg.blocos)
+
+
+# Remove instruções sem efeito: NOP, PUSHN 0 e POP 0 (por exemplo, a reserva da frame
+# global quando o programa não tem variáveis)
+def remover_nops(cfg):
+    alteracoes = 0
+    for b in cfg.blocos:
+        i = 0
+        while i < len(b.ops):
+            op = b.ops[i]
+            if op == Op.NOP or (op in (Op.PUSHN, Op.POP) and b.args[i] == 0):
+                b.ops.pop(i)
+                b.args.pop(i)
+                b.origens.pop(i)
+                alteracoes += 1
+            else:
+                i += 1
+    return alteracoes
+
+
+# ------------------------------------------------------------------ numeração de valores
+
+# Instruções sem efeitos laterais que só empilham um valor (constante dentro de um bloco)
+_CONSTANTES = frozenset((Op.PUSHI, Op.PUSHF, Op.PUSHGP, Op.PUSHFP, Op.PUSHA))
+# Leituras de células cujo valor depende das escritas anteriores
+_LEITURAS = frozenset((Op.PUSHG, Op.PUSHL))
+_BINARIAS = frozenset((Op.ADD, Op.SUB, Op.MUL, Op.DIV, Op.MOD, Op.INF, Op.INFEQ, Op.SUP,
+                       Op.SUPEQ, Op.EQUAL, Op.AND, Op.OR, Op.FADD, Op.FSUB, Op.FMUL, Op.FDIV,
+                       Op.FINF, Op.FINFEQ, Op.FSUP, Op.FSUPEQ, Op.PADD))
+_COMUTATIVAS = frozenset((Op.ADD, Op.MUL, Op.EQUAL, Op.AND, Op.OR, Op.FADD, Op.FMUL))
+_UNARIAS = frozenset((Op.NOT, Op.ITOF, Op.FTOI, Op.FCOS, Op.FSIN))
+# Instruções que podem ser repetidas sem mudar nada além da pilha (DIV, MOD e CHECK só
+# podem falhar na primeira execução com os mesmos operandos)
+_PURAS = _CONSTANTES | _LEITURAS | _BINARIAS | _UNARIAS | {Op.CHECK, Op.LOAD, Op.LOADN, Op.DUP}
+# Instruções com efeitos que só retiram valores da pilha (número de valores retirados)
+_ESCRITAS = {Op.STOREG: 1, Op.STOREL: 1, Op.STORE: 2, Op.STOREN: 3}
+_SAIDAS = {Op.WRITEI: 1, Op.WRITEF: 1, Op.WRITES: 1, Op.WRITECHR: 1, Op.WRITELN: 0, Op.JZ: 1,
+           Op.JUMP: 0}
+
+# Maior número de valores reutilizados com um DUP e maior sequência substituída
+_MAX_DUP = 4
+_MAX_JANELA = 64
+
+
+# Simula as instruções de um bloco sobre uma pilha de números de valor (dois valores com o
+# mesmo número são iguais). Devolve, para cada posição i (antes da instrução i, e no fim):
+# profundidade da pilha, últimos números de valor da pilha e segmento; e, para cada
+# instrução, a menor profundidade a que chega e se é pura. As escritas na memória e as
+# chamadas mudam a versão da memória, invalidando as leituras anteriores; as instruções
+# com efeito desconhecido na pilha (CALL, READ, ...) começam um segmento novo.
+def _simular(bloco):
+    valores = {}
+    pilha = []
+    fundo = 0
+    versao = 0
+    segmento = 0
+    estados, baixos, puras = [], [], []
+
+    def novo():
+        valores[('?', len(valores))] = n = len(valores)
+        return n
+
+    def numero(chave):
+        if chave not in valores:
+            valores[chave] = len(valores)
+        return valores[chave]
+
+    def retirar():
+        nonlocal fundo
+        if pilha:
+            return pilha.pop()
+        fundo += 1
+        return novo()
+
+    for op, raw in zip(bloco.ops, bloco.args):
+        op = Op(op)
+        estados.append((len(pilha) - fundo, tuple(pilha[-_MAX_DUP:]), segmento))
+        profundidade = len(pilha) - fundo
+        puras.append(op in _PURAS)
+        if op in _CONSTANTES:
+            baixos.append(profundidade)
+            pilha.append(numero((op, raw)))
+        elif op in _LEITURAS:
+            baixos.append(profundidade)
+            pilha.append(numero((op, raw, versao)))
+        elif op in _BINARIAS:
+            baixos.append(profundidade - 2)
+            b, a = retirar(), retirar()
+            if op in _COMUTATIVAS and b < a:
+                a, b = b, a
+            pilha.append(numero((op, a, b)))
+        elif op in _UNARIAS or op in (Op.CHECK, Op.LOAD):
+            baixos.append(profundidade - 1)
+            pilha.append(numero((op, raw, retirar(), versao if op == Op.LOAD else None)))
+        elif op == Op.LOADN:
+            baixos.append(profundidade - 2)
+            n, a = retirar(), retirar()
+            pilha.append(numero((op, a, n, versao)))
+        elif op == Op.DUP:
+            baixos.append(profundidade - raw)
+            topo = [retirar() for _ in range(raw)][::-1]
+            pilha.extend(topo + topo)
+        elif op == Op.POP:
+            baixos.append(profundidade - raw)
+            for _ in range(raw):
+                retirar()
+        elif op in _ESCRITAS or op in _SAIDAS:
+            n = _ESCRITAS.get(op, _SAIDAS.get(op))
+            baixos.append(profundidade - n)
+            for _ in range(n):
+                retirar()
+            if op in _ESCRITAS:
+                versao += 1
+        else:
+            baixos.append(profundidade)
+            pilha, fundo = [], 0
+            versao += 1
+            segmento += 1
+    estados.append((len(pilha) - fundo, tuple(pilha[-_MAX_DUP:]), segmento))
+    return estados, baixos, puras
+
+
+# Maior sequência pura de instruções a partir de 'p' que volta a empilhar os n valores que
+# já estão no topo da pilha (e não mexe nos que estão por baixo): devolve (fim, n) ou None
+def _janela_repetida(estados, baixos, puras, p):
+    d, topo, segmento = estados[p]
+    melhor = None
+    for q in range(p + 1, min(len(puras), p + _MAX_JANELA) + 1):
+        j = q - 1
+        if not puras[j] or baixos[j] < d:
+            break
+        dq, topo_q, segmento_q = estados[q]
+        if segmento_q != segmento:
+            break
+        n = dq - d
+        if 1 <= n <= len(topo) and q - p > 1 and topo_q[-n:] == topo[-n:]:
+            melhor = (q, n)
+    return melhor
+
+
+# Numeração de valores local (em cada bloco básico): uma sequência de instruções que volta a
+# calcular os valores que estão no topo da pilha, sem escritas na memória pelo meio, é
+# substituída por DUP n. Ex: em 'a[i] := a[i] + 1', o endereço de a[i] (base e deslocamento
+# verificado por CHECK) é calculado para o STOREN e repetido para o LOADN; e em 'x*y + x*y'
+# o segundo produto é uma cópia do primeiro.
+def reutilizar_valores(cfg):
+    alteracoes = 0
+    for b in cfg.blocos:
+        estados, baixos, puras = _simular(b)
+        ops, args, origens = [], [], []
+        p = 0
+        while p < len(b.ops):
+            janela = _janela_repetida(estados, baixos, puras, p)
+            origens.append(b.origens[p])
+            if janela is None:
+                ops.append(b.ops[p])
+                args.append(b.args[p])
+                p += 1
+            else:
+                q, n = janela
+                ops.append(Op.DUP)
+                args.append(n)
+                alteracoes += q - p - 1
+                p = q
+        if len(ops) != len(b.ops):
+            b.ops = array('B', ops)
+            b.args = array('q', args)
+            b.origens = array('l', origens)
+    return alteracoes
+
+
+PASSOS = (
+    reutilizar_valores,
+    remover_nops,
+    remover_inalcancaveis,
+    encadear_saltos,
+    remover_saltos_redundantes,
+    remover_blocos_vazios,
+)
+
+
+# Aplica todos os passos até atingir um ponto fixo. Devolve estatísticas simples, incluindo
+# o número de alterações feitas por cada passo.
+def otimizar(cfg, passos=PASSOS, max_iteracoes=20):
+    antes = cfg.tamanho()
+    alteracoes = dict.fromkeys((passo.__name__ for passo in passos), 0)
+    for _ in range(max_iteracoes):
+        feitas = 0
+        for passo in passos:
+            n = passo(cfg)
+            alteracoes[passo.__name__] += n
+            feitas += n
+        if not feitas:
+            break
+    cfg.ligar()
+    return {'instrucoes_antes': antes, 'instrucoes_depois': cfg.tamanho(), 'passos': alteracoes}
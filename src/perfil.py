@@ -0,0 +1,158 @@
+import argparse
+import json
+import sys
+
+from maquina_virtual import MaquinaVirtual, ErroVM
+
+# Perfil de execução de um programa compilado, ao nível do programa fonte.
+# O interpretador de referência conta as execuções de cada instrução por pilha de chamadas
+# (MaquinaVirtual com perfil=True) e o mapa de fontes do CodeGenerator (CodeGenerator.mapa)
+# diz a linha do programa Pascal e a sub-rotina de cada instrução. Com os dois, o perfil
+# agrega as instruções executadas por linha e por sub-rotina (próprias e incluindo as das
+# sub-rotinas chamadas) e produz:
+#   - uma listagem do programa fonte anotada com as instruções executadas em cada linha;
+#   - as pilhas colapsadas ("programa;sub1;sub2;linha N contagem", uma por linha), o
+#     formato lido pelas ferramentas de flame graphs (ex: flamegraph.pl, speedscope).
+#
+# As sub-rotinas expandidas em linha e as chamadas recursivas de cauda compiladas como
+# salto não aparecem na pilha: o seu código conta na sub-rotina onde foi gerado.
+
+
+class Perfil:
+    # mapa: (linha, sub-rotina) de cada instrução, pela ordem do programa; contagens:
+    # execuções por (entradas, posição), como em Resultado.perfil
+    def __init__(self, mapa, contagens):
+        self.mapa = mapa
+        self.contagens = contagens
+        self.total = sum(contagens.values())
+        # O bloco principal é a sub-rotina da primeira instrução (a reserva das globais)
+        self.programa = mapa[0][1] if mapa else None
+
+    # Nome da sub-rotina da instrução na posição 'pc' (as sem origem conhecida ficam '?')
+    def subrotina(self, pc):
+        nome = self.mapa[pc][1] if pc < len(self.mapa) else None
+        return nome if nome is not None else '?'
+
+    # Instruções executadas em cada linha do programa fonte: linha -> execuções (a linha
+    # None junta as instruções sem origem conhecida)
+    def por_linha(self):
+        linhas = {}
+        for (_, pc), n in self.contagens.items():
+            linha = self.mapa[pc][0] if pc < len(self.mapa) else None
+            linhas[linha] = linhas.get(linha, 0) + n
+        return linhas
+
+    # Instruções executadas por sub-rotina: nome -> [próprias, inclusivas], em que as
+    # inclusivas juntam as das sub-rotinas chamadas por ela (cada execução conta uma vez
+    # por sub-rotina, mesmo numa recursão)
+    def por_subrotina(self):
+        subrotinas = {}
+        for (entradas, pc), n in self.contagens.items():
+            propria = self.subrotina(pc)
+            subrotinas.setdefault(propria, [0, 0])[0] += n
+            for nome in {self.programa, propria, *(self.subrotina(e) for e in entradas)}:
+                subrotinas.setdefault(nome, [0, 0])[1] += n
+        return subrotinas
+
+    # Pilhas colapsadas para flame graphs: uma linha por pilha (programa, sub-rotinas
+    # chamadas e a linha do programa fonte), com o número de instruções executadas
+    def pilhas(self):
+        agregadas = {}
+        for (entradas, pc), n in self.contagens.items():
+            quadros = [self.programa] + [self.subrotina(e) for e in entradas]
+            linha = self.mapa[pc][0] if pc < len(self.mapa) else None
+            if self.subrotina(pc) != quadros[-1]:
+                quadros.append(self.subrotina(pc))
+            if linha is not None:
+                quadros.append(f"linha {linha}")
+            chave = ';'.join(str(q) for q in quadros)
+            agregadas[chave] = agregadas.get(chave, 0) + n
+        return ''.join(f"{chave} {n}\n" for chave, n in sorted(agregadas.items()))
+
+    # Percentagem de 'n' no total de instruções executadas
+    def percentagem(self, n):
+        return 100 * n / self.total if self.total else 0
+
+    # Listagem do programa fonte com as instruções executadas (e a percentagem do total)
+    # à frente de cada linha que gerou código
+    def listagem(self, fonte):
+        linhas = self.por_linha()
+        saida = [f"{'instruções':>11} {'%':>7}  linha", '']
+        for i, texto in enumerate(fonte.splitlines(), 1):
+            n = linhas.get(i)
+            prefixo = f"{n:>11} {self.percentagem(n):6.2f}%" if n else ' ' * 19
+            saida.append(f"{prefixo}  {i:5} | {texto}")
+        if linhas.get(None):
+            n = linhas[None]
+            saida += ['', f"{n:>11} {self.percentagem(n):6.2f}%  (sem linha no programa fonte)"]
+        return '\n'.join(saida) + '\n'
+
+    # Resumo das linhas e das sub-rotinas com mais instruções executadas ('n' de cada)
+    def resumo(self, n=5):
+        saida = [f"Instruções executadas: {self.total}", "Linhas mais executadas:"]
+        origens = {}
+        for (_, pc), k in self.contagens.items():
+            if pc < len(self.mapa) and self.mapa[pc][0] is not None:
+                chave = (self.mapa[pc][0], self.subrotina(pc))
+                origens[chave] = origens.get(chave, 0) + k
+        for (linha, nome), k in sorted(origens.items(), key=lambda x: -x[1])[:n]:
+            saida.append(f"  linha {linha} ({nome}): {k} ({self.percentagem(k):.1f}%)")
+        saida.append("Sub-rotinas (próprias / inclusivas):")
+        subrotinas = sorted(self.por_subrotina().items(), key=lambda x: -x[1][0])
+        for nome, (proprias, inclusivas) in subrotinas[:n]:
+            saida.append(f"  {nome}: {proprias} ({self.percentagem(proprias):.1f}%) / "
+                         f"{inclusivas} ({self.percentagem(inclusivas):.1f}%)")
+        return '\n'.join(saida)
+
+
+# Executa um programa .vm (texto) no interpretador de referência com o input 'entrada' e
+# devolve o Resultado e o Perfil da execução, com o mapa de fontes dado
+def perfilar(texto, mapa, entrada='', **opcoes):
+    res = MaquinaVirtual(texto, entrada, perfil=True, **opcoes).executar()
+    return res, Perfil(mapa, res.perfil)
+
+
+# Grava a listagem anotada em <prefixo>.perfil.txt e as pilhas colapsadas em <prefixo>.folded
+def gravar(perfil, fonte, prefixo):
+    with open(f"{prefixo}.perfil.txt", 'w', encoding='utf-8') as f:
+        f.write(perfil.listagem(fonte))
+    with open(f"{prefixo}.folded", 'w', encoding='utf-8') as f:
+        f.write(perfil.pilhas())
+
+
+# Executa um programa .vm no interpretador de referência e grava o seu perfil
+def main():
+    ap = argparse.ArgumentParser(description="Perfil de execução de um programa compilado")
+    ap.add_argument('ficheiro', help="ficheiro .vm a executar")
+    ap.add_argument('mapa', help="mapa de fontes (gravado por main.py com --mapa)")
+    ap.add_argument('fonte', help="programa Pascal que deu origem ao .vm")
+    ap.add_argument('-i', '--input', help="ficheiro com o input do programa (uma leitura por linha); "
+                                          "sem esta opção, o input é lido do stdin")
+    ap.add_argument('-o', '--saida', help="prefixo dos ficheiros gravados (<saida>.perfil.txt "
+                                          "e <saida>.folded); por omissão, o do ficheiro .vm")
+    args = ap.parse_args()
+
+    with open(args.ficheiro, encoding='utf-8') as f:
+        texto = f.read()
+    with open(args.mapa, encoding='utf-8') as f:
+        mapa = [tuple(o) for o in json.load(f)['instrucoes']]
+    with open(args.fonte, encoding='utf-8') as f:
+        fonte = f.read()
+    if args.input:
+        with open(args.input, encoding='utf-8') as f:
+            entrada = f.read()
+    else:
+        entrada = '' if sys.stdin.isatty() else sys.stdin.read()
+    try:
+        _, perfil = perfilar(texto, mapa, entrada)
+    except ErroVM as e:
+        print(f"Erro de execução: {e}", file=sys.stderr)
+        sys.exit(1)
+    prefixo = args.saida or args.ficheiro.rsplit('.', 1)[0]
+    gravar(perfil, fonte, prefixo)
+    print(perfil.resumo())
+    print(f"Perfil gravado em: {prefixo}.perfil.txt e {prefixo}.folded")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,413 @@
+import json
+from array import array
+from enum import IntEnum
+
+# Representação intermédia (RI) usada entre a AST e o texto da EWVM.
+# O CodeGenerator emite instruções compactas (opcode + operando) agrupadas em blocos
+# básicos com etiquetas simbólicas e arestas de sucessão explícitas. As otimizações
+# trabalham sobre este grafo de fluxo de controlo (CFG) e só no fim o programa é
+# convertido para as linhas de texto que a EWVM aceita.
+
+
+# Conjunto de instruções da EWVM
+class Op(IntEnum):
+    NOP = 0
+    # Empilhar valores
+    PUSHI = 1
+    PUSHN = 2
+    PUSHF = 3
+    PUSHS = 4
+    PUSHG = 5
+    PUSHL = 6
+    PUSHSP = 7
+    PUSHFP = 8
+    PUSHGP = 9
+    PUSHA = 10
+    LOAD = 11
+    LOADN = 12
+    DUP = 13
+    DUPN = 14
+    # Retirar e guardar valores
+    POP = 15
+    POPN = 16
+    STOREL = 17
+    STOREG = 18
+    STORE = 19
+    STOREN = 20
+    SWAP = 21
+    CHECK = 22
+    # Heap
+    ALLOC = 23
+    ALLOCN = 24
+    FREE = 25
+    # Aritmética e lógica inteira
+    ADD = 26
+    SUB = 27
+    MUL = 28
+    DIV = 29
+    MOD = 30
+    NOT = 31
+    INF = 32
+    INFEQ = 33
+    SUP = 34
+    SUPEQ = 35
+    EQUAL = 36
+    AND = 37
+    OR = 38
+    # Aritmética de reais
+    FADD = 39
+    FSUB = 40
+    FMUL = 41
+    FDIV = 42
+    FCOS = 43
+    FSIN = 44
+    FINF = 45
+    FINFEQ = 46
+    FSUP = 47
+    FSUPEQ = 48
+    # Endereços e strings
+    PADD = 49
+    CONCAT = 50
+    CHRCODE = 51
+    STRLEN = 52
+    CHARAT = 53
+    # Conversões
+    ATOI = 54
+    ATOF = 55
+    ITOF = 56
+    FTOI = 57
+    STRI = 58
+    STRF = 59
+    # Input / output
+    WRITEI = 60
+    WRITEF = 61
+    WRITES = 62
+    WRITELN = 63
+    WRITECHR = 64
+    READ = 65
+    ERR = 66
+    # Controlo
+    JUMP = 67
+    JZ = 68
+    CALL = 69
+    RETURN = 70
+    START = 71
+    STOP = 72
+
+
+# Tipo do operando de cada instrução. Operandos inteiros ficam guardados diretamente;
+# reais, strings e pares (CHECK) vão para uma tabela de constantes partilhada e as
+# etiquetas são índices na tabela de etiquetas do CFG.
+SEM_OPERANDO, INTEIRO, REAL, TEXTO, PAR, ETIQUETA = range(6)
+
+OPERANDO = {op: SEM_OPERANDO for op in Op}
+OPERANDO.update({
+    Op.PUSHI: INTEIRO, Op.PUSHN: INTEIRO, Op.PUSHG: INTEIRO, Op.PUSHL: INTEIRO,
+    Op.LOAD: INTEIRO, Op.DUP: INTEIRO, Op.POP: INTEIRO, Op.STOREL: INTEIRO,
+    Op.STOREG: INTEIRO, Op.STORE: INTEIRO, Op.ALLOC: INTEIRO,
+    Op.PUSHF: REAL, Op.PUSHS: TEXTO, Op.ERR: TEXTO, Op.CHECK: PAR,
+    Op.JUMP: ETIQUETA, Op.JZ: ETIQUETA, Op.PUSHA: ETIQUETA,
+})
+
+# Limites dos operandos inteiros, guardados com 64 bits (ver BasicBlock)
+INTEIRO_MIN = -2 ** 63
+INTEIRO_MAX = 2 ** 63 - 1
+
+
+# Verifica se um valor inteiro cabe nos limites dos operandos inteiros das instruções
+def cabe_inteiro(valor):
+    return INTEIRO_MIN <= valor <= INTEIRO_MAX
+
+
+# Instruções que terminam um bloco básico
+TERMINADORES = frozenset((Op.JUMP, Op.JZ, Op.RETURN, Op.STOP))
+
+
+class BasicBlock:
+    # Um bloco básico guarda as instruções em dois arrays paralelos: o opcode (1 byte)
+    # e o operando (inteiro de 64 bits ou índice numa tabela do CFG). Um terceiro array
+    # guarda a origem de cada instrução no programa fonte (índice na tabela de origens do
+    # CFG), que os passos de otimização mantêm a par das instruções.
+    __slots__ = ('id', 'label', 'ops', 'args', 'origens', 'succs', 'preds')
+
+    def __init__(self, id_, label=None):
+        self.id = id_
+        # Índice da etiqueta do bloco (ou None se o bloco não tiver nome)
+        self.label = label
+        self.ops = array('B')
+        self.args = array('q')
+        self.origens = array('l')
+        # Sucessores e predecessores (ids de blocos), calculados por CFG.ligar()
+        self.succs = []
+        self.preds = []
+
+    def __len__(self):
+        return len(self.ops)
+
+    # Última instrução do bloco (ou None se estiver vazio)
+    def ultima(self):
+        return Op(self.ops[-1]) if self.ops else None
+
+    def __repr__(self):
+        return f"<BasicBlock {self.id} label={self.label} n={len(self.ops)} succs={self.succs}>"
+
+
+class CFG:
+    def __init__(self):
+        # Blocos pela ordem em que serão escritos (layout)
+        self.blocos = []
+        # Tabela de etiquetas: índice -> nome, nome -> índice e índice -> bloco
+        self.etiquetas = []
+        self._etq_idx = {}
+        self.etq_bloco = {}
+        # Tabela de constantes (reais, strings e pares do CHECK), sem repetições
+        self.constantes = []
+        self._const_idx = {}
+        # Origens das instruções no programa fonte, (linha, sub-rotina), sem repetições; a
+        # origem 0 é a desconhecida
+        self.tabela_origens = [(None, None)]
+        self._origem_idx = {(None, None): 0}
+        # Origem das instruções emitidas a partir de agora
+        self.origem_atual = 0
+        # Bloco em que as instruções estão a ser emitidas
+        self.atual = None
+        # Próximo identificador de bloco (os ids não mudam quando se removem blocos)
+        self.proximo_id = 0
+
+    # ------------------------------------------------------------------ construção
+
+    # Devolve o índice da etiqueta com o nome dado, criando-a se necessário
+    def etiqueta(self, nome):
+        idx = self._etq_idx.get(nome)
+        if idx is None:
+            idx = len(self.etiquetas)
+            self.etiquetas.append(nome)
+            self._etq_idx[nome] = idx
+        return idx
+
+    # Devolve o índice de uma constante (real, string ou par) na tabela de constantes
+    def constante(self, valor):
+        chave = (type(valor), valor)
+        idx = self._const_idx.get(chave)
+        if idx is None:
+            idx = len(self.constantes)
+            self.constantes.append(valor)
+            self._const_idx[chave] = idx
+        return idx
+
+    # Devolve o índice da origem (linha do programa fonte, sub-rotina) na tabela de origens
+    def origem(self, linha, subrotina):
+        chave = (linha, subrotina)
+        idx = self._origem_idx.get(chave)
+        if idx is None:
+            idx = len(self.tabela_origens)
+            self.tabela_origens.append(chave)
+            self._origem_idx[chave] = idx
+        return idx
+
+    # Cria um novo bloco no fim do layout (opcionalmente com etiqueta)
+    def novo_bloco(self, nome=None):
+        label = self.etiqueta(nome) if nome is not None else None
+        bloco = BasicBlock(self.proximo_id, label)
+        self.proximo_id += 1
+        self.blocos.append(bloco)
+        if label is not None:
+            self.etq_bloco[label] = bloco
+        self.atual = bloco
+        return bloco
+
+    # Marca o início de um bloco com a etiqueta 'nome' (equivalente a emitir "nome:")
+    def rotulo(self, nome):
+        self.novo_bloco(nome)
+
+    # Codifica o operando de uma instrução conforme o tipo esperado
+    def codificar(self, op, arg):
+        tipo = OPERANDO[op]
+        if tipo == SEM_OPERANDO:
+            if arg is not None:
+                raise ValueError(f"{op.name} não aceita operando")
+            return 0
+        if arg is None:
+            raise ValueError(f"{op.name} requer um operando")
+        if tipo == INTEIRO:
+            if not cabe_inteiro(int(arg)):
+                raise ValueError(f"Operando de {op.name} fora dos limites dos inteiros: {arg}")
+            return int(arg)
+        if tipo == ETIQUETA:
+            return self.etiqueta(arg)
+        if tipo == REAL:
+            return self.constante(float(arg))
+        if tipo == PAR:
+            return self.constante(tuple(arg))
+        return self.constante(str(arg))
+
+    # Operando descodificado (valor Python) da instrução op com operando bruto 'raw'
+    def operando(self, op, raw):
+        tipo = OPERANDO[op]
+        if tipo == SEM_OPERANDO:
+            return None
+        if tipo == INTEIRO:
+            return raw
+        if tipo == ETIQUETA:
+            return self.etiquetas[raw]
+        return self.constantes[raw]
+
+    # Acrescenta uma instrução ao bloco atual (ou ao bloco indicado, para acrescentar código
+    # a um bloco anterior) e devolve uma referência para a poder corrigir mais tarde (por
+    # exemplo, tamanhos de frames só conhecidos no fim)
+    def emit(self, op, arg=None, bloco=None):
+        if bloco is None:
+            if self.atual is None or (self.atual.ops and self.atual.ops[-1] in TERMINADORES):
+                self.novo_bloco()
+            bloco = self.atual
+        bloco.ops.append(op)
+        bloco.args.append(self.codificar(op, arg))
+        bloco.origens.append(self.origem_atual)
+        return (bloco, len(bloco.ops) - 1)
+
+    # Substitui o operando da instrução referenciada por 'ref'
+    def corrigir(self, ref, arg):
+        bloco, i = ref
+        bloco.args[i] = self.codificar(Op(bloco.ops[i]), arg)
+
+    # Itera as instruções de um bloco como pares (Op, operando descodificado)
+    def instrucoes(self, bloco):
+        for op, raw in zip(bloco.ops, bloco.args):
+            op = Op(op)
+            yield op, self.operando(op, raw)
+
+    # Número total de instruções
+    def tamanho(self):
+        return sum(len(b.ops) for b in self.blocos)
+
+    # ------------------------------------------------------------------ arestas
+
+    # Bloco de destino de uma etiqueta
+    def destino(self, label):
+        bloco = self.etq_bloco.get(label)
+        if bloco is None:
+            raise KeyError(f"Etiqueta sem bloco: {self.etiquetas[label]}")
+        return bloco
+
+    # Recalcula as arestas de sucessão/predecessão a partir do layout e dos saltos
+    def ligar(self):
+        for b in self.blocos:
+            b.succs = []
+            b.preds = []
+        for pos, b in enumerate(self.blocos):
+            seguinte = self.blocos[pos + 1].id if pos + 1 < len(self.blocos) else None
+            ultima = b.ultima()
+            if ultima == Op.JUMP:
+                b.succs = [self.destino(b.args[-1]).id]
+            elif ultima == Op.JZ:
+                b.succs = [self.destino(b.args[-1]).id]
+                if seguinte is not None:
+                    b.succs.append(seguinte)
+            elif ultima in (Op.RETURN, Op.STOP):
+                b.succs = []
+            elif seguinte is not None:
+                b.succs = [seguinte]
+        por_id = {b.id: b for b in self.blocos}
+        for b in self.blocos:
+            for s in b.succs:
+                if b.id not in por_id[s].preds:
+                    por_id[s].preds.append(b.id)
+
+    # Etiquetas referenciadas por alguma instrução (JUMP, JZ ou PUSHA)
+    def etiquetas_usadas(self):
+        usadas = set()
+        for b in self.blocos:
+            for op, raw in zip(b.ops, b.args):
+                if OPERANDO[op] == ETIQUETA:
+                    usadas.add(raw)
+        return usadas
+
+    # ------------------------------------------------------------------ saída
+
+    # Converte uma instrução para a sua forma textual na EWVM
+    def texto_instrucao(self, op, raw):
+        op = Op(op)
+        tipo = OPERANDO[op]
+        if tipo == SEM_OPERANDO:
+            return op.name
+        valor = self.operando(op, raw)
+        if tipo == TEXTO:
+            s = valor.replace('"', '""')
+            return f'{op.name} "{s}"'
+        if tipo == PAR:
+            return f"{op.name} {valor[0]},{valor[1]}"
+        return f"{op.name} {valor}"
+
+    # Passo final: converte o CFG nas linhas de texto da EWVM. Só são escritas as
+    # etiquetas efetivamente referenciadas.
+    def lower(self):
+        usadas = self.etiquetas_usadas()
+        linhas = []
+        for b in self.blocos:
+            if b.label is not None and b.label in usadas:
+                linhas.append(f"{self.etiquetas[b.label]}:")
+            for op, raw in zip(b.ops, b.args):
+                linhas.append(self.texto_instrucao(op, raw))
+        return linhas
+
+    # Mapa de fontes: a origem (linha, sub-rotina) de cada instrução escrita por lower(),
+    # pela mesma ordem
+    def mapa(self):
+        return [self.tabela_origens[o] for b in self.blocos for o in b.origens]
+
+    # Listagem legível do CFG (blocos, arestas e instruções), para depuração
+    def dump(self):
+        self.ligar()
+        linhas = []
+        for b in self.blocos:
+            nome = self.etiquetas[b.label] if b.label is not None else '-'
+            linhas.append(f"B{b.id} [{nome}] preds={b.preds} succs={b.succs}")
+            for op, raw in zip(b.ops, b.args):
+                linhas.append(f"    {self.texto_instrucao(op, raw)}")
+        return '\n'.join(linhas)
+
+    # Serialização para JSON (depuração e ferramentas externas)
+    def to_dict(self):
+        self.ligar()
+        return {
+            'etiquetas': self.etiquetas,
+            'constantes': [list(c) if isinstance(c, tuple) else c for c in self.constantes],
+            'origens': [list(o) for o in self.tabela_origens],
+            'blocos': [{
+                'id': b.id,
+                'label': b.label,
+                'succs': b.succs,
+                'instrucoes': [[Op(op).name, raw] for op, raw in zip(b.ops, b.args)],
+                'origens': list(b.origens),
+            } for b in self.blocos],
+        }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), ensure_ascii=False, **kwargs)
+
+    @classmethod
+    def from_dict(cls, dados):
+        cfg = cls()
+        for nome in dados['etiquetas']:
+            cfg.etiqueta(nome)
+        for c in dados['constantes']:
+            cfg.constante(tuple(c) if isinstance(c, list) else c)
+        for linha, subrotina in dados.get('origens', [])[1:]:
+            cfg.origem(linha, subrotina)
+        for bd in dados['blocos']:
+            bloco = BasicBlock(bd['id'], bd['label'])
+            for nome, raw in bd['instrucoes']:
+                bloco.ops.append(Op[nome])
+                bloco.args.append(raw)
+            bloco.origens.extend(bd.get('origens', [0] * len(bloco.ops)))
+            cfg.blocos.append(bloco)
+            if bloco.label is not None:
+                cfg.etq_bloco[bloco.label] = bloco
+        cfg.atual = cfg.blocos[-1] if cfg.blocos else None
+        cfg.proximo_id = max((b.id for b in cfg.blocos), default=-1) + 1
+        cfg.ligar()
+        return cfg
+
+    @classmethod
+    def from_json(cls, texto):
+        return cls.from_dict(json.loads(texto))